@@ -1,17 +1,33 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
 from .models import (
-    ChatQuery, ChatResponse, Product, Forecast, OwnerInsight,
-    MarketBasketRule, CustomerSegment, CustomerInsight,
-    SeasonalAnalysis, TimeHabits, SentimentAnalysis, PersonaAnalysis
+    ChatQuery, ChatResponse, LLMStats, RouterStats, Product, Store, SearchBatchRequest, SearchBatchResult, SearchIndexInfo, Forecast, OwnerInsight,
+    MarketBasketRule, AssociationRulePage, CustomerSegment, CustomerSegmentAssignment, CustomerInsight,
+    SeasonalAnalysis, TimeHabits, SentimentAnalysis, PersonaAnalysis,
+    Recommendation, TrendingItem, ExecutorStats, CacheStats, ChatCacheStats, OwnerDashboard, TransactionRecord, ItemRecord, ReviewRecord, IngestResult
 )
+import asyncio
+import json
 import pandas as pd
-from prophet import Prophet
 from datetime import datetime
-from typing import List
+from functools import partial
+from typing import List, Optional
+from .cache import ChatResponseCache, ResponseCache
+from .executor import TaskExecutor
+from .llm import FakeClient, GeminiClient, HTTPClient, LLMGateway, LLMUnavailable, MallContext
 from .ml.search_engine import ProductSearchEngine
-from .ml.analytics import MallAnalytics
+from .ml.datastore import MallDataStore
+from .ml.analytics import MallAnalytics, fit_customer_segments
+from .ml.forecasting import ForecastService, fit_forecast
+from .ml.itemsets import frequent_itemsets
+from .ml.intent import IntentRouter
+from .ml.keyword_index import KeywordIndex
+from .ml.segmentation import SegmentationService
+from .ml.store_index import to_timestamp_ns
 from pathlib import Path
 import os
+import threading
 import google.generativeai as genai
 from dotenv import load_dotenv
 
@@ -20,6 +36,15 @@ load_dotenv()
 
 router = APIRouter()
 
+# Process pool for CPU-bound ML, thread pool for LLM calls and short pandas work
+executor = TaskExecutor.from_env()
+
+# Serialized /analytics/* responses, keyed by parameters and data version
+response_cache = ResponseCache.from_env()
+
+# Chat answers by normalized (or similar) query text, dropped on catalogue changes
+chat_cache = ChatResponseCache.from_env()
+
 # Get the directory containing this file (app/)
 CURRENT_DIR = Path(__file__).resolve().parent
 # Get the parent directory (backend/ or /app in Docker)
@@ -39,41 +64,76 @@ else:
 
 print(f"Using DATA_DIR: {DATA_DIR}")
 
+# Fitted forecast models are persisted here so restarts don't refit them
+FORECAST_CACHE_DIR = Path(os.getenv("FORECAST_CACHE_DIR", BACKEND_DIR / ".cache" / "forecasts"))
+
+# Persisted, memory-mapped search index artifacts (shared by workers)
+SEARCH_INDEX_DIR = Path(os.getenv("SEARCH_INDEX_DIR", BACKEND_DIR / ".cache" / "search"))
+
+# Default product search scoring ('lexical', 'dense' or 'hybrid') and the
+# dense score's share of hybrid scores
+SEARCH_MODE = os.getenv("SEARCH_MODE", "lexical")
+SEARCH_HYBRID_WEIGHT = float(os.getenv("SEARCH_HYBRID_WEIGHT", "0.5"))
+
+# Most queries accepted by a single /catalog/search/batch call
+SEARCH_BATCH_MAX = int(os.getenv("SEARCH_BATCH_MAX", "1000"))
+
+# Persisted customer segment centroids (warm start after a restart)
+SEGMENT_CACHE_DIR = Path(os.getenv("SEGMENT_CACHE_DIR", BACKEND_DIR / ".cache" / "segments"))
+
+# Largest micro-batch accepted by a single /ingest call
+INGEST_MAX_BATCH = int(os.getenv("INGEST_MAX_BATCH", "5000"))
+
+# Longest forecast horizon a [start, end) window may ask for
+MAX_FORECAST_HORIZON = 365
+
+# Memory-mapped columnar snapshots of the CSVs (rebuilt when a CSV changes)
+COLUMNAR_CACHE_DIR = Path(os.getenv("COLUMNAR_CACHE_DIR", BACKEND_DIR / ".cache" / "columnar"))
+
 # --- Data Loading ---
 try:
-    items_df = pd.read_csv(DATA_DIR / "items.csv")
-    stores_df = pd.read_csv(DATA_DIR / "stores.csv")
-    transactions_df = pd.read_csv(DATA_DIR / "transactions.csv")
-    transactions_df['timestamp'] = pd.to_datetime(transactions_df['timestamp'])
-    
-    # Load Customers
-    customers_path = DATA_DIR / "customers.csv"
-    if customers_path.exists():
-        customers_df = pd.read_csv(customers_path)
-    else:
-        customers_df = pd.DataFrame()
-        print("WARNING: customers.csv not found.")
-
-    # Load Reviews (New)
-    reviews_path = DATA_DIR / "reviews.csv"
-    if reviews_path.exists():
-        reviews_df = pd.read_csv(reviews_path)
-    else:
-        reviews_df = pd.DataFrame()
-        print("WARNING: reviews.csv not found.")
+    # Tables live in the data store; engines subscribe to its ingests and
+    # update their derived state from each micro-batch
+    data_store = MallDataStore.open(DATA_DIR, COLUMNAR_CACHE_DIR)
 
     # Initialize Engines
-    search_engine = ProductSearchEngine(str(DATA_DIR / "items.csv"))
-    analytics_engine = MallAnalytics(transactions_df, customers_df, items_df, reviews_df)
+    search_engine = ProductSearchEngine(
+        data_store.items_df, index=os.getenv("SEARCH_INDEX", "inverted"), artifact_dir=SEARCH_INDEX_DIR,
+        mode=SEARCH_MODE, hybrid_weight=SEARCH_HYBRID_WEIGHT
+    )
+    keyword_index = KeywordIndex(data_store.items_df)
+    analytics_engine = MallAnalytics(data_store, mine_fn=partial(executor.call_cpu, frequent_itemsets))
+    forecast_service = ForecastService(
+        data_store.transactions_df,
+        cache_dir=FORECAST_CACHE_DIR,
+        fit_fn=partial(executor.call_cpu, fit_forecast)
+    )
+    segment_service = SegmentationService(data_store.transactions_df, cache_dir=SEGMENT_CACHE_DIR)
+    # Catalogue summary for assistant prompts, refreshed on catalogue ingests
+    mall_context = MallContext(data_store)
+    # Answers product, price, store and trending questions without the LLM
+    intent_router = IntentRouter(data_store) if os.getenv("CHAT_ROUTER", "1") == "1" else None
+    for engine in (analytics_engine, keyword_index, forecast_service, segment_service, mall_context, chat_cache):
+        data_store.subscribe(engine.on_ingest)
+    if intent_router:
+        data_store.subscribe(intent_router.on_ingest)
+    data_store.subscribe(lambda table, batch: ingest_search(table, batch))
+    data_store.subscribe(lambda table, batch: response_cache.invalidate())
+
+    # Fit one model per store in the background so requests hit a warm cache
+    if os.getenv("FORECAST_WARMUP", "1") == "1":
+        threading.Thread(target=forecast_service.warm, name="forecast-warmup", daemon=True).start()
     
 except FileNotFoundError as e:
     print(f"WARNING: Data files not found at {DATA_DIR}. Error: {e}")
-    items_df = pd.DataFrame()
-    transactions_df = pd.DataFrame()
-    customers_df = pd.DataFrame()
-    reviews_df = pd.DataFrame()
+    data_store = None
     search_engine = None
+    keyword_index = None
     analytics_engine = None
+    forecast_service = None
+    segment_service = None
+    mall_context = MallContext(None)
+    intent_router = None
 
 
 # --- Gemini API Configuration ---
@@ -89,29 +149,22 @@ if GEMINI_API_KEY and GEMINI_API_KEY != "your_gemini_api_key_here":
     except Exception as e:
         print(f"WARNING: Failed to initialize Gemini API: {e}")
         gemini_model = None
-else:
+elif not (os.getenv("LLM_STUB_URL") or os.getenv("LLM_FAKE_DELAY")):
     print("WARNING: GEMINI_API_KEY not found in environment. Chat will use basic search only.")
 
-
-def get_mall_context():
-    """Generate context about available products and stores for Gemini."""
-    if items_df.empty:
-        return "No product data available."
-    
-    # Get unique categories and sample products
-    categories = items_df['category'].unique().tolist() if 'category' in items_df.columns else []
-    total_products = len(items_df)
-    
-    # Get top 5 products by store frequency (most available)
-    popular_items = items_df['name'].value_counts().head(5).index.tolist() if 'name' in items_df.columns else []
-    
-    context = f"""
-Mall Information:
-- Total Products: {total_products}
-- Categories Available: {', '.join(categories[:10])}
-- Popular Items: {', '.join(popular_items)}
-"""
-    return context
+# All assistant calls go through the gateway: bounded concurrency and a
+# deadline per call, after which chat falls back to product search.
+# For tests, LLM_STUB_URL points chat at a local stub model server
+# (python -m app.llm) and LLM_FAKE_DELAY at an in-process fake model.
+llm_gateway = None
+if os.getenv("LLM_STUB_URL"):
+    llm_gateway = LLMGateway.from_env(HTTPClient(os.environ["LLM_STUB_URL"]))
+elif os.getenv("LLM_FAKE_DELAY"):
+    llm_gateway = LLMGateway.from_env(FakeClient(
+        delay=float(os.environ["LLM_FAKE_DELAY"]), token_delay=float(os.getenv("LLM_FAKE_TOKEN_DELAY", "0.05"))
+    ))
+elif gemini_model:
+    llm_gateway = LLMGateway.from_env(GeminiClient(gemini_model))
 
 
 def create_shopping_assistant_prompt(user_query: str, mall_context: str) -> str:
@@ -132,137 +185,397 @@ User Query: {user_query}
 Provide a helpful, focused response (max 3 sentences):"""
 
 
+_adapters = {}
+
+def _adapter(response_model) -> TypeAdapter:
+    adapter = _adapters.get(response_model)
+    if adapter is None:
+        adapter = _adapters[response_model] = TypeAdapter(response_model)
+    return adapter
+
+async def cached_response(request: Request, response_model, compute, *params, cacheable=None) -> Response:
+    """
+    Serves `compute()` (a coroutine function) through the response cache.
+    The key is the route path, `params` and the data version, so ingested
+    data is never served stale. The ETag is a hash of the body; a matching
+    If-None-Match gets a 304 without a body. Results for which
+    `cacheable(result)` is false are served but not stored.
+    """
+    adapter = _adapter(response_model)
+
+    async def serialize():
+        result = await compute()
+        return adapter.dump_json(adapter.validate_python(result)), cacheable is None or cacheable(result)
+
+    key = (request.url.path, params, data_store.version if data_store else 0)
+    etag, body, hit = await response_cache.get_or_compute(key, serialize)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "X-Cache": "HIT" if hit else "MISS"}
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        response_cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def time_window(start: Optional[datetime], end: Optional[datetime]):
+    """Validates a [start, end) query window; bounds become naive UTC like stored timestamps."""
+    start, end = (None if value is None else pd.Timestamp(to_timestamp_ns(value)) for value in (start, end))
+    if start is not None and end is not None and start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end.")
+    return start, end
+
+
 # --- Shopper Endpoints ---
 
 @router.post("/chat/query", response_model=ChatResponse)
 async def chat_query(query: ChatQuery):
     """
     Gemini-powered AI shopping assistant with contextual understanding.
-    Falls back to TF-IDF search if Gemini is unavailable.
+    Falls back to TF-IDF search if Gemini is unavailable or misses its deadline.
+    Answers are cached by normalized query text, so near-duplicate
+    messages skip the model and the search.
     """
     query_text = query.text.strip()
-    
-    # Try Gemini first for intelligent, context-aware responses
-    if gemini_model:
-        try:
-            mall_context = get_mall_context()
-            prompt = create_shopping_assistant_prompt(query_text, mall_context)
-            
-            response = gemini_model.generate_content(prompt)
-            ai_response = response.text.strip()
-            
-            # Check if Gemini declined (off-topic query)
-            if "shopping assistant" in ai_response.lower() and "only help with" in ai_response.lower():
-                return ChatResponse(
-                    response_text=ai_response,
-                    action="clarify",
-                    data={}
-                )
-            
-            # Get product recommendations using search engine
-            products = []
-            if search_engine:
-                products = search_engine.search(query_text, top_k=6)
-            
-            # Determine action based on response and products
-            action = "recommend" if products else "inform"
-            
-            return ChatResponse(
-                response_text=ai_response,
-                action=action,
-                data=products if products else {}
-            )
-            
-        except Exception as e:
-            print(f"Gemini API error: {e}")
-            # Fall through to fallback search
-    
-    # Fallback: Use TF-IDF search engine
-    if search_engine:
-        results = search_engine.search(query_text, top_k=6)
-        
-        if results:
-            return ChatResponse(
-                response_text=f"Found {len(results)} items matching '{query_text}':",
-                action="recommend",
-                data=results
-            )
-    
+    engine = search_engine
+    cached = chat_cache.get(query_text, engine)
+    if cached is not None:
+        return cached
+
+    response, complete = await route_chat(query_text), True
+    if response is None:
+        response, complete = await answer_chat(query_text)
+    # Search fallbacks for a failed model call are not cached
+    if complete:
+        chat_cache.put(query_text, response, engine)
+    return response
+
+def is_declined(ai_response: str) -> bool:
+    """Whether Gemini declined an off-topic query."""
+    return "shopping assistant" in ai_response.lower() and "only help with" in ai_response.lower()
+
+def assistant_response(ai_response: str, products) -> ChatResponse:
+    """The chat answer for a model reply and the products found for the query."""
+    if is_declined(ai_response):
+        return ChatResponse(
+            response_text=ai_response,
+            action="clarify",
+            data={}
+        )
+
+    # Determine action based on response and products
+    action = "recommend" if products else "inform"
+
+    return ChatResponse(
+        response_text=ai_response,
+        action=action,
+        data=products if products else {}
+    )
+
+def search_response(query_text: str, results) -> ChatResponse:
+    """The chat answer from search results alone (no model, or it failed)."""
+    if results:
+        return ChatResponse(
+            response_text=f"Found {len(results)} items matching '{query_text}':",
+            action="recommend",
+            data=results
+        )
+
     return ChatResponse(
         response_text="I'm here to help you shop! Try asking about specific products like 'running shoes', 'electronics', or 'gifts'.",
         action="clarify",
         data={}
     )
 
+def price_response(results) -> ChatResponse:
+    """The chat answer to a price question, from the matching products."""
+    stores = analytics_engine.stores
+    prices = "; ".join(
+        f"{item['name']} ₹{item['price']:,.0f} at {stores.name(item['store_id'])}"
+        for item in results
+    )
+    return ChatResponse(
+        response_text=f"Here are the prices I found: {prices}.",
+        action="recommend",
+        data=results
+    )
+
+def store_response(route) -> Optional[ChatResponse]:
+    """The chat answer to a store location question, from the stores table."""
+    directory = analytics_engine.stores
+    if route['store_ids']:
+        stores = [directory.get(store_id) for store_id in dict.fromkeys(route['store_ids'])]
+    else:
+        stores = [store for category in route['categories'] for store in directory.find(category=category)]
+    stores = [store for store in stores if store is not None]
+    if not stores:
+        return None
+    return ChatResponse(
+        response_text=" ".join(
+            f"{store['name']} ({store['category']}, {store['tier']}) is in zone {store['zone']}." for store in stores
+        ),
+        action="inform",
+        data={}
+    )
+
+async def route_chat(query_text: str) -> Optional[ChatResponse]:
+    """
+    Answers the message locally when the intent router finds a product,
+    price, store or trending question it can answer; None sends it to the
+    LLM (as does a direct route that finds nothing).
+    """
+    if not intent_router:
+        return None
+    route = intent_router.route(query_text)
+    intent = route['intent']
+    response = None
+    if intent in ('search', 'price') and search_engine:
+        results = await executor.run_io(search_engine.search, query_text, top_k=6)
+        if results:
+            response = search_response(query_text, results) if intent == 'search' else price_response(results)
+    elif intent == 'store':
+        response = store_response(route)
+    elif intent == 'trending' and analytics_engine:
+        trending = await executor.run_io(analytics_engine.get_trending_products, 6)
+        if trending:
+            response = ChatResponse(response_text="Trending in the mall right now:", action="recommend", data=trending)
+    if response is None and intent != 'llm':
+        intent_router.escalate()
+    return response
+
+async def answer_chat(query_text: str):
+    """The assistant's answer, and whether it is complete (the model answered or none is configured)."""
+    # Products are searched while the model answers; the fallback reuses them
+    products_task = None
+    if search_engine:
+        products_task = asyncio.ensure_future(executor.run_io(search_engine.search, query_text, top_k=6))
+
+    # Try Gemini first for intelligent, context-aware responses
+    if llm_gateway:
+        try:
+            prompt = create_shopping_assistant_prompt(query_text, mall_context.text)
+            ai_response = (await llm_gateway.generate(prompt)).strip()
+        except LLMUnavailable as e:
+            print(f"WARNING: {e}")
+            # Fall through to fallback search
+        else:
+            if is_declined(ai_response):
+                if products_task:
+                    products_task.cancel()
+                return assistant_response(ai_response, []), True
+
+            # Get product recommendations using search engine
+            products = await products_task if products_task else []
+            return assistant_response(ai_response, products), True
+
+    # Fallback: Use TF-IDF search engine
+    results = await products_task if products_task else []
+    return search_response(query_text, results), llm_gateway is None
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_chat(query_text: str):
+    """
+    Server-Sent Events for one chat message: `products` (the search
+    results, available in milliseconds) first, then the answer as
+    `token` events while the model produces it, then `done` with the
+    final action and full text.
+    """
+    products_adapter = _adapter(List[Product])
+    engine = search_engine
+    # Cached and locally routed answers are complete at once
+    response = chat_cache.get(query_text, engine)
+    if response is None:
+        response = await route_chat(query_text)
+        if response is not None:
+            chat_cache.put(query_text, response, engine)
+    if response is not None:
+        payload = response.model_dump(mode="json")
+        yield sse_event("products", payload["data"] if isinstance(payload["data"], list) else [])
+        yield sse_event("token", {"text": response.response_text})
+        yield sse_event("done", {"action": response.action, "response_text": response.response_text})
+        return
+
+    products = await executor.run_io(engine.search, query_text, top_k=6) if engine else []
+    yield sse_event("products", products_adapter.dump_python(products_adapter.validate_python(products), mode="json"))
+
+    text = ""
+    complete = llm_gateway is None
+    if llm_gateway:
+        try:
+            prompt = create_shopping_assistant_prompt(query_text, mall_context.text)
+            async for chunk in llm_gateway.stream(prompt):
+                text += chunk
+                yield sse_event("token", {"text": chunk})
+            complete = True
+        except LLMUnavailable as e:
+            print(f"WARNING: {e}")
+
+    if text.strip():
+        response = assistant_response(text.strip(), products)
+    else:
+        # No model, or it failed before its first token
+        response = search_response(query_text, products)
+        yield sse_event("token", {"text": response.response_text})
+    if complete:
+        chat_cache.put(query_text, response, engine)
+    yield sse_event("done", {"action": response.action, "response_text": response.response_text})
+
+@router.post("/chat/stream")
+async def chat_stream(query: ChatQuery):
+    """
+    Streaming variant of /chat/query over Server-Sent Events: product
+    recommendations are sent before the model starts answering, then
+    its tokens as they arrive.
+    """
+    return StreamingResponse(
+        stream_chat(query.text.strip()),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/catalog/search", response_model=List[Product])
-async def search_catalog(q: str):
+async def search_catalog(
+    q: str,
+    response: Response,
+    mode: str = "and",
+    prefix: bool = True,
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0)
+):
     """
-    Simple keyword search.
+    Keyword search over product names and descriptions.
+    `mode` 'and' requires every term, 'or' any term; with `prefix`, terms
+    also match longer words ("shoe" finds "shoes"). The total match count
+    is returned in the X-Total-Count header.
     """
-    results = items_df[items_df['name'].str.contains(q, case=False) | 
-                       items_df['description'].str.contains(q, case=False)]
-    return results.to_dict('records')
+    if not keyword_index:
+        raise HTTPException(status_code=503, detail="Catalog not loaded")
+    try:
+        rows = keyword_index.search(q, mode=mode, prefix=prefix)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
+    response.headers["X-Total-Count"] = str(len(rows))
+    return data_store.items_df.iloc[rows[offset:offset + limit]].to_dict('records')
 
-# --- Business Owner Endpoints ---
 
-@router.get("/stores/{store_id}/forecast", response_model=Forecast)
-async def get_store_forecast(store_id: str, horizon: int = 7):
+@router.post("/catalog/search/batch", response_model=List[SearchBatchResult])
+async def search_catalog_batch(request: SearchBatchRequest):
     """
-    Generates a simple Prophet forecast for a given store.
+    Product search for many queries in one call (e.g. re-ranking a
+    campaign's keyword list). Lexical queries are scored with one sparse
+    product; `mode` selects dense or hybrid scoring instead of the
+    server's default. Results are aligned with `queries`.
     """
-    if transactions_df.empty:
+    if not search_engine:
+        raise HTTPException(status_code=503, detail="Catalog not loaded")
+    if len(request.queries) > SEARCH_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"Too many queries (max {SEARCH_BATCH_MAX})")
+
+    results = await executor.run_io(search_engine.search_batch, request.queries, request.top_k, request.mode)
+    return [SearchBatchResult(query=query, results=hits) for query, hits in zip(request.queries, results)]
+
+
+# --- Business Owner Endpoints ---
+
+async def store_forecast(store_id: str, horizon: int, start: Optional[datetime] = None, end: Optional[datetime] = None):
+    if not data_store or data_store.transactions_df.empty or not forecast_service:
         raise HTTPException(status_code=404, detail="Transaction data not loaded")
+    if horizon < 1:
+        raise HTTPException(status_code=400, detail="Horizon must be at least 1 day.")
+    start, end = time_window(start, end)
+    if end is not None:
+        # Forecast far enough ahead to reach the end of the window
+        last_day = forecast_service.last_date(store_id)
+        if last_day is not None:
+            horizon = max(horizon, (end.floor('D') - last_day).days)
+        if horizon > MAX_FORECAST_HORIZON:
+            raise HTTPException(status_code=400, detail=f"Window ends more than {MAX_FORECAST_HORIZON} days ahead.")
 
-    store_sales = transactions_df[transactions_df['store_id'] == store_id]
-    if store_sales.empty:
-        # Fallback if specific store has no sales in synthetic data
-        # Use global data for demo purposes if store specific data is missing
-        store_sales = transactions_df 
-        # raise HTTPException(status_code=404, detail="No sales data for this store.")
+    # Stores without sales fall back to the mall-wide model for demo purposes
+    forecast = forecast_service.get_cached(store_id, horizon)
+    if forecast is None:
+        # Cache miss: the fit runs in the CPU pool, waited on from an I/O thread
+        try:
+            forecast = await executor.run_io(forecast_service.get_forecast, store_id, horizon)
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+    if start is None and end is None:
+        return forecast
 
-    # Aggregate sales by day
-    daily_sales = store_sales.set_index('timestamp').resample('D')['total_price'].sum().reset_index()
-    daily_sales = daily_sales.rename(columns={'timestamp': 'ds', 'total_price': 'y'})
+    # Only the forecast days inside [start, end)
+    days = pd.to_datetime(pd.Series(forecast["ds"]))
+    keep = pd.Series(True, index=days.index)
+    if start is not None:
+        keep &= days >= start.floor('D')
+    if end is not None:
+        keep &= days < end
+    return {k: [v for v, kept in zip(values, keep) if kept] for k, values in forecast.items()}
 
-    if len(daily_sales) < 2:
-         raise HTTPException(status_code=404, detail="Not enough data for forecast.")
+@router.get("/stores", response_model=List[Store])
+async def list_stores(zone: Optional[str] = None, category: Optional[str] = None, tier: Optional[str] = None):
+    """
+    Lists the mall's stores, optionally only those in a zone, category
+    and/or tier (case-insensitive). Served from the store directory index.
+    """
+    if not analytics_engine:
+        raise HTTPException(status_code=503, detail="Store data not loaded")
+    return analytics_engine.stores.find(zone=zone, category=category, tier=tier)
 
-    # Fit Prophet model
-    m = Prophet(daily_seasonality=False, weekly_seasonality=True)
-    m.fit(daily_sales)
-    
-    # Make forecast
-    future = m.make_future_dataframe(periods=horizon)
-    forecast_df = m.predict(future)
-    
-    # Return forecast data
-    forecast_data = forecast_df.tail(horizon)
-    return {
-        "ds": forecast_data['ds'].dt.strftime('%Y-%m-%d').tolist(),
-        "yhat": forecast_data['yhat'].tolist(),
-        "yhat_lower": forecast_data['yhat_lower'].tolist(),
-        "yhat_upper": forecast_data['yhat_upper'].tolist()
-    }
+@router.get("/stores/{store_id}", response_model=Store)
+async def get_store(store_id: str):
+    """Returns one store's name, category, zone and tier."""
+    if not analytics_engine:
+        raise HTTPException(status_code=503, detail="Store data not loaded")
+    store = analytics_engine.stores.get(store_id)
+    if store is None:
+        raise HTTPException(status_code=404, detail=f"Unknown store '{store_id}'")
+    return store
 
-@router.get("/owner/{store_id}/insights", response_model=List[OwnerInsight])
-async def get_owner_insights(store_id: str):
+@router.get("/zones/{zone}/stores", response_model=List[Store])
+async def get_zone_stores(zone: str):
+    """Lists the stores in a mall zone."""
+    if not analytics_engine:
+        raise HTTPException(status_code=503, detail="Store data not loaded")
+    if not analytics_engine.stores.has_zone(zone):
+        raise HTTPException(status_code=404, detail=f"Unknown zone '{zone}'")
+    return analytics_engine.stores.find(zone=zone)
+
+@router.get("/stores/{store_id}/forecast", response_model=Forecast)
+async def get_store_forecast(
+    store_id: str,
+    horizon: int = 7,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
     """
-    Generates simple business insights and stock alerts.
+    Returns a Prophet sales forecast for a given store: the next `horizon`
+    days, or the forecast days within [start, end).
+    Served from the per-store model cache; models are only refit when the
+    store's transaction data changes.
     """
-    # 1. KPI: Total Sales (Last 7 days)
-    seven_days_ago = datetime.now() - pd.Timedelta(days=7)
-    store_sales = transactions_df[
-        (transactions_df['store_id'] == store_id) &
-        (transactions_df['timestamp'] >= seven_days_ago)
-    ]
-    total_sales = store_sales['total_price'].sum()
-    
-    # 2. Recommendation: Stockout Alert (Dummy logic)
-    try:
-        stockout_item = items_df[items_df['store_id'] == store_id].sample(1).iloc[0]['name']
-    except:
-        stockout_item = "N/A"
+    return await store_forecast(store_id, horizon, start, end)
+
+async def owner_insights(store_id: str):
+    if not data_store:
+        raise HTTPException(status_code=404, detail="Transaction data not loaded")
+
+    def compute_insights():
+        items_df = data_store.items_df
+        # 1. KPI: Total Sales (Last 7 days), summed from the hourly rollup
+        seven_days_ago = datetime.now() - pd.Timedelta(days=7)
+        total_sales, _ = analytics_engine.sales_total(store_id, start=seven_days_ago)
+        
+        # 2. Recommendation: Stockout Alert (Dummy logic)
+        try:
+            stockout_item = items_df[items_df['store_id'] == store_id].sample(1).iloc[0]['name']
+        except:
+            stockout_item = "N/A"
+        return total_sales, stockout_item
+
+    total_sales, stockout_item = await executor.run_io(compute_insights)
 
     return [
         OwnerInsight(
@@ -277,26 +590,160 @@ async def get_owner_insights(store_id: str):
         )
     ]
 
+@router.get("/owner/{store_id}/insights", response_model=List[OwnerInsight])
+async def get_owner_insights(store_id: str):
+    """
+    Generates simple business insights and stock alerts.
+    """
+    return await owner_insights(store_id)
+
+def dashboard_panels(store_id: str, horizon: int, start=None, end=None):
+    """
+    Panel name -> coroutine; the panels are independent of each other.
+    Every panel is scoped to the owner's store and, when given, to
+    [start, end) (the forecast to its days in the window).
+    """
+    window = {"store_id": store_id, "start": start, "end": end}
+    return {
+        "forecast": store_forecast(store_id, horizon, start, end),
+        "insights": owner_insights(store_id),
+        "market_basket": executor.run_io(partial(analytics_engine.market_basket_analysis, **window)),
+        "segments": customer_segments(**window),
+        # Seasonal, time habits and personas share one pass over transactions
+        "analytics": executor.run_io(partial(analytics_engine.dashboard_panels, **window)),
+        "sentiment": executor.run_io(partial(analytics_engine.sentiment_analysis, **window)),
+    }
+
+def _panel_error(exc: Exception) -> str:
+    return exc.detail if isinstance(exc, HTTPException) else f"{type(exc).__name__}: {exc}"
+
+async def stream_dashboard(panels):
+    """NDJSON lines {"panel": name, "data": ...} (or "error") in completion order."""
+    async def run(name, coro):
+        try:
+            return name, await coro, None
+        except Exception as e:
+            return name, None, _panel_error(e)
+
+    for next_panel in asyncio.as_completed([run(name, coro) for name, coro in panels.items()]):
+        name, result, error = await next_panel
+        if error is not None:
+            yield json.dumps({"panel": name, "error": error}) + "\n"
+            continue
+        for panel, data in (result.items() if name == "analytics" else [(name, result)]):
+            # Validated against the same field type as the one-shot payload
+            adapter = _adapter(OwnerDashboard.model_fields[panel].annotation)
+            data = adapter.dump_python(adapter.validate_python(data), mode="json")
+            yield json.dumps({"panel": panel, "data": data}) + "\n"
+
+@router.get("/owner/{store_id}/dashboard", response_model=OwnerDashboard)
+async def get_owner_dashboard(
+    store_id: str,
+    request: Request,
+    horizon: int = Query(7, ge=1, le=365),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    stream: bool = False
+):
+    """
+    Every OwnerView panel in one request. Independent panels run
+    concurrently; a failing panel is reported in `errors` instead of
+    failing the page (and such a payload is not cached). With `stream`,
+    panels are sent as NDJSON lines as they finish.
+    """
+    if not analytics_engine:
+        raise HTTPException(status_code=503, detail="Analytics engine not initialized")
+    start, end = time_window(start, end)
+
+    if stream:
+        return StreamingResponse(stream_dashboard(dashboard_panels(store_id, horizon, start, end)), media_type="application/x-ndjson")
+
+    async def compute():
+        panels = dashboard_panels(store_id, horizon, start, end)
+        results = await asyncio.gather(*panels.values(), return_exceptions=True)
+        dashboard = {"errors": {}}
+        for name, result in zip(panels, results):
+            if isinstance(result, Exception):
+                dashboard["errors"][name] = _panel_error(result)
+            elif name == "analytics":
+                dashboard.update(result)
+            else:
+                dashboard[name] = result
+        return dashboard
+
+    return await cached_response(
+        request, OwnerDashboard, compute, store_id, horizon, start, end,
+        cacheable=lambda dashboard: not dashboard["errors"]
+    )
+
 # --- NEW Analytics Endpoints ---
 
 @router.get("/analytics/market-basket", response_model=List[MarketBasketRule])
-async def get_market_basket_analysis():
+async def get_market_basket_analysis(
+    request: Request,
+    min_support: float = Query(0.01, ge=0, le=1),
+    top_n: int = Query(10, ge=1, le=1000),
+    sort_by: str = "lift",
+    store_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
     """
-    Returns association rules (items frequently bought together).
+    Returns association rules (items frequently bought together), mall-wide
+    or within one store, optionally over a [start, end) window.
+    `sort_by` is one of: lift, support, confidence.
     """
     if not analytics_engine:
         raise HTTPException(status_code=503, detail="Analytics engine not initialized")
-    return analytics_engine.market_basket_analysis()
+    params = (min_support, top_n, sort_by, store_id, *time_window(start, end))
 
-@router.get("/analytics/customer-segments", response_model=List[CustomerSegment])
-async def get_customer_segments():
+    async def compute():
+        try:
+            return await executor.run_io(analytics_engine.market_basket_analysis, *params)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    return await cached_response(request, List[MarketBasketRule], compute, *params)
+
+@router.get("/analytics/association-rules", response_model=AssociationRulePage)
+async def get_association_rules(
+    request: Request,
+    min_support: float = Query(0.01, gt=0, le=1),
+    min_confidence: float = Query(0.1, ge=0, le=1),
+    max_len: int = Query(4, ge=2, le=10),
+    sort_by: str = "lift",
+    limit: int = Query(20, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    store_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
     """
-    Returns customer segments based on clustering.
+    Returns directional association rules (antecedent -> consequent) mined
+    with FP-Growth, paginated, mall-wide or within one store, optionally
+    over a [start, end) window. `sort_by` is one of: lift, confidence,
+    support, conviction.
     """
     if not analytics_engine:
         raise HTTPException(status_code=503, detail="Analytics engine not initialized")
-    
-    segments = analytics_engine.customer_segmentation()
+    params = (min_support, min_confidence, max_len, sort_by, limit, offset, store_id, *time_window(start, end))
+
+    async def compute():
+        try:
+            return await executor.run_io(analytics_engine.association_rules, *params)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    return await cached_response(request, AssociationRulePage, compute, *params)
+
+async def customer_segments(store_id: Optional[str] = None, start=None, end=None):
+    if segment_service and store_id is None and start is None and end is None:
+        # Mall-wide: the incrementally maintained RFM segments
+        return [CustomerSegment(**s) for s in segment_service.summary()]
+
+    # Scoped: clustered on demand over the scope's customers
+    customer_metrics = await executor.run_io(analytics_engine.customer_metrics, store_id, start, end)
+    segments = await executor.run_cpu(fit_customer_segments, customer_metrics)
     # Map dictionary keys to match Pydantic model
     return [
         CustomerSegment(
@@ -309,10 +756,28 @@ async def get_customer_segments():
         ) for s in segments
     ]
 
+@router.get("/analytics/customer-segments", response_model=List[CustomerSegment])
+async def get_customer_segments(
+    request: Request,
+    store_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
+    """
+    Returns customer segments based on clustering, mall-wide or among one
+    store's customers, optionally over a [start, end) window. Mall-wide
+    segments are read from the incrementally updated RFM segmentation.
+    """
+    if not analytics_engine:
+        raise HTTPException(status_code=503, detail="Analytics engine not initialized")
+    params = (store_id, *time_window(start, end))
+    return await cached_response(request, List[CustomerSegment], partial(customer_segments, *params), *params)
+
 @router.get("/customers/{customer_id}/insights", response_model=CustomerInsight)
 async def get_customer_insights(customer_id: str):
     """
     Returns insights for a specific customer.
+    A hash lookup into the profile store, so it runs on the event loop.
     """
     if not analytics_engine:
         raise HTTPException(status_code=503, detail="Analytics engine not initialized")
@@ -322,38 +787,239 @@ async def get_customer_insights(customer_id: str):
         raise HTTPException(status_code=404, detail="Customer not found")
     return insights
 
+@router.get("/customers/{customer_id}/segment", response_model=CustomerSegmentAssignment)
+async def get_customer_segment(customer_id: str):
+    """
+    Returns the customer's RFM segment. A hash lookup into the
+    segmentation service, so it runs on the event loop.
+    """
+    if not segment_service:
+        raise HTTPException(status_code=503, detail="Segmentation service not initialized")
+
+    segment = segment_service.segment(customer_id)
+    if not segment:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    return segment
+
+@router.get("/customers/{customer_id}/recommendations", response_model=List[Recommendation])
+async def get_customer_recommendations(customer_id: str, n: int = Query(5, ge=1, le=50)):
+    """
+    Returns personalized product recommendations (item-item collaborative
+    filtering); customers without purchase history get trending products.
+    """
+    if not analytics_engine:
+        raise HTTPException(status_code=503, detail="Analytics engine not initialized")
+    return await executor.run_io(analytics_engine.get_personalized_recommendations, customer_id, n)
+
+@router.get("/analytics/trending", response_model=List[TrendingItem])
+async def get_trending(
+    n: int = Query(10, ge=1, le=100),
+    store_id: Optional[str] = None,
+    category: Optional[str] = None
+):
+    """
+    Returns trending products by exponentially decayed sales, mall-wide or
+    within a store and/or category. Served from precomputed rankings.
+    """
+    if not analytics_engine:
+        raise HTTPException(status_code=503, detail="Analytics engine not initialized")
+    return analytics_engine.trending.top(n, store_id=store_id, category=category)
+
 @router.get("/analytics/seasonal-analysis", response_model=List[SeasonalAnalysis])
-async def get_seasonal_analysis():
+async def get_seasonal_analysis(
+    request: Request,
+    store_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
     """
-    Returns monthly sales trends.
+    Returns monthly sales trends, mall-wide or for one store, optionally over a
+    [start, end) window.
     """
     if not analytics_engine:
         raise HTTPException(status_code=503, detail="Analytics engine not initialized")
-    return analytics_engine.seasonal_analysis()
+    params = (store_id, *time_window(start, end))
+    return await cached_response(request, List[SeasonalAnalysis], partial(executor.run_io, analytics_engine.seasonal_analysis, *params), *params)
 
 @router.get("/analytics/time-habits", response_model=TimeHabits)
-async def get_time_habits():
+async def get_time_habits(
+    request: Request,
+    store_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
     """
-    Returns sales by day of week and hour of day.
+    Returns sales by day of week and hour of day, mall-wide or for one store, optionally over a
+    [start, end) window.
     """
     if not analytics_engine:
         raise HTTPException(status_code=503, detail="Analytics engine not initialized")
-    return analytics_engine.time_based_habits()
+    params = (store_id, *time_window(start, end))
+    return await cached_response(request, TimeHabits, partial(executor.run_io, analytics_engine.time_based_habits, *params), *params)
 
 @router.get("/analytics/sentiment", response_model=List[SentimentAnalysis])
-async def get_sentiment_analysis():
+async def get_sentiment_analysis(
+    request: Request,
+    store_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
     """
-    Returns sentiment analysis of reviews.
+    Returns sentiment analysis of reviews, mall-wide or for one store, optionally over a
+    [start, end) window.
     """
     if not analytics_engine:
         raise HTTPException(status_code=503, detail="Analytics engine not initialized")
-    return analytics_engine.sentiment_analysis()
+    params = (store_id, *time_window(start, end))
+    return await cached_response(request, List[SentimentAnalysis], partial(executor.run_io, analytics_engine.sentiment_analysis, *params), *params)
 
 @router.get("/analytics/persona-insights", response_model=List[PersonaAnalysis])
-async def get_persona_insights():
+async def get_persona_insights(
+    request: Request,
+    store_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
     """
-    Returns spending habits by customer persona.
+    Returns spending habits by customer persona, mall-wide or for one store, optionally over a
+    [start, end) window.
     """
     if not analytics_engine:
         raise HTTPException(status_code=503, detail="Analytics engine not initialized")
-    return analytics_engine.persona_analysis()
\ No newline at end of file
+    params = (store_id, *time_window(start, end))
+    return await cached_response(request, List[PersonaAnalysis], partial(executor.run_io, analytics_engine.persona_analysis, *params), *params)
+
+
+# --- Ingestion Endpoints ---
+
+async def ingest_records(table: str, records: list) -> IngestResult:
+    """Appends a micro-batch to `table`; engines update incrementally."""
+    if not data_store:
+        raise HTTPException(status_code=503, detail="Data store not initialized")
+    if len(records) > INGEST_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {INGEST_MAX_BATCH} records)")
+
+    batch = pd.DataFrame([record.model_dump(mode="json") for record in records])
+    if table == "transactions" and not batch.empty:
+        # Stored like the CSV: comma-separated item_ids
+        batch["items"] = batch["items"].str.join(",")
+    try:
+        added = await executor.run_io(data_store.ingest, table, batch) if records else batch
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return IngestResult(
+        table=table,
+        received=len(records),
+        accepted=len(added),
+        total_rows=len(data_store.tables[table]),
+        data_version=data_store.version
+    )
+
+@router.post("/ingest/transactions", response_model=IngestResult)
+async def ingest_transactions(records: List[TransactionRecord]):
+    """
+    Appends new transactions. Customer aggregates, basket counts and
+    per-store daily sales are updated from the batch alone.
+    """
+    return await ingest_records("transactions", records)
+
+@router.post("/ingest/items", response_model=IngestResult)
+async def ingest_items(records: List[ItemRecord]):
+    """
+    Appends new catalogue items and makes them searchable.
+    """
+    return await ingest_records("items", records)
+
+@router.post("/ingest/reviews", response_model=IngestResult)
+async def ingest_reviews(records: List[ReviewRecord]):
+    """
+    Appends new customer reviews.
+    """
+    return await ingest_records("reviews", records)
+
+
+# --- System Endpoints ---
+
+@router.get("/system/executor", response_model=ExecutorStats)
+async def get_executor_stats():
+    """
+    Returns concurrency limits and queue depth for the worker pools.
+    """
+    return executor.stats()
+
+@router.get("/system/router", response_model=RouterStats)
+async def get_router_stats():
+    """
+    Returns how chat messages were routed and the share that reached the LLM.
+    """
+    if not intent_router:
+        raise HTTPException(status_code=503, detail="Intent router disabled")
+    return intent_router.stats()
+
+@router.get("/system/chat-cache", response_model=ChatCacheStats)
+async def get_chat_cache_stats():
+    """
+    Returns chat answer cache size and hit/miss counters.
+    """
+    return chat_cache.stats()
+
+@router.get("/system/llm", response_model=LLMStats)
+async def get_llm_stats():
+    """
+    Returns the LLM gateway's limits, in-flight calls and outcome counters.
+    """
+    if not llm_gateway:
+        raise HTTPException(status_code=503, detail="No LLM configured")
+    return llm_gateway.stats()
+
+@router.get("/system/cache", response_model=CacheStats)
+async def get_cache_stats():
+    """
+    Returns response cache size and hit/miss counters.
+    """
+    return response_cache.stats()
+
+def ingest_search(table, batch):
+    """
+    Data store listener (runs under the write lock): swaps in a search
+    engine that also covers the new catalogue rows. Queries already
+    running keep the engine they started with.
+    """
+    global search_engine
+    if table == 'items' and search_engine:
+        search_engine = search_engine.with_items(batch)
+
+def rebuild_search_engine() -> ProductSearchEngine:
+    """
+    Builds (or loads the persisted artifact of) an index over the current
+    catalogue, then swaps it in. Queries already running keep the engine
+    they started with; items ingested during the build are added before
+    the swap so none are lost.
+    """
+    global search_engine
+    items_df = data_store.items_df
+    engine = ProductSearchEngine(
+        items_df, index=os.getenv("SEARCH_INDEX", "inverted"), artifact_dir=SEARCH_INDEX_DIR,
+        mode=SEARCH_MODE, hybrid_weight=SEARCH_HYBRID_WEIGHT
+    )
+    with data_store.write_lock:
+        engine = search_engine = engine.with_items(data_store.items_df.iloc[len(items_df):])
+    return engine
+
+@router.post("/admin/search/reload", response_model=SearchIndexInfo)
+async def reload_search_index():
+    """
+    Atomically replaces the search index with one built for the current
+    catalogue (loaded from disk when another worker already built it).
+    """
+    if not data_store:
+        raise HTTPException(status_code=503, detail="Catalog not loaded")
+    engine = await executor.run_io(rebuild_search_engine)
+    return engine.info()
+
+@router.get("/system/search-index", response_model=SearchIndexInfo)
+async def get_search_index_info():
+    """Version, size and load time of the active search index."""
+    if not search_engine:
+        raise HTTPException(status_code=503, detail="Catalog not loaded")
+    return search_engine.info()
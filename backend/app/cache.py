@@ -0,0 +1,289 @@
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache for serialized endpoint responses.
+
+    Keys include the data version, so an ingest makes every older entry
+    unreachable; `invalidate()` additionally drops them to free memory.
+    Concurrent misses for the same key share one computation.
+    """
+
+    def __init__(self, max_entries=256, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, etag, body)
+        self._pending = {}  # key -> asyncio.Future of an in-flight miss
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "256")),
+            ttl=float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+        )
+
+    def get(self, key):
+        """Returns (etag, body) or None; expired entries are dropped."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, etag, body = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            return etag, body
+
+    @staticmethod
+    def etag(body):
+        return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+    def put(self, key, body):
+        """Stores a serialized body and returns its ETag."""
+        etag = self.etag(body)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return etag
+
+    async def get_or_compute(self, key, compute):
+        """
+        Returns (etag, body, hit). On a miss `compute()` (a coroutine
+        function returning (body bytes, whether to store it)) runs once even
+        if several requests for the same key arrive while it is in flight.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached[0], cached[1], True
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.hits += 1
+            etag, body = await asyncio.shield(pending)
+            return etag, body, True
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            body, store = await compute()
+            etag = self.put(key, body) if store else self.etag(body)
+            future.set_result((etag, body))
+            return etag, body, False
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters see the error; mark it retrieved for when there are none
+            future.exception()
+            raise
+        finally:
+            del self._pending[key]
+
+    def invalidate(self):
+        """Drops every entry (called when the data version changes)."""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            entries = len(self._entries)
+            size_bytes = sum(len(body) for _, _, body in self._entries.values())
+        return {
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "entries": entries,
+            "size_bytes": size_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+
+# Chat filler words and articles dropped by ChatResponseCache.normalize
+# ("show me running shoes" -> "running shoes"). Negation and comparison
+# words ("not", "under", "more", ...) change the answer, so they stay.
+CHAT_FILLER_WORDS = frozenset(
+    "hi hello hey please me my you can could would show find get some any want wanted "
+    "looking look need buy recommend suggest suggestions options "
+    "search searching shop shopping help thanks thank an the".split()
+)
+
+_TOKEN_PATTERN = re.compile(r"\b\w\w+\b")
+
+
+class ChatResponseCache:
+    """
+    LRU + TTL cache of chat answers (ChatResponse objects), bounded by
+    entry count and by the size of their serialized bodies.
+
+    Queries are keyed on normalized text: lower-cased words without
+    filler words and articles, deduplicated in order, so rephrasings that
+    only differ in those share an entry. With `similarity` set, a miss is also
+    matched against cached queries by TF-IDF cosine, weighting words with
+    the search engine's idf (words it does not know count as rarest), and
+    served if the best match reaches the threshold. Answers depend on the
+    catalogue, so `invalidate()` runs whenever it changes.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=4 * 1024 * 1024, ttl=600.0, similarity=0.9):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries = OrderedDict()  # key -> (expires_at, response, size, vector)
+        self._postings = {}  # word -> keys of cached queries containing it
+        self._lock = threading.Lock()
+        self.size_bytes = 0
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls):
+        similarity = os.getenv("CHAT_CACHE_SIMILARITY", "0.9")
+        return cls(
+            max_entries=int(os.getenv("CHAT_CACHE_SIZE", "1024")),
+            max_bytes=int(os.getenv("CHAT_CACHE_MAX_BYTES", str(4 * 1024 * 1024))),
+            ttl=float(os.getenv("CHAT_CACHE_TTL", "600")),
+            similarity=float(similarity) if similarity else None
+        )
+
+    @staticmethod
+    def normalize(text):
+        words = dict.fromkeys(
+            word for word in _TOKEN_PATTERN.findall(text.lower())
+            if word not in CHAT_FILLER_WORDS
+        )
+        return " ".join(words)
+
+    @staticmethod
+    def _vector(key, search_engine):
+        """Unit-length idf weights per word of a normalized query."""
+        words = key.split()
+        vocabulary, idf = search_engine.vocabulary, search_engine.idf
+        unseen = float(idf.max()) if len(idf) else 1.0
+        weights = np.array([idf[vocabulary[w]] if w in vocabulary else unseen for w in words])
+        return dict(zip(words, (weights / np.linalg.norm(weights)).tolist()))
+
+    def _drop(self, key):
+        _, _, size, vector = self._entries.pop(key)
+        self.size_bytes -= size
+        for word in vector or ():
+            keys = self._postings[word]
+            keys.discard(key)
+            if not keys:
+                del self._postings[word]
+
+    def _live(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < now:
+            self._drop(key)
+            self.evictions += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def get(self, text, search_engine=None):
+        """Cached answer for `text` (exact or, given `search_engine`, similar), or None."""
+        key = self.normalize(text)
+        if not key:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            response = self._live(key, now)
+            if response is not None:
+                self.hits += 1
+                return response
+            if self.similarity is not None and search_engine is not None:
+                vector = self._vector(key, search_engine)
+                scores = {}
+                for word, weight in vector.items():
+                    for other in self._postings.get(word, ()):
+                        scores[other] = scores.get(other, 0.0) + weight * self._entries[other][3][word]
+                for other, score in sorted(scores.items(), key=lambda item: -item[1]):
+                    if score < self.similarity:
+                        break
+                    response = self._live(other, now)
+                    if response is not None:
+                        self.hits += 1
+                        self.similar_hits += 1
+                        return response
+            self.misses += 1
+        return None
+
+    def put(self, text, response, search_engine=None):
+        """Caches `response` (a pydantic model) for `text`."""
+        key = self.normalize(text)
+        size = len(response.model_dump_json())
+        if not key or size > self.max_bytes:
+            return
+        vector = self._vector(key, search_engine) if self.similarity is not None and search_engine is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, response, size, vector)
+            self.size_bytes += size
+            for word in vector or ():
+                self._postings.setdefault(word, set()).add(key)
+            while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def on_ingest(self, table, batch):
+        """Data store listener: new catalogue or store rows can change any answer."""
+        if table in ('items', 'stores'):
+            self.invalidate()
+
+    def invalidate(self):
+        """Drops every entry (called when the catalogue changes)."""
+        with self._lock:
+            self._entries.clear()
+            self._postings.clear()
+            self.size_bytes = 0
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "similarity": self.similarity,
+                "entries": len(self._entries),
+                "size_bytes": self.size_bytes,
+                "hits": self.hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
@@ -0,0 +1,218 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+
+class ExecutorBusy(RuntimeError):
+    """Raised when a lane's wait queue is full and the task is rejected."""
+
+
+class _Lane:
+    """
+    One bounded worker pool. At most `max_concurrency` tasks run at once;
+    up to `max_queue` more wait for a slot, anything beyond that is rejected.
+    Slots are one thread-safe semaphore shared by `run` (event loop callers)
+    and `call` (callers on other threads), so both obey the same limits.
+    """
+
+    def __init__(self, name, pool_factory, max_concurrency, max_queue):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._pool_factory = pool_factory
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._waiters = None  # threads that wait for a slot on behalf of `run`
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    @property
+    def pool(self):
+        # Pools are created on first use so importing the app stays cheap
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = self._pool_factory()
+        return self._pool
+
+    def _update(self, **deltas):
+        with self._stats_lock:
+            for field, delta in deltas.items():
+                setattr(self, field, getattr(self, field) + delta)
+
+    def _enqueue(self):
+        """Counts a caller waiting for a slot, or rejects it when the queue is full."""
+        with self._stats_lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise ExecutorBusy(f"{self.name} executor queue is full ({self.max_queue} waiting)")
+            self.queued += 1
+
+    async def _acquire(self):
+        """Takes a slot without blocking the event loop."""
+        if self._slots.acquire(blocking=False):
+            return
+        self._enqueue()
+        try:
+            if self._waiters is None:
+                with self._pool_lock:
+                    if self._waiters is None:
+                        self._waiters = ThreadPoolExecutor(
+                            max_workers=self.max_queue, thread_name_prefix=f"{self.name}-wait"
+                        )
+            waiter = asyncio.get_running_loop().run_in_executor(self._waiters, self._slots.acquire)
+            try:
+                await asyncio.shield(waiter)
+            except asyncio.CancelledError:
+                # The slot is still taken once free; hand it back
+                waiter.add_done_callback(lambda _: self._slots.release())
+                raise
+        finally:
+            self._update(queued=-1)
+
+    def _acquire_sync(self):
+        if self._slots.acquire(blocking=False):
+            return
+        self._enqueue()
+        try:
+            self._slots.acquire()
+        finally:
+            self._update(queued=-1)
+
+    async def run(self, fn, *args, **kwargs):
+        await self._acquire()
+        self._update(running=1)
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self.pool, partial(fn, *args, **kwargs))
+        except BrokenExecutor:
+            self._update(failed=1)
+            self._reset()
+            raise
+        except Exception:
+            self._update(failed=1)
+            raise
+        else:
+            self._update(completed=1)
+            return result
+        finally:
+            self._update(running=-1)
+            self._slots.release()
+
+    def call(self, fn, *args, **kwargs):
+        """Synchronous submit-and-wait, for callers already off the event loop."""
+        self._acquire_sync()
+        self._update(running=1)
+        try:
+            result = self.pool.submit(fn, *args, **kwargs).result()
+        except BrokenExecutor:
+            self._update(failed=1)
+            self._reset()
+            raise
+        except Exception:
+            self._update(failed=1)
+            raise
+        else:
+            self._update(completed=1)
+            return result
+        finally:
+            self._update(running=-1)
+            self._slots.release()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected
+            }
+
+    def _reset(self):
+        # A worker died (e.g. OOM-killed); start a fresh pool on the next call
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        for pool in (self._pool, self._waiters):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = self._waiters = None
+
+
+class TaskExecutor:
+    """
+    Keeps blocking work off the event loop.
+
+    - `run_cpu` sends CPU-bound work (KMeans, Prophet fits, rule mining) to a
+      bounded process pool. Callables and arguments must be picklable, so
+      pass module-level functions and the data they need.
+    - `run_io` sends I/O-bound calls (LLM requests) and short blocking pandas
+      work to a bounded thread pool.
+    """
+
+    def __init__(self, cpu_workers=None, io_workers=16, cpu_mode="process", max_queue=64):
+        cpu_workers = cpu_workers or max(1, min(4, os.cpu_count() or 1))
+        self.cpu_mode = cpu_mode
+
+        if cpu_mode == "process":
+            # spawn: forking a process that already runs threads is unsafe
+            cpu_factory = partial(
+                ProcessPoolExecutor,
+                max_workers=cpu_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        else:
+            cpu_factory = partial(ThreadPoolExecutor, max_workers=cpu_workers, thread_name_prefix="cpu")
+
+        self.cpu = _Lane("cpu", cpu_factory, cpu_workers, max_queue)
+        self.io = _Lane(
+            "io",
+            partial(ThreadPoolExecutor, max_workers=io_workers, thread_name_prefix="io"),
+            io_workers,
+            max_queue
+        )
+
+    @classmethod
+    def from_env(cls):
+        """Builds an executor from EXECUTOR_* environment variables."""
+        cpu_workers = os.getenv("EXECUTOR_CPU_WORKERS")
+        return cls(
+            cpu_workers=int(cpu_workers) if cpu_workers else None,
+            io_workers=int(os.getenv("EXECUTOR_IO_WORKERS", "16")),
+            cpu_mode=os.getenv("EXECUTOR_CPU_MODE", "process"),
+            max_queue=int(os.getenv("EXECUTOR_MAX_QUEUE", "64"))
+        )
+
+    async def run_cpu(self, fn, *args, **kwargs):
+        return await self.cpu.run(fn, *args, **kwargs)
+
+    async def run_io(self, fn, *args, **kwargs):
+        return await self.io.run(fn, *args, **kwargs)
+
+    def call_cpu(self, fn, *args, **kwargs):
+        return self.cpu.call(fn, *args, **kwargs)
+
+    def stats(self):
+        return {
+            "cpu_mode": self.cpu_mode,
+            "cpu": self.cpu.stats(),
+            "io": self.io.stats()
+        }
+
+    def shutdown(self):
+        self.cpu.shutdown()
+        self.io.shutdown()
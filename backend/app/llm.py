@@ -0,0 +1,375 @@
+"""
+LLM gateway for the shopping assistant.
+
+Usage (from backend/), to run a local stub model server for tests and load
+runs (point LLM_STUB_URL at it instead of configuring Gemini):
+    python -m app.llm --port 8001 --delay 0.5 --token-delay 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class LLMUnavailable(RuntimeError):
+    """Raised when a call timed out, failed or was shed; callers fall back to search."""
+
+
+class GeminiClient:
+    """Async client for a google.generativeai GenerativeModel."""
+
+    name = 'gemini'
+
+    def __init__(self, model):
+        self.model = model
+
+    async def generate(self, prompt, timeout):
+        response = await self.model.generate_content_async(prompt, request_options={"timeout": timeout})
+        return response.text
+
+    async def stream(self, prompt, timeout):
+        response = await self.model.generate_content_async(
+            prompt, stream=True, request_options={"timeout": timeout}
+        )
+        async for chunk in response:
+            yield chunk.text
+
+
+class HTTPClient:
+    """
+    Client for a model server that answers POST {"prompt": ...} with
+    {"text": ...}, or with one {"text": ...} line per chunk if the request
+    has "stream": true, such as the stub server in this module. Requests
+    run in a thread, bounded by the call's deadline.
+    """
+
+    name = 'http'
+
+    def __init__(self, url):
+        self.url = url
+
+    def _open(self, prompt, timeout, stream=False):
+        payload = {"prompt": prompt, "stream": stream}
+        request = urllib.request.Request(
+            self.url, data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"}
+        )
+        return urllib.request.urlopen(request, timeout=timeout)
+
+    def _post(self, prompt, timeout):
+        with self._open(prompt, timeout) as response:
+            return json.loads(response.read())["text"]
+
+    async def generate(self, prompt, timeout):
+        return await asyncio.to_thread(self._post, prompt, timeout)
+
+    async def stream(self, prompt, timeout):
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+        done = object()
+
+        def read():
+            # Lines are handed to the event loop as they arrive
+            try:
+                with self._open(prompt, timeout, stream=True) as response:
+                    for line in response:
+                        loop.call_soon_threadsafe(chunks.put_nowait, json.loads(line)["text"])
+                loop.call_soon_threadsafe(chunks.put_nowait, done)
+            except Exception as e:
+                loop.call_soon_threadsafe(chunks.put_nowait, e)
+
+        reader = loop.run_in_executor(None, read)
+        try:
+            while True:
+                chunk = await chunks.get()
+                if chunk is done:
+                    break
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+        finally:
+            reader.cancel()
+
+
+def stub_answer(prompt):
+    """The canned answer of the stub model: echoes the prompt's user query."""
+    query = prompt.rsplit("User Query:", 1)[-1].split("\n", 1)[0].strip()
+    return f"Here are some options for {query or 'you'} from our stores."
+
+
+class FakeClient:
+    """
+    In-process stand-in for a model: answers with stub_answer after
+    `delay` seconds, streaming it word by word every `token_delay`.
+    """
+
+    name = 'fake'
+
+    def __init__(self, delay=0.0, token_delay=0.0):
+        self.delay = delay
+        self.token_delay = token_delay
+
+    async def generate(self, prompt, timeout):
+        await asyncio.sleep(self.delay)
+        return stub_answer(prompt)
+
+    async def stream(self, prompt, timeout):
+        await asyncio.sleep(self.delay)
+        for i, word in enumerate(stub_answer(prompt).split(" ")):
+            if i:
+                await asyncio.sleep(self.token_delay)
+            yield word if i == 0 else " " + word
+
+
+class LLMGateway:
+    """
+    Bounded, deadline-driven access to one model client.
+
+    At most `max_concurrency` calls are in flight; up to `max_queue` more
+    wait for a slot and anything beyond that is shed at once. Every call
+    has a `timeout` deadline that covers waiting for a slot, the request
+    and any retry, so a slow upstream costs a caller at most `timeout`
+    before it falls back. Failed calls are retried while the deadline
+    allows and retries stay within `retry_ratio` of all calls, so retries
+    cannot multiply the load on an upstream that is already failing.
+    """
+
+    def __init__(self, client, max_concurrency=8, max_queue=32, timeout=4.0, retry_ratio=0.1):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.retry_ratio = retry_ratio
+        self._semaphores = {}  # event loop -> asyncio.Semaphore
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.calls = 0
+        self.succeeded = 0
+        self.timeouts = 0
+        self.failed = 0
+        self.rejected = 0
+        self.retries = 0
+        self._latency_total = 0.0
+
+    @classmethod
+    def from_env(cls, client):
+        """Builds a gateway from LLM_* environment variables."""
+        return cls(
+            client,
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+            max_queue=int(os.getenv("LLM_MAX_QUEUE", "32")),
+            timeout=float(os.getenv("LLM_TIMEOUT", "4")),
+            retry_ratio=float(os.getenv("LLM_RETRY_RATIO", "0.1"))
+        )
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    def _update(self, **deltas):
+        with self._lock:
+            for field, delta in deltas.items():
+                setattr(self, field, getattr(self, field) + delta)
+
+    def _may_retry(self):
+        with self._lock:
+            if self.retries >= self.retry_ratio * self.calls:
+                return False
+            self.retries += 1
+            return True
+
+    async def _acquire(self):
+        """Takes a concurrency slot, waiting at most `timeout`; returns the semaphore to release."""
+        semaphore = self._semaphore()
+        if not semaphore.locked():
+            # A free slot is taken without yielding
+            await semaphore.acquire()
+            return semaphore
+        if self.queued >= self.max_queue:
+            self._update(rejected=1)
+            raise LLMUnavailable(f"LLM queue is full ({self.max_queue} waiting)")
+        self._update(queued=1)
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self._update(timeouts=1)
+            raise LLMUnavailable("Timed out waiting for an LLM slot") from None
+        finally:
+            self._update(queued=-1)
+        return semaphore
+
+    async def generate(self, prompt):
+        """The model's text for `prompt`; raises LLMUnavailable instead of waiting past the deadline."""
+        self._update(calls=1)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        semaphore = await self._acquire()
+
+        self._update(running=1)
+        started = loop.time()
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                try:
+                    text = await asyncio.wait_for(self.client.generate(prompt, remaining), remaining)
+                except asyncio.TimeoutError:
+                    self._update(timeouts=1)
+                    raise LLMUnavailable(f"LLM call exceeded {self.timeout}s") from None
+                except Exception as e:
+                    if deadline - loop.time() > 0 and self._may_retry():
+                        continue
+                    self._update(failed=1)
+                    raise LLMUnavailable(f"LLM call failed: {e}") from e
+                self._update(succeeded=1, _latency_total=loop.time() - started)
+                return text
+        finally:
+            self._update(running=-1)
+            semaphore.release()
+
+    async def stream(self, prompt):
+        """
+        Yields the model's text for `prompt` in chunks as they arrive.
+        `timeout` bounds the wait for a slot plus the first chunk, and
+        then each gap between chunks; past it LLMUnavailable is raised,
+        possibly after some chunks were yielded. Streams are not retried.
+        """
+        self._update(calls=1)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        semaphore = await self._acquire()
+
+        self._update(running=1)
+        started = loop.time()
+        chunks = self.client.stream(prompt, self.timeout)
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(anext(chunks), max(deadline - loop.time(), 0))
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    self._update(timeouts=1)
+                    raise LLMUnavailable(f"LLM stream stalled for {self.timeout}s") from None
+                except Exception as e:
+                    self._update(failed=1)
+                    raise LLMUnavailable(f"LLM stream failed: {e}") from e
+                deadline = loop.time() + self.timeout
+                yield chunk
+            self._update(succeeded=1, _latency_total=loop.time() - started)
+        finally:
+            await chunks.aclose()
+            self._update(running=-1)
+            semaphore.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "client": self.client.name,
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "timeout_seconds": self.timeout,
+                "queued": self.queued,
+                "running": self.running,
+                "calls": self.calls,
+                "succeeded": self.succeeded,
+                "timeouts": self.timeouts,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "retries": self.retries,
+                "avg_latency_ms": round(1000 * self._latency_total / self.succeeded, 2) if self.succeeded else None
+            }
+
+
+class MallContext:
+    """
+    Catalogue summary included in every assistant prompt, rebuilt only when
+    catalogue rows are ingested instead of on every message.
+    """
+
+    def __init__(self, data_store):
+        self.data_store = data_store
+        self.refresh()
+
+    def refresh(self):
+        """Rebuilds the summary of products and categories from the current catalogue."""
+        items_df = self.data_store.items_df if self.data_store else None
+        if items_df is None or items_df.empty:
+            self.text = "No product data available."
+            return
+
+        # Get unique categories and sample products
+        categories = items_df['category'].unique().tolist() if 'category' in items_df.columns else []
+        total_products = len(items_df)
+
+        # Get top 5 products by store frequency (most available)
+        popular_items = items_df['name'].value_counts().head(5).index.tolist() if 'name' in items_df.columns else []
+
+        self.text = f"""
+Mall Information:
+- Total Products: {total_products}
+- Categories Available: {', '.join(categories[:10])}
+- Popular Items: {', '.join(popular_items)}
+"""
+
+    def on_ingest(self, table, batch):
+        """Data store listener."""
+        if table == 'items':
+            self.refresh()
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+    token_delay = 0.0
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b"{}")
+        time.sleep(self.delay)
+        answer = stub_answer(payload.get("prompt", ""))
+        try:
+            if payload.get("stream"):
+                # One JSON line per word; the response ends when the connection closes
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.end_headers()
+                for i, word in enumerate(answer.split(" ")):
+                    if i:
+                        time.sleep(self.token_delay)
+                    self.wfile.write((json.dumps({"text": word if i == 0 else " " + word}) + "\n").encode())
+                    self.wfile.flush()
+                return
+            body = json.dumps({"text": answer}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except BrokenPipeError:
+            # The caller's deadline passed first
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_stub(port=8001, delay=0.0, token_delay=0.0):
+    """Runs a stub model server that answers every prompt after `delay` seconds."""
+    handler = type("StubHandler", (_StubHandler,), {"delay": delay, "token_delay": token_delay})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    print(f"Stub model server on http://127.0.0.1:{port}/ (delay {delay}s)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds before each answer")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds between streamed words")
+    args = parser.parse_args()
+    serve_stub(args.port, args.delay, args.token_delay)
@@ -1,8 +1,20 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from . import api
 from .api import router as api_router
+from .executor import ExecutorBusy
 
-app = FastAPI(title="AI Mall API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    if api.forecast_service:
+        api.forecast_service.stop()
+    api.executor.shutdown()
+
+app = FastAPI(title="AI Mall API", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -11,8 +23,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Cache", "X-Total-Count"],
 )
 
+@app.exception_handler(ExecutorBusy)
+async def executor_busy_handler(request: Request, exc: ExecutorBusy):
+    # Shed load instead of letting the wait queue grow without bound
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the AI Mall API"}
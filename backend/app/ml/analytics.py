@@ -1,269 +1,430 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
 import pandas as pd
 import numpy as np
 from sklearn.cluster import KMeans
 from sklearn.preprocessing import StandardScaler
-from collections import Counter
-from itertools import combinations
+from .basket import BasketEngine
+from .profiles import CustomerProfileStore
+from .recommender import ItemItemRecommender
+from .rollup import NS_PER_HOUR, SalesRollup, calendar
+from .segmentation import name_segments
+from .store_index import StoreIndex, to_timestamp_ns
+from .stores import StoreDirectory
+from .trending import TrendingEngine
+
+MONTH_NAMES = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+               'August', 'September', 'October', 'November', 'December']
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Basket engines built for store / date scopes, kept until the next ingest
+SCOPED_BASKET_CACHE_SIZE = 32
+
+
+def fit_customer_segments(customer_metrics, n_clusters=3):
+    """
+    Clusters per-customer metrics with K-Means and names each cluster.
+    Module-level so it can run in a worker process.
+    """
+    customer_metrics = customer_metrics.copy()
+    if customer_metrics.empty:
+        return []
+    # A single store or short window can have fewer customers than clusters
+    n_clusters = min(n_clusters, len(customer_metrics))
+
+    # 1. Normalize Data
+    scaler = StandardScaler()
+    features = customer_metrics[['total_spend', 'avg_txn_value', 'frequency']]
+    scaled_features = scaler.fit_transform(features)
+    
+    # 2. Apply K-Means
+    kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
+    customer_metrics['cluster'] = kmeans.fit_predict(scaled_features)
+    
+    # 3. Analyze Clusters
+    cluster_summary = customer_metrics.groupby('cluster').agg({
+        'total_spend': 'mean',
+        'avg_txn_value': 'mean',
+        'frequency': 'mean',
+        'customer_id': 'count'
+    }).reset_index()
+    
+    # Give clusters meaningful names (overall means computed once)
+    cluster_summary['segment_name'] = name_segments(
+        cluster_summary['total_spend'], cluster_summary['frequency'],
+        customer_metrics['total_spend'].mean(), customer_metrics['frequency'].mean()
+    )
+    
+    return cluster_summary.to_dict('records')
+
 
 class MallAnalytics:
-    def __init__(self, transactions_df, customers_df, items_df, reviews_df=None):
-        self.transactions_df = transactions_df
-        self.customers_df = customers_df
-        self.items_df = items_df
-        self.reviews_df = reviews_df
+    """
+    Mall-wide analytics over a MallDataStore. Reads the store's current
+    tables on every call, and keeps incrementally updated aggregates
+    (basket counts, per-customer totals) in step with ingested batches.
+
+    Every analytics method takes an optional `store_id` and [start, end)
+    window. Scoped calls read only the matching rows, located through
+    store -> row-range indexes over transactions and reviews. Sales totals
+    and the seasonal / time-of-day views come from an hourly store rollup,
+    reading raw rows only for the partial hours at the edges of a window.
+    """
+
+    def __init__(self, data, mine_fn=None):
+        self.data = data
+        self.basket_engine = BasketEngine(data.transactions_df, data.items_df, mine_fn=mine_fn)
+        self._customer_totals = self._aggregate_customers(data.transactions_df)
+        # Store attributes by store_id / zone / category / tier, shared with the API
+        self.stores = StoreDirectory(data.stores_df)
+        self.profiles = CustomerProfileStore(data.transactions_df, data.customers_df, self.stores)
+        self.recommender = ItemItemRecommender(data.transactions_df, data.items_df)
+        self.trending = TrendingEngine(data.transactions_df, data.items_df)
+        self.transaction_index = StoreIndex(data.transactions_df)
+        self.review_index = StoreIndex(data.reviews_df)
+        self.rollup = SalesRollup(data.transactions_df)
+        # Scoped basket engines (LRU), and futures of the ones being built;
+        # shared by request threads, so guarded by a lock
+        self._scoped_baskets = OrderedDict()
+        self._pending_baskets = {}
+        self._baskets_lock = threading.Lock()
+
+    @property
+    def transactions_df(self):
+        return self.data.transactions_df
+
+    @property
+    def customers_df(self):
+        return self.data.customers_df
+
+    @property
+    def items_df(self):
+        return self.data.items_df
+
+    @property
+    def reviews_df(self):
+        return self.data.reviews_df
+
+    @staticmethod
+    def _aggregate_customers(transactions_df):
+        if transactions_df.empty:
+            return pd.DataFrame(columns=['total_spend', 'frequency'], dtype=float)
+        totals = transactions_df.groupby('customer_id')['total_price'].agg(['sum', 'count'])
+        totals.columns = ['total_spend', 'frequency']
+        return totals
+
+    def on_ingest(self, table, batch):
+        """Updates derived state from a newly ingested batch."""
+        self.stores.on_ingest(table, batch)
+        self.profiles.on_ingest(table, batch)
+        self.recommender.on_ingest(table, batch)
+        self.trending.on_ingest(table, batch)
+        if table == 'transactions':
+            self.basket_engine.add_transactions(batch['items'])
+            self._customer_totals = self._customer_totals.add(
+                self._aggregate_customers(batch), fill_value=0
+            )
+            self.transaction_index.append(batch, lambda: self.transactions_df)
+            self.rollup.add_transactions(batch)
+            self._clear_scoped_baskets()
+        elif table == 'items':
+            self.basket_engine.add_items(batch)
+            self._clear_scoped_baskets()
+        elif table == 'reviews':
+            self.review_index.append(batch, lambda: self.reviews_df)
+
+    @staticmethod
+    def _is_scoped(store_id, start, end):
+        return store_id is not None or start is not None or end is not None
+
+    def scoped_transactions(self, store_id=None, start=None, end=None):
+        """Transactions of `store_id` (all stores if None) with start <= timestamp < end."""
+        rows = self.transaction_index.rows(store_id, start, end)
+        return self.transactions_df if rows is None else self.transactions_df.take(rows)
+
+    def scoped_reviews(self, store_id=None, start=None, end=None):
+        """Reviews of `store_id` (all stores if None) with start <= timestamp < end."""
+        if self.reviews_df is None or self.reviews_df.empty:
+            return self.reviews_df
+        rows = self.review_index.rows(store_id, start, end)
+        return self.reviews_df if rows is None else self.reviews_df.take(rows)
+
+    def _basket_engine(self, store_id, start, end):
+        """The mall-wide basket engine, or one built over the scoped transactions."""
+        if not self._is_scoped(store_id, start, end):
+            return self.basket_engine
+        key = (store_id, start, end)
+        with self._baskets_lock:
+            engine = self._scoped_baskets.get(key)
+            if engine is not None:
+                self._scoped_baskets.move_to_end(key)
+                return engine
+            # Concurrent misses for the same scope share one build
+            pending = self._pending_baskets.get(key)
+            building = pending is None
+            if building:
+                pending = self._pending_baskets[key] = Future()
+        if not building:
+            return pending.result()
+
+        try:
+            engine = BasketEngine(
+                self.scoped_transactions(store_id, start, end), self.items_df,
+                mine_fn=self.basket_engine.mine_fn
+            )
+        except Exception as e:
+            with self._baskets_lock:
+                if self._pending_baskets.get(key) is pending:
+                    del self._pending_baskets[key]
+            pending.set_exception(e)
+            raise
+        with self._baskets_lock:
+            # Not cached if an ingest cleared the cache during the build
+            if self._pending_baskets.get(key) is pending:
+                del self._pending_baskets[key]
+                self._scoped_baskets[key] = engine
+                while len(self._scoped_baskets) > SCOPED_BASKET_CACHE_SIZE:
+                    self._scoped_baskets.popitem(last=False)
+        pending.set_result(engine)
+        return engine
+
+    def _clear_scoped_baskets(self):
+        with self._baskets_lock:
+            self._scoped_baskets.clear()
+            self._pending_baskets.clear()
+
+    def _split_window(self, start, end):
+        """
+        Splits [start, end) into whole hour buckets [first_hour, end_hour)
+        (None bounds are open) and the partial-hour edges as timestamp pairs.
+        """
+        start_ns, end_ns = to_timestamp_ns(start), to_timestamp_ns(end)
+        first_hour = None if start_ns is None else -(-start_ns // NS_PER_HOUR)
+        end_hour = None if end_ns is None else end_ns // NS_PER_HOUR
+        if first_hour is not None and end_hour is not None and end_hour <= first_hour:
+            # Window inside one hour: no whole buckets, all raw rows
+            return first_hour, first_hour, [(start_ns, end_ns)]
+        edges = []
+        if start_ns is not None:
+            edges.append((start_ns, first_hour * NS_PER_HOUR))
+        if end_ns is not None:
+            edges.append((end_hour * NS_PER_HOUR, end_ns))
+        return first_hour, end_hour, [(lo, hi) for lo, hi in edges if hi > lo]
+
+    def _edge_transactions(self, store_id, edges):
+        frames = [self.scoped_transactions(store_id, pd.Timestamp(lo), pd.Timestamp(hi)) for lo, hi in edges]
+        return [frame for frame in frames if not frame.empty]
+
+    def sales_total(self, store_id=None, start=None, end=None):
+        """
+        (revenue, transaction count) of `store_id` (whole mall if None)
+        within [start, end). Whole hours are summed from the rollup; only
+        the partial hours at either edge are read from raw rows.
+        """
+        first_hour, end_hour, edges = self._split_window(start, end)
+        revenue, count = self.rollup.totals(store_id, first_hour, end_hour)
+        for edge in self._edge_transactions(store_id, edges):
+            revenue += float(edge['total_price'].sum())
+            count += len(edge)
+        return revenue, count
+
+    def hourly_sales(self, store_id=None, start=None, end=None):
+        """
+        (hour buckets, revenue) of `store_id` (whole mall if None) within
+        [start, end), from the rollup plus the raw rows of partial edge hours.
+        Buckets may repeat when an edge falls in the same hour as a bucket.
+        """
+        first_hour, end_hour, edges = self._split_window(start, end)
+        hours, revenue, _ = self.rollup.hourly(store_id, first_hour, end_hour)
+        parts = [(hours, revenue)]
+        for edge in self._edge_transactions(store_id, edges):
+            edge_hours = edge['timestamp'].to_numpy(dtype='datetime64[ns]').view(np.int64) // NS_PER_HOUR
+            parts.append((edge_hours, edge['total_price'].to_numpy()))
+        return np.concatenate([h for h, _ in parts]), np.concatenate([r for _, r in parts])
 
-    def market_basket_analysis(self, min_support=0.01):
+    def market_basket_analysis(self, min_support=0.01, top_n=10, sort_by='lift',
+                               store_id=None, start=None, end=None):
         """
         Implements a simplified Market Basket Analysis (Association Rules)
         to find items frequently bought together.
         """
-        # 1. Parse items from transactions
-        transactions = self.transactions_df['items'].apply(lambda x: x.split(',')).tolist()
-        
-        # 2. Count item pairs
-        pair_counts = Counter()
-        item_counts = Counter()
-        
-        for txn in transactions:
-            unique_items = set(txn) # Use set to avoid counting duplicates in same txn
-            for item in unique_items:
-                item_counts[item] += 1
-            
-            for pair in combinations(sorted(unique_items), 2):
-                pair_counts[pair] += 1
-                
-        # 3. Calculate Support and Confidence
-        total_txns = len(transactions)
-        rules = []
-        
-        for pair, count in pair_counts.items():
-            support = count / total_txns
-            if support >= min_support:
-                item_A, item_B = pair
-                
-                # Rule A -> B
-                conf_A_to_B = count / item_counts[item_A]
-                # Rule B -> A
-                conf_B_to_A = count / item_counts[item_B]
-                
-                # Get item names (safely)
-                try:
-                    name_A = self.items_df[self.items_df['item_id'] == item_A]['name'].iloc[0]
-                    name_B = self.items_df[self.items_df['item_id'] == item_B]['name'].iloc[0]
-                except IndexError:
-                    continue # Skip if item not found
-                
-                rules.append({
-                    'pair': f"{name_A} + {name_B}",
-                    'support': round(support, 3),
-                    'confidence': round(max(conf_A_to_B, conf_B_to_A), 3),
-                    'lift': round(support / ((item_counts[item_A]/total_txns) * (item_counts[item_B]/total_txns)), 3)
-                })
-                
-        return sorted(rules, key=lambda x: x['lift'], reverse=True)[:10]
-
-    def customer_segmentation(self, n_clusters=3):
+        return self._basket_engine(store_id, start, end).pair_rules(min_support, top_n, sort_by)
+
+    def association_rules(self, min_support=0.01, min_confidence=0.1, max_len=None,
+                          sort_by='lift', limit=20, offset=0, store_id=None, start=None, end=None):
+        """
+        Frequent-itemset mining (FP-Growth) with directional rules,
+        returned one page at a time.
+        """
+        engine = self._basket_engine(store_id, start, end)
+        return engine.rules_page(min_support, min_confidence, max_len, sort_by, limit, offset)
+
+    def _totals(self, store_id=None, start=None, end=None):
+        if not self._is_scoped(store_id, start, end):
+            return self._customer_totals
+        return self._aggregate_customers(self.scoped_transactions(store_id, start, end))
+
+    def customer_metrics(self, store_id=None, start=None, end=None):
+        """
+        Per-customer features used for segmentation, read from the
+        incrementally maintained totals (or aggregated from the scoped
+        transactions):
+        - Total Spend
+        - Frequency (Number of transactions)
+        - Average Transaction Value
+        """
+        totals = self._totals(store_id, start, end)
+        customer_metrics = pd.DataFrame({
+            'customer_id': totals.index,
+            'total_spend': totals['total_spend'].to_numpy(),
+            'avg_txn_value': (totals['total_spend'] / totals['frequency']).to_numpy(),
+            'frequency': totals['frequency'].to_numpy().astype(np.int64)
+        })
+        return customer_metrics
+
+    def customer_segmentation(self, n_clusters=3, store_id=None, start=None, end=None):
         """
         Segments customers using K-Means clustering based on:
         - Total Spend
         - Frequency (Number of transactions)
         - Average Transaction Value
         """
-        # 1. Aggregate customer data
-        customer_metrics = self.transactions_df.groupby('customer_id').agg({
-            'total_price': ['sum', 'mean'],
-            'txn_id': 'count'
-        }).reset_index()
-        
-        customer_metrics.columns = ['customer_id', 'total_spend', 'avg_txn_value', 'frequency']
-        
-        # 2. Normalize Data
-        scaler = StandardScaler()
-        features = customer_metrics[['total_spend', 'avg_txn_value', 'frequency']]
-        scaled_features = scaler.fit_transform(features)
-        
-        # 3. Apply K-Means
-        kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-        customer_metrics['cluster'] = kmeans.fit_predict(scaled_features)
-        
-        # 4. Analyze Clusters
-        cluster_summary = customer_metrics.groupby('cluster').agg({
-            'total_spend': 'mean',
-            'avg_txn_value': 'mean',
-            'frequency': 'mean',
-            'customer_id': 'count'
-        }).reset_index()
-        
-        # Give clusters meaningful names
-        def name_cluster(row):
-            if row['total_spend'] > customer_metrics['total_spend'].mean() and row['frequency'] > customer_metrics['frequency'].mean():
-                return "High Value / Loyal"
-            elif row['total_spend'] < customer_metrics['total_spend'].mean() and row['frequency'] > customer_metrics['frequency'].mean():
-                return "Frequent / Low Spender"
-            elif row['total_spend'] > customer_metrics['total_spend'].mean() and row['frequency'] < customer_metrics['frequency'].mean():
-                return "Big Spender / Occasional"
-            else:
-                return "Low Value / Occasional"
-
-        cluster_summary['segment_name'] = cluster_summary.apply(name_cluster, axis=1)
-        
-        return cluster_summary.to_dict('records')
+        return fit_customer_segments(self.customer_metrics(store_id, start, end), n_clusters)
+
+    @staticmethod
+    def _sum_by(keys, revenue, labels):
+        """Revenue summed per key, as (label, total) for keys that occur, in key order."""
+        present = np.unique(keys)
+        totals = np.zeros(len(labels), dtype=revenue.dtype)
+        np.add.at(totals, keys, revenue)
+        return [(labels[key], totals[key].item()) for key in present]
 
-    def seasonal_analysis(self):
+    def seasonal_analysis(self, store_id=None, start=None, end=None):
         """
         Analyzes sales trends by month to identify seasonal patterns.
         """
-        df = self.transactions_df.copy()
-        df['month'] = df['timestamp'].dt.month_name()
-        df['month_num'] = df['timestamp'].dt.month
-        
-        seasonal_sales = df.groupby(['month_num', 'month'])['total_price'].sum().reset_index()
-        seasonal_sales = seasonal_sales.sort_values('month_num')
-        
-        return seasonal_sales[['month', 'total_price']].to_dict('records')
+        hours, revenue = self.hourly_sales(store_id, start, end)
+        months, _, _ = calendar(hours)
+
+        seasonal_sales = self._sum_by(months, revenue, [None] + MONTH_NAMES)
+        return [{'month': month, 'total_price': total} for month, total in seasonal_sales]
 
-    def time_based_habits(self):
+    def time_based_habits(self, store_id=None, start=None, end=None):
         """
         Analyzes shopping habits by Day of Week and Hour of Day.
         """
-        df = self.transactions_df.copy()
-        df['day_of_week'] = df['timestamp'].dt.day_name()
-        df['hour'] = df['timestamp'].dt.hour
-        
+        hours, revenue = self.hourly_sales(store_id, start, end)
+        _, weekdays, hours_of_day = calendar(hours)
+
         # Day of Week Analysis
-        day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        df['day_of_week'] = pd.Categorical(df['day_of_week'], categories=day_order, ordered=True)
-        daily_sales = df.groupby('day_of_week')['total_price'].sum().reset_index()
-        
+        daily_sales = self._sum_by(weekdays, revenue, DAY_NAMES)
+
         # Hourly Analysis
-        hourly_sales = df.groupby('hour')['total_price'].sum().reset_index()
-        
+        hourly_sales = self._sum_by(hours_of_day, revenue, list(range(24)))
+
+        return {
+            "daily_sales": [{'day_of_week': day, 'total_price': total} for day, total in daily_sales],
+            "hourly_sales": [{'hour': hour, 'total_price': total} for hour, total in hourly_sales]
+        }
+
+    def dashboard_panels(self, store_id=None, start=None, end=None):
+        """
+        The transaction-level dashboard panels: seasonal and time habits are
+        read from the hourly rollup, personas from one merge.
+        """
         return {
-            "daily_sales": daily_sales.to_dict('records'),
-            "hourly_sales": hourly_sales.to_dict('records')
+            "seasonal": self.seasonal_analysis(store_id, start, end),
+            "time_habits": self.time_based_habits(store_id, start, end),
+            "personas": self.persona_analysis(store_id, start, end)
         }
 
-    def sentiment_analysis(self):
+    def sentiment_analysis(self, store_id=None, start=None, end=None):
         """
         Analyzes customer reviews to determine overall sentiment and key themes.
         """
-        if self.reviews_df is None or self.reviews_df.empty:
+        reviews_df = self.scoped_reviews(store_id, start, end)
+        if reviews_df is None or reviews_df.empty:
             return []
             
-        # Aggregate ratings
-        sentiment_summary = self.reviews_df.groupby('rating').size().reset_index(name='count')
-        
         # Simple sentiment classification
         def classify_sentiment(rating):
             if rating >= 4: return 'Positive'
             elif rating == 3: return 'Neutral'
             else: return 'Negative'
             
-        self.reviews_df['sentiment'] = self.reviews_df['rating'].apply(classify_sentiment)
-        sentiment_trends = self.reviews_df.groupby('sentiment').size().reset_index(name='count')
+        # Classified into a local Series: the shared reviews frame is not mutated
+        sentiment = reviews_df['rating'].apply(classify_sentiment).rename('sentiment')
+        sentiment_trends = sentiment.groupby(sentiment).size().reset_index(name='count')
         
         return sentiment_trends.to_dict('records')
 
-    def persona_analysis(self):
+    def persona_analysis(self, store_id=None, start=None, end=None):
         """
         Analyzes spending habits by customer persona.
         """
-        # Merge transactions with customers to get persona
-        merged_df = self.transactions_df.merge(self.customers_df, on='customer_id', how='left')
-        
-        persona_spend = merged_df.groupby('persona').agg({
-            'total_price': 'mean',
-            'txn_id': 'count'
-        }).reset_index()
+        # Per-customer totals (one row per customer, not per transaction)
+        # joined to persona; customers without a profile are left out
+        totals = self._totals(store_id, start, end)
+        customers = self.customers_df
+        if customers.empty or totals.empty:
+            return []
+        personas = pd.Series(
+            customers['persona'].astype(str).to_numpy(),
+            index=customers['customer_id'].astype(str).to_numpy()
+        )
+        personas = personas[~personas.index.duplicated()]
+        merged_df = totals.assign(persona=personas.reindex(totals.index.astype(str)).to_numpy()).dropna(subset=['persona'])
         
-        persona_spend.columns = ['persona', 'avg_spend', 'txn_count']
-        return persona_spend.to_dict('records')
+        persona_spend = merged_df.groupby('persona')[['total_spend', 'frequency']].sum().reset_index()
+        persona_spend['avg_spend'] = persona_spend['total_spend'] / persona_spend['frequency']
+        persona_spend['txn_count'] = persona_spend['frequency'].astype(np.int64)
+        return persona_spend[['persona', 'avg_spend', 'txn_count']].to_dict('records')
 
     def get_customer_insights(self, customer_id):
         """
-        Returns detailed insights for a specific customer.
+        Returns detailed insights for a specific customer, or None if they
+        have no transactions. Served from the precomputed profile store.
         """
-        customer_txns = self.transactions_df[self.transactions_df['customer_id'] == customer_id]
-        if customer_txns.empty:
-            return None
-            
-        total_spend = customer_txns['total_price'].sum()
-        visit_count = len(customer_txns)
-        favorite_store_id = customer_txns['store_id'].mode().iloc[0]
-        favorite_store = self.items_df[self.items_df['store_id'] == favorite_store_id]['name'].iloc[0] if not self.items_df.empty else favorite_store_id
-        
-        # Get Persona
-        customer_info = self.customers_df[self.customers_df['customer_id'] == customer_id]
-        persona = customer_info['persona'].iloc[0] if not customer_info.empty else "Unknown"
-        
-        # Predict next purchase probability
-        purchase_prob = min(0.95, 0.1 * visit_count) 
-        
-    def get_trending_products(self, n=5):
+        return self.profiles.get(customer_id)
+
+    def get_trending_products(self, n=5, store_id=None):
         """
-        Returns top selling products (for First-Time Visitor Recommendation).
+        Returns trending products by time-decayed sales (for First-Time
+        Visitor Recommendation).
         """
-        # Parse all items sold
-        all_items = []
-        for items_str in self.transactions_df['items']:
-            all_items.extend(items_str.split(','))
-            
-        item_counts = Counter(all_items)
-        top_items = item_counts.most_common(n)
-        
-        results = []
-        for item_id, count in top_items:
-            item_info = self.items_df[self.items_df['item_id'] == item_id]
-            if not item_info.empty:
-                results.append({
-                    'item_id': item_id,
-                    'name': item_info['name'].iloc[0],
-                    'price': int(item_info['price'].iloc[0]),
-                    'sales_count': count,
-                    'reason': 'Popular among visitors'
-                })
-        return results
+        return [
+            {
+                'item_id': item['item_id'],
+                'name': item['name'],
+                'price': item['price'],
+                'sales_count': item['sales_count'],
+                'reason': 'Trending among visitors'
+            }
+            for item in self.trending.top(n, store_id=store_id)
+        ]
 
     def get_personalized_recommendations(self, customer_id, n=3):
         """
-        Returns personalized recommendations based on user history (Simulated ANN/Collaborative Filtering).
+        Returns personalized recommendations from item-item collaborative
+        filtering over the customer's purchase history. Customers without
+        history fall back to trending products.
         """
-        # 1. Get customer's past purchases
-        customer_txns = self.transactions_df[self.transactions_df['customer_id'] == customer_id]
-        if customer_txns.empty:
+        recommendations = self.recommender.recommend(customer_id, n)
+        if not recommendations:
             return self.get_trending_products(n) # Fallback to trending
-            
-        # 2. Identify preferred categories
-        past_items = []
-        for items_str in customer_txns['items']:
-            past_items.extend(items_str.split(','))
-            
-        past_item_details = self.items_df[self.items_df['item_id'].isin(past_items)]
-        if past_item_details.empty:
-             return self.get_trending_products(n)
+        return recommendations
 
-        top_category = past_item_details['category'].mode().iloc[0]
-        
-        # 3. Recommend items from that category that they haven't bought (Content-Based)
-        candidates = self.items_df[
-            (self.items_df['category'] == top_category) & 
-            (~self.items_df['item_id'].isin(past_items))
-        ]
-        
-        if candidates.empty:
-            candidates = self.items_df[~self.items_df['item_id'].isin(past_items)]
-            
-        recommendations = candidates.sample(min(n, len(candidates)))
-        
-        results = []
-        for _, item in recommendations.iterrows():
-            results.append({
-                'item_id': item['item_id'],
-                'name': item['name'],
-                'price': int(item['price']),
-                'reason': f"Because you like {top_category}"
-            })
-        return results
+    def get_recommendations_batch(self, customer_ids, n=3):
+        """Recommendations for many customers, scored in one vectorized call."""
+        batch = self.recommender.recommend_batch(customer_ids, n)
+        trending = None
+        for i, recommendations in enumerate(batch):
+            if not recommendations:
+                trending = trending if trending is not None else self.get_trending_products(n)
+                batch[i] = trending
+        return batch
 
     def predict_shop_placement(self, target_category):
         """
@@ -279,27 +440,23 @@ class MallAnalytics:
             target_persona = ['Professional', 'Parent']
             
         # 2. Find where these personas shop most (Zone analysis)
-        # Merge transactions -> customers -> items -> stores
-        merged = self.transactions_df.merge(self.customers_df, on='customer_id')
-        merged = merged[merged['persona'].isin(target_persona)]
-        
-        if merged.empty:
+        # Persona per transaction by customer_id, then store codes: zone
+        # and store footfall are counted with array lookups, not merges
+        customers = self.customers_df.drop_duplicates('customer_id')
+        personas = pd.Series(customers['persona'].astype(str).to_numpy(), index=customers['customer_id'].astype(str).to_numpy())
+        transactions = self.transactions_df
+        targeted = transactions['customer_id'].astype(str).map(personas).isin(target_persona).to_numpy()
+        codes = self.stores.codes(transactions['store_id'].to_numpy()[targeted])
+        codes = codes[codes >= 0]
+
+        if not len(codes):
             return "Zone A (High Traffic)" # Default
-            
-        # Get stores visited by these personas
-        store_counts = merged['store_id'].value_counts()
-        if store_counts.empty:
-             return "Zone A (High Traffic)"
 
-        top_store_id = store_counts.index[0]
-        top_store = self.items_df[self.items_df['store_id'] == top_store_id] # items_df has store_id but not zone directly, wait stores.csv has zone.
-        
-        # I need store zone info. It's in stores_df which I didn't pass to Analytics.
-        # I'll infer from items_df if possible, or just return a descriptive string.
-        # Actually I passed items_df, but not stores_df.
-        # I'll just return a "Near [Top Store]" recommendation.
-        
-        top_store_name = top_store['name'].iloc[0] if not top_store.empty else "Zara"
+        store_counts = np.bincount(codes, minlength=len(self.stores))
+        zone_counts = np.bincount(self.stores.zone_codes, weights=store_counts, minlength=len(self.stores.zones))
+        zone = int(zone_counts.argmax())
+        in_zone = np.where(self.stores.zone_codes == zone, store_counts, -1)
+        top_store_name = self.stores.columns['name'][int(in_zone.argmax())]
         
-        return f"Near {top_store_name} (High footfall of {', '.join(target_persona)})"
+        return f"Zone {self.stores.zones[zone]}, near {top_store_name} (High footfall of {', '.join(target_persona)})"
 
@@ -0,0 +1,274 @@
+import math
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from .itemsets import RULE_COLUMNS, RULE_SORT_METRICS, frequent_itemsets, generate_rules
+
+SORT_METRICS = ('lift', 'support', 'confidence')
+
+# Mined rule sets kept per (min_support, min_confidence, max_len)
+RULES_CACHE_SIZE = 16
+
+
+def split_baskets(items_series):
+    """
+    Splits the comma-separated `items` column into flat arrays:
+    (row position of each entry, item_id of each entry).
+    A categorical column splits each distinct basket once and gathers the
+    entries per row from those offsets.
+    """
+    if isinstance(items_series.dtype, pd.CategoricalDtype) and len(items_series):
+        codes = items_series.cat.codes.to_numpy()
+        distinct_rows, distinct_values = split_baskets(pd.Series(items_series.cat.categories, dtype=object))
+        distinct_lengths = np.bincount(distinct_rows, minlength=len(items_series.cat.categories))
+        offsets = np.concatenate([[0], np.cumsum(distinct_lengths)])
+
+        lengths = distinct_lengths[codes]
+        rows = np.repeat(np.arange(len(codes)), lengths)
+        row_starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        positions = np.arange(len(rows)) - np.repeat(row_starts, lengths) + np.repeat(offsets[codes], lengths)
+        return rows, distinct_values[positions]
+
+    baskets = items_series.fillna('').str.split(',')
+    lengths = baskets.str.len().to_numpy()
+    rows = np.repeat(np.arange(len(baskets)), lengths)
+    values = np.concatenate(baskets.to_numpy()) if len(baskets) else np.array([], dtype=object)
+    return rows, values
+
+
+def _with_columns(matrix, n_cols, n_rows=None):
+    """Same CSR data with a wider shape (new columns/rows are empty)."""
+    matrix = sparse.csr_matrix(matrix)
+    n_rows = matrix.shape[0] if n_rows is None else n_rows
+    indptr = np.pad(matrix.indptr, (0, n_rows - matrix.shape[0]), mode='edge')
+    return sparse.csr_matrix((matrix.data, matrix.indices, indptr), shape=(n_rows, n_cols))
+
+
+class BasketEngine:
+    """
+    Market basket statistics over a sparse transaction x item incidence matrix.
+
+    Pair co-occurrence is a sparse product (X^T X) maintained incrementally
+    as batches of transactions arrive; support / confidence / lift are
+    computed as array operations over it. Item names come from a
+    precomputed item_id -> name index.
+
+    Itemsets larger than pairs are mined with FP-Growth through `mine_fn`
+    (defaults to running in-process) for the directional rule pages; the
+    pair view is computed from the pair counts alone.
+    """
+
+    def __init__(self, transactions_df, items_df, mine_fn=None):
+        self.mine_fn = mine_fn or frequent_itemsets
+        self._rules_cache = {}
+        self.item_ids = pd.Index([])
+        self.item_names = np.array([], dtype=object)
+        self.n_transactions = 0
+        self.item_counts = np.zeros(0, dtype=np.int64)
+        self.pair_counts = sparse.csr_matrix((0, 0), dtype=np.int64)
+        self._blocks = []
+        self._incidence = None
+
+        if not items_df.empty:
+            self.add_items(items_df)
+        if not transactions_df.empty:
+            self.add_transactions(transactions_df['items'])
+
+    @property
+    def incidence(self):
+        """Transaction x item matrix; appended blocks are stacked on first use."""
+        if self._incidence is None:
+            n_items = len(self.item_ids)
+            blocks = [_with_columns(block, n_items) for block in self._blocks]
+            self._incidence = (
+                sparse.vstack(blocks, format='csr') if blocks
+                else sparse.csr_matrix((0, n_items), dtype=np.int32)
+            )
+            self._blocks = [self._incidence]
+        return self._incidence
+
+    def add_items(self, items_df):
+        """Registers catalogue items (new ids get a column, known ids get their name)."""
+        names = items_df.drop_duplicates('item_id').set_index('item_id')['name']
+        new_ids = names.index.difference(self.item_ids, sort=False)
+        if len(new_ids):
+            self.item_ids = self.item_ids.append(new_ids)
+            self.item_names = np.concatenate([self.item_names, np.full(len(new_ids), None, dtype=object)])
+        self.item_names[self.item_ids.get_indexer(names.index)] = names.to_numpy(dtype=object)
+        self._grow(len(self.item_ids))
+        self._rules_cache.clear()
+
+    def _grow(self, n_items):
+        if len(self.item_counts) < n_items:
+            self.item_counts = np.pad(self.item_counts, (0, n_items - len(self.item_counts)))
+        if self.pair_counts.shape[0] < n_items:
+            self.pair_counts = _with_columns(self.pair_counts, n_items, n_rows=n_items)
+
+    def _encode(self, items_series):
+        rows, values = split_baskets(items_series)
+        codes = self.item_ids.get_indexer(values)
+
+        # Items sold but missing from the catalogue still count towards
+        # totals; they get a column without a name and never surface in rules
+        unknown = codes < 0
+        if unknown.any():
+            new_ids = pd.Index(pd.unique(values[unknown]))
+            self.item_ids = self.item_ids.append(new_ids)
+            self.item_names = np.concatenate([self.item_names, np.full(len(new_ids), None, dtype=object)])
+            codes = self.item_ids.get_indexer(values)
+
+        matrix = sparse.csr_matrix(
+            (np.ones(len(codes), dtype=np.int32), (rows, codes)),
+            shape=(len(items_series), len(self.item_ids))
+        )
+        # Duplicates within a basket count once
+        matrix.data[:] = 1
+        return matrix
+
+    def add_transactions(self, items_series):
+        """
+        Folds a batch of baskets into the counts: item counts and pair
+        co-occurrence are updated from the batch alone (X_b^T X_b).
+        """
+        block = self._encode(items_series)
+        self._grow(len(self.item_ids))
+        self._blocks.append(block)
+        self._incidence = None
+        self.n_transactions += block.shape[0]
+
+        self.item_counts += np.asarray(block.sum(axis=0)).ravel().astype(np.int64)
+        co_occurrence = (block.T @ block).astype(np.int64)
+        self.pair_counts = (self.pair_counts + sparse.triu(co_occurrence, k=1)).tocsr()
+        self._rules_cache.clear()
+
+    def _min_count(self, min_support):
+        return max(1, math.ceil(min_support * self.n_transactions - 1e-9))
+
+    def frequent_itemsets(self, min_support=0.01, max_len=None):
+        """
+        Returns {sorted tuple of item columns: count} for itemsets with
+        support >= `min_support`. Pairs come straight from the co-occurrence
+        matrix; longer itemsets are mined with FP-Growth.
+        """
+        min_count = self._min_count(min_support)
+        if max_len is not None and max_len <= 2:
+            singles = np.flatnonzero(self.item_counts >= min_count)
+            itemsets = {(int(i),): int(self.item_counts[i]) for i in singles}
+            if max_len == 2:
+                pairs = self.pair_counts.tocoo()
+                keep = pairs.data >= min_count
+                itemsets.update(
+                    ((int(a), int(b)), int(c))
+                    for a, b, c in zip(pairs.row[keep], pairs.col[keep], pairs.data[keep])
+                )
+            return itemsets
+        return self.mine_fn(self.incidence, min_count, max_len)
+
+    def association_rules(self, min_support=0.01, min_confidence=0.0, max_len=None):
+        """
+        Directional rules (antecedent -> consequent) as a DataFrame with
+        support, confidence, lift and conviction. Rules naming items missing
+        from the catalogue are dropped.
+        """
+        key = (min_support, min_confidence, max_len)
+        rules = self._rules_cache.get(key)
+        if rules is not None:
+            return rules
+
+        if self.n_transactions == 0:
+            rules = pd.DataFrame(columns=RULE_COLUMNS)
+        else:
+            itemsets = self.frequent_itemsets(min_support, max_len)
+            rules = generate_rules(itemsets, self.n_transactions, min_confidence)
+            if not rules.empty:
+                named = pd.notna(self.item_names)
+                known = [all(named[i] for i in a + c) for a, c in zip(rules['antecedent'], rules['consequent'])]
+                rules = rules[known].reset_index(drop=True)
+
+        if len(self._rules_cache) >= RULES_CACHE_SIZE:
+            self._rules_cache.pop(next(iter(self._rules_cache)))
+        self._rules_cache[key] = rules
+        return rules
+
+    def rules_page(self, min_support=0.01, min_confidence=0.1, max_len=None,
+                   sort_by='lift', limit=20, offset=0):
+        """
+        One page of directional rules ranked by `sort_by`
+        (one of RULE_SORT_METRICS), with item ids resolved to names.
+        """
+        if sort_by not in RULE_SORT_METRICS:
+            raise ValueError(f"sort_by must be one of {', '.join(RULE_SORT_METRICS)}")
+
+        rules = self.association_rules(min_support, min_confidence, max_len)
+        page = rules.sort_values(sort_by, ascending=False, kind='stable').iloc[offset:offset + limit]
+        return {
+            'total': len(rules),
+            'limit': limit,
+            'offset': offset,
+            'rules': [
+                {
+                    'antecedent': [self.item_names[i] for i in row.antecedent],
+                    'consequent': [self.item_names[i] for i in row.consequent],
+                    'antecedent_ids': [self.item_ids[i] for i in row.antecedent],
+                    'consequent_ids': [self.item_ids[i] for i in row.consequent],
+                    'support': round(float(row.support), 4),
+                    'confidence': round(float(row.confidence), 4),
+                    'lift': round(float(row.lift), 4),
+                    'conviction': round(float(row.conviction), 4) if np.isfinite(row.conviction) else None
+                }
+                for row in page.itertuples(index=False)
+            ]
+        }
+
+    def pair_rules(self, min_support=0.01, top_n=10, sort_by='lift'):
+        """
+        Returns the top `top_n` item pairs with support >= `min_support`,
+        ranked by `sort_by` (one of SORT_METRICS). Computed with array
+        operations straight from the pair counts (the same values as the
+        two directional rules of each pair); confidence is the stronger
+        of the two directions.
+        """
+        if sort_by not in SORT_METRICS:
+            raise ValueError(f"sort_by must be one of {', '.join(SORT_METRICS)}")
+        if self.n_transactions == 0 or top_n < 1:
+            return []
+
+        pairs = self.pair_counts.tocoo()
+        keep = pairs.data >= self._min_count(min_support)
+        item_a, item_b, counts = pairs.row[keep], pairs.col[keep], pairs.data[keep]
+
+        # Drop pairs involving items missing from the catalogue
+        named = pd.notna(self.item_names[item_a]) & pd.notna(self.item_names[item_b])
+        item_a, item_b, counts = item_a[named], item_b[named], counts[named]
+        if len(counts) == 0:
+            return []
+
+        # Name pairs in item_id order, independent of column order
+        id_rank = np.argsort(np.argsort(self.item_ids.to_numpy(dtype=str), kind='stable'))
+        swap = id_rank[item_a] > id_rank[item_b]
+        item_a, item_b = np.where(swap, item_b, item_a), np.where(swap, item_a, item_b)
+
+        n = self.n_transactions
+        count_a = self.item_counts[item_a]
+        count_b = self.item_counts[item_b]
+        metrics = {
+            'support': counts / n,
+            'confidence': counts / np.minimum(count_a, count_b),  # max(conf A->B, conf B->A)
+            'lift': counts * n / (count_a * count_b)
+        }
+
+        score = metrics[sort_by]
+        top = np.argpartition(-score, top_n - 1)[:top_n] if top_n < len(score) else np.arange(len(score))
+        top = top[np.argsort(-score[top], kind='stable')]
+
+        return [
+            {
+                'pair': f"{self.item_names[item_a[i]]} + {self.item_names[item_b[i]]}",
+                'support': round(float(metrics['support'][i]), 3),
+                'confidence': round(float(metrics['confidence'][i]), 3),
+                'lift': round(float(metrics['lift'][i]), 3)
+            }
+            for i in top
+        ]
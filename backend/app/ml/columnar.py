@@ -0,0 +1,169 @@
+"""
+Typed columnar snapshots of the CSV data directory.
+
+Each table is converted once into one .npy file per column and memory-mapped
+on later starts, so start-up does no CSV parsing and pages are shared
+between worker processes through the OS page cache:
+
+- low-cardinality string columns (store ids, categories) -> int codes +
+  categories
+- high-cardinality string columns (transaction ids, baskets, free text) ->
+  fixed-width UTF-8 bytes, memory-mapped like the numeric columns, so no
+  per-row objects are loaded
+- timestamps -> int64 nanoseconds
+- numeric columns -> stored as-is
+
+A snapshot is keyed by the source CSV's size and mtime; editing the CSV
+produces a new snapshot on the next start.
+
+Usage (from backend/), to convert ahead of deployment:
+    python -m app.ml.columnar ../data .cache/columnar
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+FORMAT_VERSION = 2
+
+# String columns with more distinct values than this fraction of their rows
+# are stored as text; fewer, as categories
+TEXT_RATIO = 0.25
+
+_FNV_OFFSET = 0xcbf29ce484222325
+_FNV_PRIME = np.uint64(0x100000001b3)
+
+# Columns parsed as datetimes on conversion
+TIMESTAMP_COLUMNS = {
+    'transactions': ('timestamp',),
+    'reviews': ('timestamp',),
+}
+
+
+def codes_dtype(n_categories):
+    """Smallest signed int dtype for category codes (the one pandas uses, so codes are not recast)."""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def is_text_column(n_categories, n_rows):
+    """Whether a string column is high-cardinality (stored as text rather than categories)."""
+    return n_categories > TEXT_RATIO * n_rows
+
+
+def to_text(values):
+    """Fixed-width UTF-8 bytes array for a sequence of strings."""
+    return np.array([value.encode() for value in values], dtype=bytes)
+
+
+def text_hashes(values):
+    """64-bit FNV-1a hash of each value of a fixed-width bytes array (NUL padding is skipped)."""
+    raw = np.ascontiguousarray(values).view(np.uint8).reshape(len(values), values.dtype.itemsize)
+    hashes = np.full(len(values), _FNV_OFFSET, dtype=np.uint64)
+    for i in range(raw.shape[1]):
+        byte = raw[:, i].astype(np.uint64)
+        hashes = np.where(byte != 0, (hashes ^ byte) * _FNV_PRIME, hashes)
+    return hashes
+
+
+def _fingerprint(csv_path):
+    stat = os.stat(csv_path)
+    return f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+
+def _snapshot_dir(cache_dir, table, csv_path):
+    return Path(cache_dir) / f"{table}-v{FORMAT_VERSION}-{_fingerprint(csv_path)}"
+
+
+def convert_table(csv_path, out_dir, timestamp_columns=()):
+    """Parses `csv_path` once and writes its typed columns under `out_dir`."""
+    df = pd.read_csv(csv_path)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    columns = []
+    for name in df.columns:
+        series = df[name]
+        if name in timestamp_columns:
+            values = pd.to_datetime(series).to_numpy(dtype='datetime64[ns]').view(np.int64)
+            np.save(out_dir / f"{name}.npy", values)
+            kind = 'timestamp'
+        elif pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+            np.save(out_dir / f"{name}.npy", series.to_numpy())
+            kind = 'numeric'
+        else:
+            codes, categories = pd.factorize(series.fillna(''), sort=True)
+            if is_text_column(len(categories), len(series)):
+                np.save(out_dir / f"{name}.npy", to_text(series.fillna('').astype(str)))
+                columns.append({'name': name, 'kind': 'text'})
+                continue
+            np.save(out_dir / f"{name}.codes.npy", codes.astype(codes_dtype(len(categories))))
+            np.save(out_dir / f"{name}.categories.npy", np.asarray(categories, dtype=str))
+            kind = 'category'
+        columns.append({'name': name, 'kind': kind})
+
+    meta = {'format': FORMAT_VERSION, 'rows': len(df), 'columns': columns}
+    (out_dir / 'meta.json').write_text(json.dumps(meta))
+    return meta
+
+
+def load_table(snapshot_dir):
+    """
+    Memory-maps a converted table. Returns {column: array} where category
+    columns are (codes, categories) pairs and text columns fixed-width
+    bytes arrays; timestamps are datetime64[ns] views of the stored int64s
+    (no copy).
+    """
+    snapshot_dir = Path(snapshot_dir)
+    meta = json.loads((snapshot_dir / 'meta.json').read_text())
+    columns = {}
+    for column in meta['columns']:
+        name, kind = column['name'], column['kind']
+        if kind == 'category':
+            codes = np.load(snapshot_dir / f"{name}.codes.npy", mmap_mode='r')
+            categories = np.load(snapshot_dir / f"{name}.categories.npy")
+            columns[name] = (codes, categories.astype(object))
+        else:
+            values = np.load(snapshot_dir / f"{name}.npy", mmap_mode='r')
+            columns[name] = values.view('datetime64[ns]') if kind == 'timestamp' else values
+    return columns
+
+
+def open_table(csv_path, cache_dir, table):
+    """
+    Returns the memory-mapped columns for `csv_path`, converting it first if
+    no snapshot matches the current file. Conversion writes to a temporary
+    directory that is renamed into place, so concurrent workers never see a
+    partial snapshot; stale snapshots of the table are removed.
+    """
+    cache_dir = Path(cache_dir)
+    target = _snapshot_dir(cache_dir, table, csv_path)
+    if not (target / 'meta.json').exists():
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=f".{table}-", dir=cache_dir))
+        convert_table(csv_path, staging, TIMESTAMP_COLUMNS.get(table, ()))
+        try:
+            os.rename(staging, target)
+        except OSError:
+            # Another worker finished the same snapshot first
+            shutil.rmtree(staging, ignore_errors=True)
+        for stale in cache_dir.glob(f"{table}-v*"):
+            if stale != target:
+                shutil.rmtree(stale, ignore_errors=True)
+    return load_table(target)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit(__doc__)
+    data_dir, cache_dir = Path(sys.argv[1]), Path(sys.argv[2])
+    for csv_path in sorted(data_dir.glob("*.csv")):
+        columns = open_table(csv_path, cache_dir, csv_path.stem)
+        print(f"{csv_path.name}: {len(columns)} columns -> {_snapshot_dir(cache_dir, csv_path.stem, csv_path)}")
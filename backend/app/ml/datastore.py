@@ -0,0 +1,319 @@
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .columnar import codes_dtype, is_text_column, open_table, text_hashes, to_text
+
+# Primary key per table; rows whose key already exists are skipped on ingest
+TABLE_KEYS = {
+    'transactions': 'txn_id',
+    'items': 'item_id',
+    'reviews': 'review_id',
+    'customers': 'customer_id',
+    'stores': 'store_id',
+}
+
+
+class TableBuffer:
+    """
+    Append-only, column-oriented table.
+
+    Each column lives in a NumPy array; low-cardinality string columns are
+    categorical (int codes + a growing list of categories), high-cardinality
+    ones fixed-width UTF-8 bytes, decoded only when a view is built. A text
+    key is deduplicated against a sorted array of its 64-bit hashes rather
+    than a set of strings; equal hashes are confirmed by comparing the
+    stored key bytes, so a collision never drops a row. The initial arrays
+    are adopted as-is, so memory-mapped snapshots stay shared and unread pages
+    stay on disk; the first append copies them into growable arrays with
+    spare capacity (doubling on growth), after which appending a
+    micro-batch copies only the batch. A DataFrame view is materialised
+    lazily and reused until the next append.
+    """
+
+    def __init__(self, columns, key=None):
+        """
+        Args:
+            columns: {name: array}, or {name: (codes, categories)} for
+                categorical columns; bytes arrays are text columns.
+            key: Primary key column; rows with a known key are skipped.
+        """
+        self.key = key
+        self.columns = list(columns)
+        self._arrays = {}
+        self._categories = {}
+        self._category_codes = {}
+        self._category_index = {}
+        self._text = set()
+        self._key_hashes = None  # sorted hashes of a text key, built on first ingest
+        self._key_order = None  # row of each sorted hash
+        self._frame = None
+        self._frame_size = -1
+        self._size = 0
+
+        for name, values in columns.items():
+            if isinstance(values, tuple):
+                codes, categories = values
+                self._arrays[name] = codes
+                self._categories[name] = categories
+            else:
+                self._arrays[name] = values
+                if values.dtype.kind == 'S':
+                    self._text.add(name)
+            self._size = len(self._arrays[name])
+
+        # A categorical key's categories are exactly the keys seen so far
+        self._keys = set()
+        if key in self.columns and key not in self._categories and key not in self._text:
+            self._keys = set(self._arrays[key][:self._size].tolist())
+
+    @classmethod
+    def from_frame(cls, df, key=None):
+        """Builds a buffer from a DataFrame; string columns become categorical or text."""
+        columns = {}
+        for name in df.columns:
+            series = df[name]
+            if pd.api.types.is_datetime64_any_dtype(series):
+                columns[name] = series.to_numpy(dtype='datetime64[ns]')
+            elif pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+                columns[name] = series.to_numpy()
+            else:
+                codes, categories = pd.factorize(series.fillna(''), sort=True)
+                if is_text_column(len(categories), len(series)):
+                    columns[name] = to_text(series.fillna('').astype(str))
+                    continue
+                columns[name] = (codes.astype(codes_dtype(len(categories))), np.asarray(categories, dtype=object))
+        return cls(columns, key=key)
+
+    def __len__(self):
+        return self._size
+
+    def _reserve(self, n_more):
+        needed = self._size + n_more
+        capacity = len(next(iter(self._arrays.values()))) if self._arrays else 0
+        if needed <= capacity and all(a.flags.writeable for a in self._arrays.values()):
+            return
+        new_capacity = max(needed, capacity * 2, 16)
+        for column, array in self._arrays.items():
+            grown = np.empty(new_capacity, dtype=array.dtype)
+            grown[:self._size] = array[:self._size]
+            self._arrays[column] = grown
+
+    def _promote(self, column, dtype):
+        self._arrays[column] = self._arrays[column].astype(dtype)
+
+    def _lookup(self, column):
+        """value -> code dict for a (low-cardinality) categorical column, built on first ingest."""
+        lookup = self._category_codes.get(column)
+        if lookup is None:
+            self._categories[column] = list(self._categories[column])
+            lookup = self._category_codes[column] = {value: code for code, value in enumerate(self._categories[column])}
+        return lookup
+
+    def _encode(self, column, values):
+        """Category codes for `values`, registering unseen categories."""
+        lookup = self._lookup(column)
+        categories = self._categories[column]
+        codes = np.empty(len(values), dtype=np.int64)
+        for i, value in enumerate(values):
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(categories)
+                categories.append(value)
+            codes[i] = code
+        if np.dtype(codes_dtype(len(categories))).itemsize > self._arrays[column].dtype.itemsize:
+            self._promote(column, codes_dtype(len(categories)))
+        self._category_index.pop(column, None)
+        return codes
+
+    def _known_keys(self, keys, hashes):
+        """Mask of the text `keys` (bytes, with their `hashes`) that are already in the table."""
+        if self._key_hashes is None:
+            stored_hashes = text_hashes(self._arrays[self.key][:self._size])
+            self._key_order = np.argsort(stored_hashes, kind='stable')
+            self._key_hashes = stored_hashes[self._key_order]
+        known, stored = self._key_hashes, self._arrays[self.key]
+        first = np.searchsorted(known, hashes, side='left')
+        last = np.searchsorted(known, hashes, side='right')
+        seen = np.zeros(len(keys), dtype=bool)
+        matched = np.flatnonzero(last > first)
+        seen[matched] = stored[self._key_order[first[matched]]] == keys[matched]
+        # Hash collisions: the key may be any of the rows sharing its hash
+        for i in matched[~seen[matched] & (last[matched] - first[matched] > 1)]:
+            seen[i] = np.any(stored[self._key_order[first[i]:last[i]]] == keys[i])
+        return seen
+
+    def append(self, batch):
+        """
+        Appends rows of `batch` (columns are aligned to the table's; rows
+        with an existing key are dropped). Returns the rows actually added,
+        converted to the table's column types.
+        """
+        batch = batch.reindex(columns=self.columns)
+        if self.key:
+            if self.key in self._text:
+                keys = to_text(batch[self.key].astype(str).tolist())
+                hashes = text_hashes(keys)
+                seen = self._known_keys(keys, hashes)
+            else:
+                known = self._lookup(self.key) if self.key in self._categories else self._keys
+                seen = np.fromiter((k in known for k in batch[self.key]), dtype=bool, count=len(batch))
+            keep = ~(seen | batch[self.key].duplicated().to_numpy())
+            batch = batch[keep]
+        if batch.empty:
+            return batch.reset_index(drop=True)
+
+        self._reserve(len(batch))
+        start, end = self._size, self._size + len(batch)
+        for column in self.columns:
+            dtype = self._arrays[column].dtype
+            values = batch[column]
+            if column in self._categories:
+                values = self._encode(column, values.fillna('').astype(str).tolist())
+            elif column in self._text:
+                values = to_text(values.fillna('').astype(str).tolist())
+                if values.dtype.itemsize > dtype.itemsize:
+                    self._promote(column, values.dtype)
+            elif np.issubdtype(dtype, np.datetime64):
+                # Stored as naive UTC, like the CSV timestamps; ISO 8601 per
+                # value, as a batch can mix precisions and offsets
+                values = pd.to_datetime(values, utc=True, format='ISO8601').dt.tz_convert(None).to_numpy(dtype='datetime64[ns]')
+            elif np.issubdtype(dtype, np.integer):
+                values = pd.to_numeric(values).to_numpy()
+                if not np.issubdtype(values.dtype, np.integer):
+                    # e.g. a fractional price arriving for an integer column
+                    self._promote(column, np.float64)
+            else:
+                values = values.to_numpy(dtype=dtype)
+            self._arrays[column][start:end] = values
+        self._size = end
+        if self.key in self._text:
+            # Merging two sorted runs (stable sort) is linear
+            merged = np.concatenate([self._key_hashes, hashes[keep]])
+            order = np.argsort(merged, kind='stable')
+            self._key_hashes = merged[order]
+            self._key_order = np.concatenate([self._key_order, np.arange(start, end)])[order]
+        elif self.key and self.key not in self._categories:
+            self._keys.update(batch[self.key].tolist())
+        return self._slice(start, end)
+
+    def _series_values(self, column, start, end):
+        values = self._arrays[column][start:end]
+        if column in self._text:
+            return np.char.decode(values, 'utf-8').astype(object)
+        if column not in self._categories:
+            return values
+        index = self._category_index.get(column)
+        if index is None:
+            index = self._category_index[column] = pd.Index(self._categories[column], dtype=str)
+        return pd.Categorical.from_codes(values, categories=index)
+
+    def _slice(self, start, end):
+        return pd.DataFrame({column: self._series_values(column, start, end) for column in self.columns}, copy=False)
+
+    def frame(self):
+        """DataFrame view of the current rows (rebuilt only after appends)."""
+        if self._frame_size != self._size:
+            self._frame = self._slice(0, self._size)
+            self._frame_size = self._size
+        return self._frame
+
+
+class MallDataStore:
+    """
+    Owns the mall's tables as append-only buffers and a monotonically
+    increasing data version. Engines that keep derived state subscribe to
+    ingests and update it from each micro-batch instead of recomputing.
+    """
+
+    def __init__(self, transactions_df, items_df, customers_df=None, reviews_df=None, stores_df=None):
+        """Each table is a DataFrame or an already built TableBuffer."""
+        self.tables = {}
+        for name, df in (
+            ('transactions', transactions_df),
+            ('items', items_df),
+            ('customers', customers_df),
+            ('reviews', reviews_df),
+            ('stores', stores_df),
+        ):
+            if not isinstance(df, TableBuffer):
+                df = TableBuffer.from_frame(df if df is not None else pd.DataFrame(), key=TABLE_KEYS[name])
+            self.tables[name] = df
+        self.version = 0
+        self._listeners = []
+        self._lock = threading.RLock()
+
+    @classmethod
+    def open(cls, data_dir, cache_dir):
+        """
+        Memory-maps the columnar snapshots of `data_dir`'s CSVs (converting
+        any that are missing or stale). transactions.csv and items.csv are
+        required; other tables are empty when their CSV is absent.
+        """
+        tables = {}
+        for name, key in TABLE_KEYS.items():
+            csv_path = Path(data_dir) / f"{name}.csv"
+            if not csv_path.exists():
+                if name in ('transactions', 'items'):
+                    raise FileNotFoundError(f"Data file not found at {csv_path}")
+                print(f"WARNING: {csv_path.name} not found.")
+                tables[name] = None
+                continue
+            tables[name] = TableBuffer(open_table(csv_path, cache_dir, name), key=key)
+        return cls(
+            tables['transactions'], tables['items'],
+            tables['customers'], tables['reviews'], tables['stores']
+        )
+
+    @property
+    def transactions_df(self):
+        return self.tables['transactions'].frame()
+
+    @property
+    def items_df(self):
+        return self.tables['items'].frame()
+
+    @property
+    def customers_df(self):
+        return self.tables['customers'].frame()
+
+    @property
+    def reviews_df(self):
+        return self.tables['reviews'].frame()
+
+    @property
+    def stores_df(self):
+        return self.tables['stores'].frame()
+
+    @property
+    def write_lock(self):
+        """Lock held while a batch is appended and listeners run; hold it to swap in rebuilt engines."""
+        return self._lock
+
+    def subscribe(self, listener):
+        """Registers `listener(table_name, batch_df)`, called after every ingest."""
+        self._listeners.append(listener)
+
+    def ingest(self, table, batch):
+        """
+        Appends a micro-batch to `table`, bumps the data version and notifies
+        subscribers with the rows that were actually added.
+        """
+        if table not in self.tables:
+            raise ValueError(f"Unknown table '{table}'")
+        buffer = self.tables[table]
+        if not buffer.columns:
+            raise ValueError(f"Table '{table}' has no schema loaded")
+        missing = [c for c in buffer.columns if c not in batch.columns]
+        if missing:
+            raise ValueError(f"Missing columns for {table}: {', '.join(missing)}")
+
+        with self._lock:
+            added = buffer.append(batch)
+            if not added.empty:
+                self.version += 1
+                for listener in self._listeners:
+                    listener(table, added)
+        return added
@@ -0,0 +1,248 @@
+import hashlib
+import json
+import os
+import threading
+from collections import defaultdict
+from pathlib import Path
+
+from prophet import Prophet
+from prophet.serialize import model_from_json, model_to_json
+
+# Key used for the mall-wide series (stores without sales fall back to it)
+GLOBAL_KEY = "__all__"
+
+
+def daily_sales_frame(transactions_df):
+    """
+    Aggregates transactions into one gap-free daily revenue series per store,
+    plus a mall-wide series under GLOBAL_KEY, in a single groupby pass.
+    """
+    if transactions_df.empty:
+        return {}
+
+    daily = transactions_df.groupby(
+        ['store_id', transactions_df['timestamp'].dt.floor('D')]
+    )['total_price'].sum()
+
+    series = {}
+    for store_id, store_daily in daily.groupby(level=0):
+        series[store_id] = _to_prophet_frame(store_daily.droplevel(0))
+    series[GLOBAL_KEY] = _to_prophet_frame(daily.groupby(level=1).sum())
+    return series
+
+
+def _to_prophet_frame(daily):
+    # Same shape as resample('D').sum(): missing days become zero-revenue days
+    daily = daily.asfreq('D', fill_value=0) if len(daily) > 1 else daily
+    frame = daily.reset_index()
+    frame.columns = ['ds', 'y']
+    return frame
+
+
+def series_version(daily_sales):
+    """Content fingerprint of a daily series; changes only when the data does."""
+    digest = hashlib.sha1()
+    digest.update(daily_sales['ds'].astype('int64').to_numpy().tobytes())
+    digest.update(daily_sales['y'].astype('float64').to_numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+def predict_forecast(model, horizon):
+    """Predicts the next `horizon` days from a fitted Prophet model."""
+    future = model.make_future_dataframe(periods=horizon)
+    forecast_df = model.predict(future).tail(horizon)
+    return {
+        "ds": forecast_df['ds'].dt.strftime('%Y-%m-%d').tolist(),
+        "yhat": forecast_df['yhat'].tolist(),
+        "yhat_lower": forecast_df['yhat_lower'].tolist(),
+        "yhat_upper": forecast_df['yhat_upper'].tolist()
+    }
+
+
+def fit_forecast(daily_sales, horizon):
+    """
+    Fits a Prophet model on a daily series and predicts `horizon` days ahead.
+    Returns the serialized model alongside the forecast.
+    """
+    model = Prophet(daily_seasonality=False, weekly_seasonality=True)
+    model.fit(daily_sales)
+    return {
+        "model": model_to_json(model),
+        "forecast": predict_forecast(model, horizon)
+    }
+
+
+class ForecastService:
+    """
+    Fits one Prophet model per store and serves forecasts from a cache keyed
+    by (store, data version). Models are only refit when a store's daily
+    sales series changes; fitted models and forecasts are persisted to
+    `cache_dir` so restarts reuse them.
+
+    `fit_fn(daily_sales, horizon)` performs the actual fit; pass a wrapper
+    to run it in a worker process instead of the calling thread.
+    """
+
+    def __init__(self, transactions_df, cache_dir=None, max_horizon=90, fit_fn=None):
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_horizon = max_horizon
+        self.fit_fn = fit_fn or fit_forecast
+        self._series = {}
+        self._versions = {}
+        self._cache = {}  # key -> {'version', 'model', 'forecast'}
+        self._locks = defaultdict(threading.Lock)
+        self._stop = threading.Event()
+
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.update_data(transactions_df)
+
+    def update_data(self, transactions_df):
+        """
+        Recomputes the per-store daily series. Cached forecasts whose series
+        fingerprint is unchanged stay valid; the rest are refit lazily.
+        """
+        series = daily_sales_frame(transactions_df)
+        self._series = series
+        self._versions = {key: series_version(s) for key, s in series.items()}
+
+    def on_ingest(self, table, batch):
+        """
+        Folds a batch of new transactions into the affected stores' daily
+        series. Only stores whose series changed get a new version (and a
+        lazy refit); every other store keeps serving its cached model.
+        """
+        if table != 'transactions' or batch.empty:
+            return
+        series = dict(self._series)
+        versions = dict(self._versions)
+        for key, batch_daily in daily_sales_frame(batch).items():
+            existing = series.get(key)
+            if existing is not None:
+                combined = existing.set_index('ds')['y'].add(batch_daily.set_index('ds')['y'], fill_value=0)
+                batch_daily = _to_prophet_frame(combined.sort_index())
+            series[key] = batch_daily
+            versions[key] = series_version(batch_daily)
+        self._series, self._versions = series, versions
+
+    def resolve_key(self, store_id):
+        """Maps a store to its series key (mall-wide if it has no sales)."""
+        return store_id if store_id in self._series else GLOBAL_KEY
+
+    def store_ids(self):
+        return [key for key in self._series if key != GLOBAL_KEY]
+
+    def last_date(self, store_id):
+        """Last day of the store's history (forecasts start the day after), or None."""
+        daily_sales = self._series.get(self.resolve_key(store_id))
+        if daily_sales is None or daily_sales.empty:
+            return None
+        return daily_sales['ds'].iloc[-1]
+
+    def warm(self, store_ids=None):
+        """Fits (or loads from disk) every store's model ahead of the first request."""
+        keys = store_ids if store_ids is not None else [GLOBAL_KEY] + self.store_ids()
+        for key in keys:
+            if self._stop.is_set():
+                break
+            try:
+                self.get_forecast(key, horizon=1)
+            except ValueError:
+                continue
+            except Exception as e:
+                print(f"WARNING: Forecast warm-up failed for {key}: {e}")
+
+    def stop(self):
+        """Stops an in-progress warm-up (called on shutdown)."""
+        self._stop.set()
+
+    def get_cached(self, store_id, horizon=7):
+        """Returns the forecast if it is already cached for the current data, else None."""
+        key = self.resolve_key(store_id)
+        entry = self._cache.get(key)
+        if entry is None or entry['version'] != self._versions.get(key):
+            return None
+        if horizon > len(entry['forecast']['ds']):
+            return None
+        return {k: v[:horizon] for k, v in entry['forecast'].items()}
+
+    def get_forecast(self, store_id, horizon=7):
+        """
+        Returns the next `horizon` days of forecast for a store, fitting the
+        model only if no cached model exists for the current data version.
+        """
+        cached = self.get_cached(store_id, horizon)
+        if cached is not None:
+            return cached
+
+        key = self.resolve_key(store_id)
+        daily_sales = self._series.get(key)
+        if daily_sales is None or len(daily_sales) < 2:
+            raise ValueError("Not enough data for forecast.")
+
+        with self._locks[key]:
+            version = self._versions[key]
+            entry = self._cache.get(key)
+            if entry is None or entry['version'] != version:
+                entry = self._load(key, version) or self._fit(key, version, daily_sales)
+                self._cache[key] = entry
+
+            if horizon > len(entry['forecast']['ds']):
+                # Longer horizon than cached: re-predict from the stored model, no refit
+                entry['forecast'] = predict_forecast(self._model(entry), horizon)
+                self._save(key, entry)
+
+        return {k: v[:horizon] for k, v in entry['forecast'].items()}
+
+    def _fit(self, key, version, daily_sales):
+        fitted = self.fit_fn(daily_sales, self.max_horizon)
+        entry = {'version': version, 'model': fitted['model'], 'forecast': fitted['forecast']}
+        self._save(key, entry)
+        return entry
+
+    def _model(self, entry):
+        if not isinstance(entry['model'], Prophet):
+            entry['model'] = model_from_json(entry['model'])
+        return entry['model']
+
+    def _path(self, key, version):
+        return self.cache_dir / f"{key}-{version}.json"
+
+    def _load(self, key, version):
+        if not self.cache_dir:
+            return None
+        path = self._path(key, version)
+        if not path.exists():
+            return None
+        try:
+            with open(path) as f:
+                payload = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"WARNING: Ignoring unreadable forecast cache {path}: {e}")
+            return None
+        return {'version': version, 'model': payload['model'], 'forecast': payload['forecast']}
+
+    def _save(self, key, entry):
+        if not self.cache_dir:
+            return
+        model = entry['model']
+        payload = {
+            'store_id': key,
+            'version': entry['version'],
+            'model': model_to_json(model) if isinstance(model, Prophet) else model,
+            'forecast': entry['forecast']
+        }
+        path = self._path(key, entry['version'])
+        tmp_path = path.with_suffix('.tmp')
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(payload, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"WARNING: Could not persist forecast cache {path}: {e}")
+            return
+
+        # Drop files for superseded versions of this store
+        for stale in self.cache_dir.glob(f"{key}-*.json"):
+            if stale != path:
+                stale.unlink(missing_ok=True)
@@ -0,0 +1,244 @@
+import re
+import threading
+import time
+
+import numpy as np
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS, TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+
+from .keyword_index import tokenize
+
+INTENTS = ['search', 'price', 'store', 'trending', 'llm']
+
+# Catalogue mentions are replaced by these tokens before classification,
+# so the model learns the phrasing around entities, not the entities
+ITEM, CATEGORY, STORE = 'xitemx', 'xcategoryx', 'xstorex'
+
+# Seed utterances per intent, written with the entity tokens above
+SEED_UTTERANCES = {
+    'search': [
+        "xitemx", "show me xitemx", "do you have xitemx", "i want xitemx", "i am looking for xitemx",
+        "looking for xcategoryx", "xcategoryx items", "buy xitemx", "find xitemx", "any xitemx",
+        "xstorex xitemx", "xitemx from xstorex", "show me xcategoryx", "i need xitemx", "get me xitemx",
+        "search xitemx", "xitemx please", "xcategoryx", "show xitemx", "do you sell xitemx", "xitemx at xstorex",
+    ],
+    'price': [
+        "how much is xitemx", "how much does xitemx cost", "price of xitemx", "what is the price of xitemx",
+        "xitemx price", "cost of xitemx", "what does xitemx cost", "cheapest xitemx", "xitemx prices",
+        "how expensive is xitemx", "price for xitemx at xstorex", "how much are xitemx", "xitemx cost",
+        "how much for xitemx", "prices of xcategoryx", "cheap xitemx", "xitemx under budget",
+    ],
+    'store': [
+        "where is xstorex", "where can i find xstorex", "xstorex location", "which zone is xstorex in",
+        "where is the xstorex store", "how do i get to xstorex", "is there a xstorex", "xstorex store",
+        "where are xcategoryx stores", "which stores sell xcategoryx", "find xstorex", "locate xstorex",
+        "what floor is xstorex on", "where is xstorex located", "xcategoryx stores", "xstorex zone",
+    ],
+    'trending': [
+        "what is trending", "what's trending", "trending products", "popular items", "most popular products",
+        "best sellers", "bestsellers", "what is hot right now", "top products", "what are people buying",
+        "popular right now", "trending now", "show me what is popular", "top selling items", "hot items",
+    ],
+    'llm': [
+        "what should i wear to a wedding", "gift ideas for my mom", "help me choose a gift for my dad",
+        "compare xitemx and xitemx", "which is better xitemx or xitemx", "what goes well with xitemx",
+        "is xstorex good quality", "what can you do", "tell me about this mall", "plan an outfit for a party",
+        "i need something for a hiking trip", "recommend a birthday present for a teenager",
+        "what is the weather today", "why is xitemx so expensive", "can you help me", "what would suit me",
+        "hello", "thanks", "what do you recommend for a date night", "should i buy xitemx or xitemx",
+        "xitemx vs xitemx", "how do i return an item", "what is your return policy", "is xitemx worth it",
+        "suggest something for my anniversary", "what are good presents under a budget", "write me a poem",
+        "which xstorex xitemx is best for running a marathon", "what is the meaning of life",
+    ],
+}
+
+# Below this probability the query goes to the LLM
+MIN_CONFIDENCE = 0.5
+
+# Queries with more words than this are conversational; they go to the LLM
+MAX_DIRECT_WORDS = 8
+
+_ENTITY_RUN = re.compile(rf"\b({ITEM}|{CATEGORY}|{STORE})(?: \1\b)+")
+
+
+def _features(tokens):
+    """Unigrams and bigrams of a token list."""
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+class IntentRouter:
+    """
+    Decides locally whether a chat message can be answered without the
+    LLM: a product lookup ('search'), a price question ('price'), a store
+    location ('store'), or a trending-products question ('trending');
+    everything else is 'llm'.
+
+    Keyword rules over the items and stores tables find catalogue
+    mentions (store names, categories, product-name words) and mask them;
+    a multinomial logistic regression over TF-IDF unigrams and bigrams
+    of the masked text, trained on SEED_UTTERANCES, picks the intent. A
+    direct intent is only kept if it is confident and its entities are
+    present (a price question needs a product, a location question a
+    store or category); otherwise the message is escalated.
+
+    `route` scores one message with dictionary lookups and a small dot
+    product (microseconds); `route_batch` does the same for many messages
+    with sparse matrix products.
+    """
+
+    def __init__(self, data_store, min_confidence=MIN_CONFIDENCE):
+        self.data_store = data_store
+        self.min_confidence = min_confidence
+        self._lock = threading.Lock()
+        self.routed = {intent: 0 for intent in INTENTS}
+        self.escalated = 0
+        self._route_seconds = 0.0
+        self._item_terms = set()
+        self._categories = {}  # category term -> category
+        self._stores = {}  # lower-cased store name -> store ids
+        self._store_pattern = None
+        self._train()
+        self._add_items(data_store.items_df)
+        self._set_stores(data_store.stores_df)
+
+    def _train(self):
+        texts, labels = [], []
+        for intent, utterances in SEED_UTTERANCES.items():
+            texts += [utterance.split() for utterance in utterances]
+            labels += [INTENTS.index(intent)] * len(utterances)
+        self.vectorizer = TfidfVectorizer(analyzer=_features)
+        features = self.vectorizer.fit_transform(texts)
+        self.model = LogisticRegression(C=10.0, max_iter=1000).fit(features, labels)
+        # Fast path for single messages: column -> idf and per-class weights
+        self._columns = self.vectorizer.vocabulary_
+        self._idf = self.vectorizer.idf_
+        self._coef = np.ascontiguousarray(self.model.coef_.T)
+        self._intercept = self.model.intercept_
+        self._classes = [INTENTS[c] for c in self.model.classes_]
+
+    def _add_categories(self, df):
+        if df is not None and 'category' in df.columns:
+            for category in df['category'].dropna().astype(str).unique():
+                for term in tokenize(category):
+                    self._categories[term] = self._categories[term.rstrip('s')] = category
+
+    def _add_items(self, items_df):
+        """Product-name words and categories of catalogue rows become keywords."""
+        if items_df is None or items_df.empty:
+            return
+        for name in items_df['name'].dropna().astype(str).unique():
+            for term in tokenize(name):
+                if len(term) > 2 and term not in ENGLISH_STOP_WORDS:
+                    # Singular and plural forms ("shoe" / "shoes")
+                    self._item_terms.update((term, term.rstrip('s'), term + 's'))
+        self._add_categories(items_df)
+
+    def _set_stores(self, stores_df):
+        """Store names (matched as whole phrases) and store categories become keywords."""
+        stores = {}
+        if stores_df is not None and not stores_df.empty:
+            for store_id, name in zip(stores_df['store_id'].astype(str), stores_df['name'].astype(str)):
+                stores.setdefault(name.lower(), []).append(store_id)
+        # Longest names first so "apple store" wins over "apple"
+        names = sorted(stores, key=len, reverse=True)
+        self._store_pattern = (
+            re.compile(r"(?<![a-z0-9])(" + "|".join(map(re.escape, names)) + r")(?![a-z0-9])") if names else None
+        )
+        self._stores = stores
+        self._add_categories(stores_df)
+
+    def on_ingest(self, table, batch):
+        """Data store listener."""
+        if table == 'items':
+            self._add_items(batch)
+        elif table == 'stores':
+            self._set_stores(self.data_store.stores_df)
+
+    def _mask(self, text):
+        """(masked tokens, entities) for a message."""
+        text = text.lower()
+        store_ids = []
+        pattern = self._store_pattern
+        if pattern is not None:
+            for match in pattern.finditer(text):
+                store_ids += self._stores[match.group(1)]
+            text = pattern.sub(f" {STORE} ", text)
+
+        tokens, categories, items = [], [], 0
+        for token in tokenize(text):
+            if token in self._categories:
+                categories.append(self._categories[token])
+                token = CATEGORY
+            elif token in self._item_terms:
+                items += 1
+                token = ITEM
+            tokens.append(token)
+        # A multi-word product name is one mention
+        masked = _ENTITY_RUN.sub(r"\1", " ".join(tokens)).split()
+        entities = {'store_ids': store_ids, 'categories': list(dict.fromkeys(categories)), 'items': items}
+        return masked, entities
+
+    def _decide(self, tokens, probabilities, entities):
+        best = int(np.argmax(probabilities))
+        intent, confidence = self._classes[best], float(probabilities[best])
+        has_product = entities['items'] > 0 or bool(entities['categories'])
+        if intent != 'llm' and (
+            confidence < self.min_confidence
+            or len(tokens) > MAX_DIRECT_WORDS
+            or (intent in ('search', 'price') and not has_product)
+            or (intent == 'store' and not (entities['store_ids'] or entities['categories']))
+        ):
+            intent = 'llm'
+        return {'intent': intent, 'confidence': confidence, **entities}
+
+    def route(self, text):
+        """
+        The route for one message: {'intent', 'confidence', 'store_ids',
+        'categories', 'items' (count of product-name words)}.
+        """
+        started = time.perf_counter()
+        tokens, entities = self._mask(text)
+        columns = [c for c in map(self._columns.get, _features(tokens)) if c is not None]
+        scores = self._intercept
+        if columns:
+            columns, counts = np.unique(columns, return_counts=True)
+            weights = counts * self._idf[columns]
+            scores = scores + (weights / np.sqrt(weights @ weights)) @ self._coef[columns]
+        probabilities = np.exp(scores - scores.max())
+        decision = self._decide(tokens, probabilities / probabilities.sum(), entities)
+        self._record([decision['intent']], time.perf_counter() - started)
+        return decision
+
+    def route_batch(self, texts):
+        """Routes for many messages, classified with one sparse product."""
+        started = time.perf_counter()
+        masked = [self._mask(text) for text in texts]
+        if not masked:
+            return []
+        probabilities = self.model.predict_proba(self.vectorizer.transform([tokens for tokens, _ in masked]))
+        decisions = [self._decide(tokens, p, entities) for (tokens, entities), p in zip(masked, probabilities)]
+        self._record([d['intent'] for d in decisions], time.perf_counter() - started)
+        return decisions
+
+    def _record(self, intents, seconds):
+        with self._lock:
+            for intent in intents:
+                self.routed[intent] += 1
+            self._route_seconds += seconds
+
+    def escalate(self):
+        """Records a direct route that found nothing to answer with and went to the LLM."""
+        with self._lock:
+            self.escalated += 1
+
+    def stats(self):
+        with self._lock:
+            total = sum(self.routed.values())
+            to_llm = self.routed['llm'] + self.escalated
+            return {
+                'routed': total,
+                'by_intent': dict(self.routed),
+                'escalated': self.escalated,
+                'llm_share': round(to_llm / total, 4) if total else None,
+                'avg_route_us': round(1e6 * self._route_seconds / total, 2) if total else None
+            }
@@ -0,0 +1,116 @@
+from collections import Counter, defaultdict
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+RULE_COLUMNS = ['antecedent', 'consequent', 'support', 'confidence', 'lift', 'conviction']
+RULE_SORT_METRICS = ('lift', 'confidence', 'support', 'conviction')
+
+
+class _FPNode:
+    __slots__ = ('item', 'count', 'parent', 'children')
+
+    def __init__(self, item, parent):
+        self.item = item
+        self.count = 0
+        self.parent = parent
+        self.children = {}
+
+
+def _build_tree(weighted_baskets, min_count):
+    """
+    Builds an FP-tree from (items, weight) pairs. Items below `min_count`
+    are pruned before insertion, so the tree only ever holds frequent items.
+    Returns (header table: item -> nodes, frequent item counts).
+    """
+    counts = Counter()
+    for items, weight in weighted_baskets:
+        for item in items:
+            counts[item] += weight
+    frequent = {item: count for item, count in counts.items() if count >= min_count}
+
+    root = _FPNode(None, None)
+    header = defaultdict(list)
+    for items, weight in weighted_baskets:
+        # Most frequent items first so shared prefixes collapse into one path
+        path = sorted((i for i in items if i in frequent), key=lambda i: (-frequent[i], i))
+        node = root
+        for item in path:
+            child = node.children.get(item)
+            if child is None:
+                child = node.children[item] = _FPNode(item, node)
+                header[item].append(child)
+            child.count += weight
+            node = child
+    return header, frequent
+
+
+def _mine(weighted_baskets, min_count, suffix, max_len, out):
+    header, frequent = _build_tree(weighted_baskets, min_count)
+
+    # Least frequent first: their conditional trees are the smallest
+    for item in sorted(frequent, key=lambda i: (frequent[i], i)):
+        itemset = suffix + (item,)
+        out[tuple(sorted(itemset))] = frequent[item]
+        if max_len and len(itemset) >= max_len:
+            continue
+
+        # Conditional pattern base: prefix paths leading to this item
+        conditional = []
+        for node in header[item]:
+            path = []
+            parent = node.parent
+            while parent.item is not None:
+                path.append(parent.item)
+                parent = parent.parent
+            if path:
+                conditional.append((path, node.count))
+        if conditional:
+            _mine(conditional, min_count, itemset, max_len, out)
+
+
+def frequent_itemsets(incidence, min_count, max_len=None):
+    """
+    FP-Growth over a binary CSR transaction x item matrix.
+
+    Returns {sorted tuple of item columns: transaction count} for every
+    itemset with count >= `min_count` and at most `max_len` items.
+    Module-level so it can run in a worker process.
+    """
+    # Identical baskets are inserted once with a weight
+    baskets = Counter(
+        tuple(incidence.indices[incidence.indptr[row]:incidence.indptr[row + 1]].tolist())
+        for row in range(incidence.shape[0])
+    )
+    itemsets = {}
+    _mine(list(baskets.items()), max(1, min_count), (), max_len, itemsets)
+    return itemsets
+
+
+def generate_rules(itemsets, n_transactions, min_confidence=0.0):
+    """
+    Directional antecedent -> consequent rules from frequent itemsets.
+
+    Every subset of a frequent itemset is frequent itself, so antecedent and
+    consequent counts are always available in `itemsets`. Conviction is
+    infinite when confidence is 1.
+    """
+    rows = []
+    for itemset, count in itemsets.items():
+        if len(itemset) < 2:
+            continue
+        support = count / n_transactions
+        for size in range(1, len(itemset)):
+            for antecedent in combinations(itemset, size):
+                confidence = count / itemsets[antecedent]
+                if confidence < min_confidence:
+                    continue
+                consequent = tuple(i for i in itemset if i not in antecedent)
+                consequent_support = itemsets[consequent] / n_transactions
+                conviction = (1 - consequent_support) / (1 - confidence) if confidence < 1 else np.inf
+                rows.append((
+                    antecedent, consequent, support, confidence,
+                    confidence / consequent_support, conviction
+                ))
+    return pd.DataFrame(rows, columns=RULE_COLUMNS)
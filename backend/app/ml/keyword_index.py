@@ -0,0 +1,88 @@
+import bisect
+import re
+from collections import defaultdict
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Lower-cased alphanumeric tokens; punctuation and regex syntax are ignored."""
+    return _TOKEN_RE.findall(str(text).lower())
+
+
+class KeywordIndex:
+    """
+    Tokenised inverted index over catalogue text fields.
+
+    Maps term -> sorted array of row ids. Queries combine per-term posting
+    lists with AND/OR; with `prefix` every query term also matches longer
+    terms that start with it ("shoe" finds "shoes"), resolved by binary
+    search over the sorted vocabulary. Query cost scales with posting-list
+    size, not catalogue size.
+    """
+
+    def __init__(self, df, fields=('name', 'description')):
+        self.fields = fields
+        self.n_rows = 0
+        self._postings = {}
+        self._terms = []
+        self.add(df)
+
+    def add(self, df, start_row=None):
+        """Indexes rows of `df`; row ids continue from the current size unless given."""
+        start_row = self.n_rows if start_row is None else start_row
+        new_postings = defaultdict(list)
+        texts = [df[field].fillna('').astype(str).tolist() for field in self.fields if field in df.columns]
+        for offset, values in enumerate(zip(*texts)):
+            row = start_row + offset
+            for term in set(tokenize(" ".join(values))):
+                new_postings[term].append(row)
+
+        for term, rows in new_postings.items():
+            rows = np.asarray(rows, dtype=np.int64)
+            existing = self._postings.get(term)
+            self._postings[term] = rows if existing is None else np.union1d(existing, rows)
+        self._terms = sorted(self._postings)
+        self.n_rows = max(self.n_rows, start_row + len(df))
+
+    def on_ingest(self, table, batch):
+        """Data store listener: new catalogue rows are appended in store order."""
+        if table == 'items':
+            self.add(batch)
+
+    def _term_rows(self, term, prefix):
+        if not prefix:
+            return self._postings.get(term, np.array([], dtype=np.int64))
+
+        # All vocabulary terms in [term, term + '\uffff') share the prefix
+        lo = bisect.bisect_left(self._terms, term)
+        hi = bisect.bisect_left(self._terms, term + "\uffff")
+        matches = [self._postings[t] for t in self._terms[lo:hi]]
+        if not matches:
+            return np.array([], dtype=np.int64)
+        return matches[0] if len(matches) == 1 else np.unique(np.concatenate(matches))
+
+    def search(self, query, mode='and', prefix=True):
+        """
+        Returns sorted row ids matching `query`.
+        `mode` 'and' requires every term, 'or' any term.
+        """
+        if mode not in ('and', 'or'):
+            raise ValueError("mode must be 'and' or 'or'")
+
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return np.array([], dtype=np.int64)
+
+        # Smallest posting lists first keeps AND intersections cheap
+        posting_lists = sorted((self._term_rows(t, prefix) for t in terms), key=len)
+        if mode == 'and':
+            rows = posting_lists[0]
+            for other in posting_lists[1:]:
+                if len(rows) == 0:
+                    break
+                rows = np.intersect1d(rows, other, assume_unique=True)
+            return rows
+        return np.unique(np.concatenate(posting_lists))
@@ -0,0 +1,112 @@
+import threading
+
+import numpy as np
+
+
+class CustomerProfileStore:
+    """
+    Per-customer profiles kept as parallel NumPy arrays behind a
+    customer_id -> row hash index, so a lookup is O(1) regardless of
+    history size.
+
+    Built from one groupby pass over the transactions and updated from each
+    ingested batch: spend and visit totals are added, and per-store visit
+    counts (customer x store) give the favourite store without rescanning.
+    Rows and store columns grow with spare capacity (doubling), and readers
+    take the same lock as updates. Store names come from the shared
+    StoreDirectory.
+    """
+
+    def __init__(self, transactions_df, customers_df=None, stores=None):
+        self._rows = {}
+        self._stores = {}
+        self._store_ids = []
+        self.total_spend = np.zeros(16, dtype=np.float64)
+        self.visit_count = np.zeros(16, dtype=np.int64)
+        self.store_visits = np.zeros((16, 4), dtype=np.int32)
+        self.personas = {}
+        self.stores = stores
+        self._lock = threading.Lock()
+
+        if customers_df is not None and not customers_df.empty:
+            self.add_customers(customers_df)
+        if not transactions_df.empty:
+            self.add_transactions(transactions_df)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, customer_id):
+        return customer_id in self._rows
+
+    def _row(self, customer_id):
+        row = self._rows.get(customer_id)
+        if row is None:
+            row = len(self._rows)
+            if row >= len(self.total_spend):
+                capacity = 2 * len(self.total_spend)
+                self.total_spend = np.pad(self.total_spend, (0, capacity - len(self.total_spend)))
+                self.visit_count = np.pad(self.visit_count, (0, capacity - len(self.visit_count)))
+                self.store_visits = np.pad(self.store_visits, ((0, capacity - len(self.store_visits)), (0, 0)))
+            # Published once the arrays have room for it
+            self._rows[customer_id] = row
+        return row
+
+    def _store(self, store_id):
+        col = self._stores.get(store_id)
+        if col is None:
+            col = len(self._store_ids)
+            if col >= self.store_visits.shape[1]:
+                capacity = 2 * self.store_visits.shape[1]
+                self.store_visits = np.pad(self.store_visits, ((0, 0), (0, capacity - self.store_visits.shape[1])))
+            self._store_ids.append(store_id)
+            self._stores[store_id] = col
+        return col
+
+    def add_customers(self, customers_df):
+        """Registers customer attributes (persona)."""
+        self.personas.update(zip(customers_df['customer_id'].astype(str), customers_df['persona'].astype(str)))
+
+    def add_transactions(self, transactions_df):
+        """Folds a batch of transactions into the totals in one groupby pass."""
+        visits = transactions_df.groupby(['customer_id', 'store_id'], observed=True)['total_price'].agg(['sum', 'count'])
+        customer_ids = visits.index.get_level_values('customer_id').astype(str)
+        store_ids = visits.index.get_level_values('store_id').astype(str)
+
+        with self._lock:
+            rows = np.fromiter((self._row(c) for c in customer_ids), dtype=np.int64, count=len(visits))
+            cols = np.fromiter((self._store(s) for s in store_ids), dtype=np.int64, count=len(visits))
+            np.add.at(self.total_spend, rows, visits['sum'].to_numpy(dtype=np.float64))
+            np.add.at(self.visit_count, rows, visits['count'].to_numpy(dtype=np.int64))
+            np.add.at(self.store_visits, (rows, cols), visits['count'].to_numpy(dtype=np.int32))
+
+    def on_ingest(self, table, batch):
+        """Data store listener."""
+        if table == 'transactions':
+            self.add_transactions(batch)
+        elif table == 'customers':
+            self.add_customers(batch)
+
+    def favorite_store(self, row):
+        """Most visited store_id; ties go to the smallest id."""
+        counts = self.store_visits[row, :len(self._store_ids)]
+        top = np.flatnonzero(counts == counts.max())
+        return min(self._store_ids[c] for c in top)
+
+    def get(self, customer_id):
+        """Profile for `customer_id`, or None if they have no transactions."""
+        with self._lock:
+            row = self._rows.get(customer_id)
+            if row is None:
+                return None
+            total_spend = float(self.total_spend[row])
+            visit_count = int(self.visit_count[row])
+            favorite_store_id = self.favorite_store(row)
+        return {
+            'total_spend': total_spend,
+            'visit_count': visit_count,
+            'favorite_store': self.stores.name(favorite_store_id) if self.stores is not None else favorite_store_id,
+            # Predict next purchase probability
+            'purchase_probability': min(0.95, 0.1 * visit_count),
+            'persona': self.personas.get(customer_id, "Unknown")
+        }
@@ -0,0 +1,173 @@
+import threading
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from .basket import split_baskets
+from .retrieval import top_k
+
+
+class ItemItemRecommender:
+    """
+    Item-item collaborative filtering over the basket column.
+
+    Keeps a customer x item purchase-count matrix U and its Gram matrix
+    G = U^T U. A batch of transactions only touches its customers' rows, so
+    G is updated from the batch (U_t^T D + D^T U_t + D^T D, with D the
+    batch's counts and U_t those customers' previous rows). Item similarity
+    is the cosine G_ij / sqrt(G_ii G_jj); the top `n_neighbors` per item
+    form a sparse neighbour table that is rebuilt lazily after an update.
+
+    Customers are scored as U[rows] @ neighbours in one sparse product,
+    for one customer or a whole batch. The product stays sparse, so only
+    candidates (neighbours of something bought) are ever scored.
+    """
+
+    def __init__(self, transactions_df, items_df, n_neighbors=20):
+        self.n_neighbors = n_neighbors
+        self.item_ids = pd.Index([])
+        self.item_names = np.array([], dtype=object)
+        self.item_prices = np.array([], dtype=np.float64)
+        self._customers = {}
+        self.interactions = sparse.csr_matrix((0, 0), dtype=np.float64)
+        self.gram = sparse.csr_matrix((0, 0), dtype=np.float64)
+        self._neighbors = None
+        self._lock = threading.Lock()
+
+        if not items_df.empty:
+            self.add_items(items_df)
+        if not transactions_df.empty:
+            self.add_transactions(transactions_df)
+
+    def _grow_items(self, new_ids):
+        self.item_ids = self.item_ids.append(pd.Index(new_ids))
+        self.item_names = np.concatenate([self.item_names, np.full(len(new_ids), None, dtype=object)])
+        self.item_prices = np.concatenate([self.item_prices, np.zeros(len(new_ids))])
+
+    def add_items(self, items_df):
+        """Registers catalogue items; only named items are ever recommended."""
+        items = items_df.drop_duplicates('item_id')
+        ids = items['item_id'].astype(str).to_numpy(dtype=object)
+        new_ids = pd.Index(ids).difference(self.item_ids, sort=False)
+        if len(new_ids):
+            self._grow_items(new_ids)
+        cols = self.item_ids.get_indexer(ids)
+        self.item_names[cols] = items['name'].astype(str).to_numpy(dtype=object)
+        self.item_prices[cols] = items['price'].to_numpy(dtype=np.float64)
+        self._neighbors = None
+
+    def add_transactions(self, transactions_df):
+        """Folds a batch of baskets into U and G."""
+        entry_rows, values = split_baskets(transactions_df['items'])
+        values = values.astype(str)
+        unknown = pd.Index(pd.unique(values[self.item_ids.get_indexer(values) < 0]))
+        if len(unknown):
+            self._grow_items(unknown)
+        cols = self.item_ids.get_indexer(values)
+
+        customer_ids = transactions_df['customer_id'].astype(str).to_numpy(dtype=object)
+        lookup = self._customers
+        customer_rows = np.fromiter(
+            (lookup.setdefault(c, len(lookup)) for c in customer_ids),
+            dtype=np.int64, count=len(customer_ids)
+        )
+        shape = (len(lookup), len(self.item_ids))
+        delta = sparse.csr_matrix(
+            (np.ones(len(cols)), (customer_rows[entry_rows], cols)),
+            shape=shape
+        )
+        delta.sum_duplicates()
+
+        with self._lock:
+            previous = self.interactions.copy()
+            previous.resize(shape)
+            gram = self.gram.copy()
+            gram.resize((shape[1], shape[1]))
+            cross = previous.T @ delta
+            self.gram = (gram + cross + cross.T + delta.T @ delta).tocsr()
+            self.interactions = (previous + delta).tocsr()
+            self._neighbors = None
+
+    def on_ingest(self, table, batch):
+        """Data store listener."""
+        if table == 'transactions':
+            self.add_transactions(batch)
+        elif table == 'items':
+            self.add_items(batch)
+
+    def neighbors(self):
+        """Sparse item x item table holding each item's top-N cosine neighbours."""
+        neighbors = self._neighbors
+        if neighbors is not None:
+            return neighbors
+        with self._lock:
+            gram = self.gram.tocoo()
+            norms = np.sqrt(np.maximum(gram.diagonal(), 1e-12))
+            keep = gram.row != gram.col
+            rows, cols = gram.row[keep], gram.col[keep]
+            similarity = gram.data[keep] / (norms[rows] * norms[cols])
+
+            # Per item, the n_neighbors most similar others
+            order = np.lexsort((-similarity, rows))
+            rows, cols, similarity = rows[order], cols[order], similarity[order]
+            starts = np.searchsorted(rows, rows, side='left')
+            rank = np.arange(len(rows)) - starts
+            top = rank < self.n_neighbors
+            n_items = len(self.item_ids)
+            neighbors = sparse.csr_matrix(
+                (similarity[top], (rows[top], cols[top])), shape=(n_items, n_items)
+            )
+            self._neighbors = neighbors
+        return neighbors
+
+    def recommend_batch(self, customer_ids, n=5):
+        """
+        Top-`n` unseen items for each customer in one vectorized call.
+        Returns a list aligned with `customer_ids`; customers without
+        history (or without any scored item) get None.
+        """
+        neighbors = self.neighbors()
+        interactions = self.interactions
+        rows = np.array([self._customers.get(c, -1) for c in customer_ids], dtype=np.int64)
+        known = np.flatnonzero((rows >= 0) & (rows < interactions.shape[0]))
+        results = [None] * len(customer_ids)
+        if len(known) == 0:
+            return results
+
+        history = interactions[rows[known]]
+        history.resize((len(known), neighbors.shape[0]))
+        history.sort_indices()
+        scores = (history @ neighbors).tocsr()
+        scores.sort_indices()
+        unnamed = pd.isna(self.item_names[:neighbors.shape[1]])
+
+        for position, batch_row in enumerate(known):
+            start, end = history.indptr[position], history.indptr[position + 1]
+            bought, counts = history.indices[start:end], history.data[start:end]
+            start, end = scores.indptr[position], scores.indptr[position + 1]
+            candidates, row_scores = scores.indices[start:end], scores.data[start:end]
+            # Never recommend what was already bought, or items missing a name
+            keep = (row_scores > 0) & ~unnamed[candidates] & ~np.isin(candidates, bought, assume_unique=True)
+            candidates, row_scores = candidates[keep], row_scores[keep]
+            picks = candidates[top_k(row_scores, n)]
+            if not len(picks):
+                continue
+            # For each pick, the purchased item contributing most to its score
+            contributions = neighbors[bought][:, picks].toarray() * counts[:, np.newaxis]
+            sources = bought[np.argmax(contributions, axis=0)]
+
+            recommendations = []
+            for col, source in zip(picks, sources):
+                because = self.item_names[source] or self.item_ids[source]
+                recommendations.append({
+                    'item_id': self.item_ids[col],
+                    'name': self.item_names[col],
+                    'price': float(self.item_prices[col]),
+                    'reason': f"Because you bought {because}"
+                })
+            results[batch_row] = recommendations
+        return results
+
+    def recommend(self, customer_id, n=5):
+        return self.recommend_batch([customer_id], n)[0]
@@ -0,0 +1,272 @@
+import numpy as np
+from scipy import sparse
+from sklearn.cluster import MiniBatchKMeans
+
+
+def top_k(scores, k):
+    """
+    Indices of the `k` highest scores, best first, via argpartition
+    (O(n) selection + O(k log k) sort instead of a full argsort).
+    Ties are broken by index so results are deterministic.
+    """
+    if k <= 0 or len(scores) == 0:
+        return np.array([], dtype=np.int64)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+
+class BruteForceIndex:
+    """Exact: scores the query against every document (the original search path)."""
+
+    name = 'brute'
+
+    def build(self, matrix):
+        self.matrix = sparse.csr_matrix(matrix)
+        return self
+
+    def extend(self, matrix, start):
+        """A new index over `matrix`, whose rows before `start` are this index's documents."""
+        return BruteForceIndex().build(matrix)
+
+    def search(self, query_vec, k):
+        scores = np.asarray((self.matrix @ query_vec.T).todense()).ravel()
+        indices = top_k(scores, k)
+        return indices, scores[indices]
+
+
+class InvertedIndex:
+    """
+    Exact: term -> posting list of (document, weight). A query only touches
+    the postings of its own terms, so cost scales with posting-list size
+    rather than catalogue size.
+    """
+
+    name = 'inverted'
+
+    def build(self, matrix):
+        # CSC columns are the posting lists
+        self.postings = sparse.csc_matrix(matrix)
+        self.postings.sort_indices()
+        return self
+
+    def extend(self, matrix, start):
+        """A new index over `matrix`, whose rows before `start` are this index's documents."""
+        # Posting lists are re-laid out (no weights are recomputed)
+        return InvertedIndex().build(matrix)
+
+    def _candidates(self, query_vec):
+        query_vec = sparse.csr_matrix(query_vec)
+        indptr, indices, data = self.postings.indptr, self.postings.indices, self.postings.data
+        docs, weights = [], []
+        for term, query_weight in zip(query_vec.indices, query_vec.data):
+            start, end = indptr[term], indptr[term + 1]
+            docs.append(indices[start:end])
+            weights.append(data[start:end] * query_weight)
+        return docs, weights
+
+    def search(self, query_vec, k):
+        docs, weights = self._candidates(query_vec)
+        if not docs:
+            return np.array([], dtype=np.int64), np.array([])
+
+        # Accumulate per-document scores over the matched postings only
+        docs = np.concatenate(docs)
+        unique_docs, inverse = np.unique(docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weights), minlength=len(unique_docs))
+        order = top_k(scores, k)
+        return unique_docs[order], scores[order]
+
+
+class LSHIndex:
+    """
+    Approximate: random-hyperplane LSH over the TF-IDF vectors.
+
+    Each of `n_tables` tables hashes documents by the sign pattern of
+    `n_bits` random projections. A query probes its own bucket and every
+    bucket one bit away in each table, then re-ranks the union of candidates
+    exactly. More tables / fewer bits trade latency for recall.
+    """
+
+    name = 'lsh'
+
+    def __init__(self, n_tables=8, n_bits=10, multiprobe=True, seed=42):
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.multiprobe = multiprobe
+        self.seed = seed
+
+    def _signatures(self, vectors):
+        vectors = sparse.csr_matrix(vectors, dtype=np.float32)
+        if vectors.shape[0] == 1:
+            # Single query: only the planes' rows for its own terms matter
+            projected = (vectors.data @ self.planes[vectors.indices])[np.newaxis, :]
+        else:
+            projected = np.asarray(vectors @ self.planes)
+        bits = (projected > 0).reshape(projected.shape[0], self.n_tables, self.n_bits)
+        return bits.astype(np.int64) @ self._bit_weights
+
+    def build(self, matrix):
+        self.matrix = sparse.csr_matrix(matrix)
+        rng = np.random.default_rng(self.seed)
+        self.planes = rng.standard_normal((self.matrix.shape[1], self.n_tables * self.n_bits)).astype(np.float32)
+        self._bit_weights = (1 << np.arange(self.n_bits)).astype(np.int64)
+        self.signatures = self._signatures(self.matrix)
+        self._bucket()
+        return self
+
+    def extend(self, matrix, start):
+        """
+        A new index over `matrix`, whose rows before `start` are this
+        index's documents: only the new rows are hashed. New terms get
+        planes of their own; existing documents have no weight on them,
+        so their signatures do not change.
+        """
+        index = LSHIndex(self.n_tables, self.n_bits, self.multiprobe, self.seed)
+        index.matrix = sparse.csr_matrix(matrix)
+        index.planes, index._bit_weights = self.planes, self._bit_weights
+        n_terms = index.matrix.shape[1]
+        if n_terms > len(self.planes):
+            rng = np.random.default_rng([self.seed, len(self.planes)])
+            extra = rng.standard_normal((n_terms - len(self.planes), self.planes.shape[1])).astype(np.float32)
+            index.planes = np.vstack([self.planes, extra])
+        index.signatures = np.vstack([self.signatures[:start], index._signatures(index.matrix[start:])])
+        index._bucket()
+        return index
+
+    def _bucket(self):
+        # Bucket table t as a CSR-like layout: documents sorted by signature
+        self.tables = []
+        for table in range(self.n_tables):
+            order = np.argsort(self.signatures[:, table], kind='stable')
+            keys, starts = np.unique(self.signatures[order, table], return_index=True)
+            ends = np.append(starts[1:], len(order))
+            self.tables.append((keys, starts, ends, order))
+
+    def _probe_keys(self, signature):
+        if not self.multiprobe:
+            return np.array([signature])
+        return np.append(signature, signature ^ self._bit_weights)
+
+    def search(self, query_vec, k):
+        signatures = self._signatures(query_vec)[0]
+        candidates = []
+        for table, (keys, starts, ends, order) in enumerate(self.tables):
+            probes = self._probe_keys(signatures[table])
+            positions = np.searchsorted(keys, probes)
+            valid = positions < len(keys)
+            hits = positions[valid][keys[positions[valid]] == probes[valid]]
+            for position in hits:
+                candidates.append(order[starts[position]:ends[position]])
+        if not candidates:
+            return np.array([], dtype=np.int64), np.array([])
+
+        candidates = np.unique(np.concatenate(candidates))
+        scores = np.asarray((self.matrix[candidates] @ query_vec.T).todense()).ravel()
+        order = top_k(scores, k)
+        return candidates[order], scores[order]
+
+
+class IVFIndex:
+    """
+    Nearest neighbours over dense, L2-normalised float32 vectors by inner
+    product (cosine), as an inverted file: vectors are bucketed by their
+    nearest k-means centroid, and a query scores only the `n_probe`
+    buckets whose centroids are closest to it, re-ranking their members
+    exactly. Below `min_items` vectors the scan is exact (one mat-vec).
+    """
+
+    name = 'ivf'
+
+    # Rows assigned to centroids per matrix product (bounds the score matrix)
+    ASSIGN_CHUNK = 8192
+
+    def __init__(self, n_lists=None, n_probe=8, min_items=20_000, seed=42):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.min_items = min_items
+        self.seed = seed
+        self.centroids = None
+
+    def build(self, vectors):
+        """Trains the coarse quantizer on `vectors` and buckets them."""
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.centroids = None
+        if len(self.vectors) < self.min_items:
+            return self
+        n_lists = self.n_lists or int(4 * np.sqrt(len(self.vectors)))
+        rng = np.random.default_rng(self.seed)
+        sample = self.vectors[rng.choice(len(self.vectors), min(len(self.vectors), 64 * n_lists), replace=False)]
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, n_init=1, batch_size=4096, random_state=self.seed).fit(sample)
+        # Spherical k-means: centroids compared by inner product like the vectors
+        centroids = kmeans.cluster_centers_.astype(np.float32)
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        self.centroids = centroids / np.where(norms > 0, norms, 1)
+        self.assignment = self._assign(self.vectors)
+        self._bucket()
+        return self
+
+    def restore(self, vectors, centroids, assignment):
+        """Reopens a built index from its vectors, centroids and assignment (none when untrained)."""
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.centroids = None
+        if len(centroids):
+            self.centroids = centroids
+            self.assignment = assignment
+            self._bucket()
+        return self
+
+    def extend(self, vectors):
+        """
+        A new index over `vectors`, whose leading rows are this index's
+        vectors: only the new rows are assigned to the trained centroids.
+        """
+        index = IVFIndex(self.n_lists, self.n_probe, self.min_items, self.seed)
+        if self.centroids is None:
+            return index.build(vectors)
+        index.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        index.centroids = self.centroids
+        index.assignment = np.concatenate([self.assignment, self._assign(index.vectors[len(self.vectors):])])
+        index._bucket()
+        return index
+
+    def _assign(self, vectors):
+        if not len(vectors):
+            return np.array([], dtype=np.int64)
+        return np.concatenate([
+            (vectors[start:start + self.ASSIGN_CHUNK] @ self.centroids.T).argmax(axis=1)
+            for start in range(0, len(vectors), self.ASSIGN_CHUNK)
+        ])
+
+    def _bucket(self):
+        # CSR-like layout: vectors sorted by list, offsets per list
+        self.order = np.argsort(self.assignment, kind='stable')
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(self.assignment, minlength=len(self.centroids)))])
+
+    def search(self, query, k):
+        query = np.asarray(query, dtype=np.float32).ravel()
+        if self.centroids is None:
+            scores = self.vectors @ query
+            indices = top_k(scores, k)
+            return indices, scores[indices]
+
+        lists = top_k(self.centroids @ query, self.n_probe)
+        candidates = np.concatenate([self.order[self.offsets[l]:self.offsets[l + 1]] for l in lists])
+        scores = self.vectors[candidates] @ query
+        order = top_k(scores, k)
+        return candidates[order], scores[order]
+
+
+INDEX_BACKENDS = {
+    'brute': BruteForceIndex,
+    'inverted': InvertedIndex,
+    'lsh': LSHIndex
+}
+
+
+def create_index(backend):
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f"Unknown search index '{backend}'. Choose from: {', '.join(INDEX_BACKENDS)}")
+    return INDEX_BACKENDS[backend]()
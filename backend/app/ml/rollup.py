@@ -0,0 +1,143 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+NS_PER_HOUR = 3600 * 10**9
+
+# Hours per storage block of the rollup (one week)
+BLOCK_HOURS = 24 * 7
+
+
+def calendar(hours):
+    """Month (1-12), weekday (Monday = 0) and hour of day for hour buckets since the epoch."""
+    hours = np.asarray(hours, dtype=np.int64)
+    months = hours.astype('datetime64[h]').astype('datetime64[M]').astype(np.int64) % 12 + 1
+    # 1970-01-01 was a Thursday
+    weekdays = (hours // 24 + 3) % 7
+    return months, weekdays, hours % 24
+
+
+class SalesRollup:
+    """
+    Pre-aggregated revenue and transaction counts per store and hour
+    (store x day x hour), stored as dense store x hour blocks of one week,
+    keyed by week.
+
+    Window totals over whole hours sum the blocks in the window and never
+    touch raw transactions; month, weekday and hour-of-day views sum the
+    hourly columns by their calendar position. Only weeks that have
+    transactions are allocated, so memory depends on the number of stores
+    and active weeks, not on the transaction count or on how far apart
+    the earliest and latest timestamps are. Ingested batches are added
+    in place. Revenue stays integral until a batch brings fractional
+    prices, as in the transactions table.
+    """
+
+    def __init__(self, transactions_df):
+        self._stores = {}
+        self.store_ids = []
+        self._blocks = {}  # week -> (revenue, counts), each stores x BLOCK_HOURS
+        self._weeks = np.array([], dtype=np.int64)  # sorted keys of _blocks
+        self._dtype = np.int64
+        self._lock = threading.Lock()
+
+        if not transactions_df.empty:
+            self.add_transactions(transactions_df)
+
+    def _block(self, week):
+        """The block of `week`, allocated (or given rows for new stores) as needed."""
+        n_stores = len(self.store_ids)
+        block = self._blocks.get(week)
+        if block is None or block[0].shape[0] < n_stores:
+            revenue = np.zeros((n_stores, BLOCK_HOURS), dtype=self._dtype)
+            counts = np.zeros((n_stores, BLOCK_HOURS), dtype=np.int64)
+            if block is not None:
+                revenue[:block[0].shape[0]], counts[:block[1].shape[0]] = block
+            else:
+                self._weeks = np.insert(self._weeks, np.searchsorted(self._weeks, week), week)
+            block = self._blocks[week] = (revenue, counts)
+        return block
+
+    def add_transactions(self, transactions_df):
+        """Adds a batch's revenue and counts to its (store, hour) cells."""
+        if transactions_df.empty:
+            return
+        hours = transactions_df['timestamp'].to_numpy(dtype='datetime64[ns]').view(np.int64) // NS_PER_HOUR
+        store_codes, store_ids = pd.factorize(transactions_df['store_id'].astype(str))
+        revenue = transactions_df['total_price'].to_numpy()
+        if revenue.dtype.kind == 'f' and not np.array_equal(revenue, np.round(revenue)):
+            revenue = revenue.astype(np.float64)
+        else:
+            revenue = revenue.astype(np.int64)
+
+        # Rows grouped by week, one block update per week
+        weeks = hours // BLOCK_HOURS
+        order = np.argsort(weeks, kind='stable')
+        batch_weeks, starts = np.unique(weeks[order], return_index=True)
+
+        with self._lock:
+            for store_id in store_ids:
+                if store_id not in self._stores:
+                    self._stores[store_id] = len(self.store_ids)
+                    self.store_ids.append(store_id)
+            rows = np.array([self._stores[s] for s in store_ids], dtype=np.int64)[store_codes]
+            if revenue.dtype.kind == 'f' and self._dtype != np.float64:
+                self._dtype = np.float64
+                self._blocks = {week: (r.astype(np.float64), c) for week, (r, c) in self._blocks.items()}
+            cols = hours - weeks * BLOCK_HOURS
+            for week, rows_of_week in zip(batch_weeks.tolist(), np.split(order, starts[1:])):
+                block_revenue, block_counts = self._block(week)
+                cells = (rows[rows_of_week], cols[rows_of_week])
+                np.add.at(block_revenue, cells, revenue[rows_of_week])
+                np.add.at(block_counts, cells, 1)
+
+    def on_ingest(self, table, batch):
+        """Data store listener."""
+        if table == 'transactions':
+            self.add_transactions(batch)
+
+    def hourly(self, store_id=None, first_hour=None, end_hour=None):
+        """
+        (hour buckets, revenue, counts) of `store_id` (all stores if None)
+        for the hours in [first_hour, end_hour) that have transactions;
+        None bounds are open.
+        """
+        empty = np.array([], dtype=np.int64), np.array([], dtype=self._dtype), np.array([], dtype=np.int64)
+        with self._lock:
+            row = None if store_id is None else self._stores.get(store_id)
+            if store_id is not None and row is None:
+                return empty
+            weeks = self._weeks
+            lo = 0 if first_hour is None else np.searchsorted(weeks, first_hour // BLOCK_HOURS)
+            hi = len(weeks) if end_hour is None else np.searchsorted(weeks, (end_hour - 1) // BLOCK_HOURS, side='right')
+            parts = []
+            for week in weeks[lo:hi].tolist():
+                revenue, counts = self._blocks[week]
+                if row is None:
+                    revenue, counts = revenue.sum(axis=0), counts.sum(axis=0)
+                elif row < revenue.shape[0]:
+                    revenue, counts = revenue[row].copy(), counts[row].copy()
+                else:
+                    continue
+                parts.append((week * BLOCK_HOURS, revenue, counts))
+        if not parts:
+            return empty
+
+        hours = np.concatenate([first + np.arange(BLOCK_HOURS) for first, _, _ in parts])
+        revenue = np.concatenate([revenue for _, revenue, _ in parts])
+        counts = np.concatenate([counts for _, _, counts in parts])
+        keep = counts != 0
+        if first_hour is not None:
+            keep &= hours >= first_hour
+        if end_hour is not None:
+            keep &= hours < end_hour
+        return hours[keep], revenue[keep], counts[keep]
+
+    def totals(self, store_id=None, first_hour=None, end_hour=None):
+        """
+        (revenue, count) of `store_id` (all stores if None) over hour
+        buckets [first_hour, end_hour); None bounds are open.
+        """
+        _, revenue, counts = self.hourly(store_id, first_hour, end_hour)
+        return float(revenue.sum()), int(counts.sum())
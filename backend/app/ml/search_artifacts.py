@@ -0,0 +1,99 @@
+"""
+Persisted search index artifacts.
+
+The fitted vocabulary, document frequencies, raw term counts, TF-IDF
+document matrix and dense (LSA) embedding with its IVF lists of a
+catalogue are written once as .npy arrays (sparse matrices as their CSR
+data / indices / indptr) and memory-mapped by every worker afterwards, so
+start-up does no text analysis or SVD fit and the pages are shared
+between processes through the OS page cache.
+
+An artifact is keyed by a fingerprint of the catalogue text; a changed
+catalogue gets a new artifact the next time an index is built.
+
+Usage (from backend/), to build ahead of deployment:
+    python -m app.ml.search_artifacts ../data/items.csv .cache/search
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+FORMAT_VERSION = 2
+
+
+def catalogue_fingerprint(item_ids, texts):
+    """Content hash of the indexed catalogue (ids and combined text, in order)."""
+    digest = hashlib.sha1(f"v{FORMAT_VERSION}".encode())
+    for values in (item_ids, texts):
+        # Vectorized per-row hashes, then one digest over them
+        row_hashes = pd.util.hash_pandas_object(pd.Series(values, dtype=object), index=False, categorize=False)
+        digest.update(row_hashes.to_numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+def artifact_dir(cache_dir, fingerprint):
+    return Path(cache_dir) / f"search-v{FORMAT_VERSION}-{fingerprint}"
+
+
+def save_index(out_dir, arrays, meta):
+    """Writes `arrays` ({name: ndarray}) and `meta` under `out_dir`."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for name, values in arrays.items():
+        np.save(out_dir / f"{name}.npy", values)
+    meta = dict(meta, format=FORMAT_VERSION, arrays=sorted(arrays))
+    (out_dir / 'meta.json').write_text(json.dumps(meta))
+    return meta
+
+
+def load_index(index_dir):
+    """Memory-maps a saved artifact. Returns (arrays, meta)."""
+    index_dir = Path(index_dir)
+    meta = json.loads((index_dir / 'meta.json').read_text())
+    arrays = {name: np.load(index_dir / f"{name}.npy", mmap_mode='r') for name in meta['arrays']}
+    return arrays, meta
+
+
+def open_index(cache_dir, fingerprint, build):
+    """
+    Returns (arrays, meta, built) for the artifact of `fingerprint`,
+    building it with `build()` -> (arrays, meta) if it does not exist yet.
+    Builds are written to a temporary directory that is renamed into
+    place, so concurrent workers never see a partial artifact; stale
+    artifacts are removed (mapped pages stay valid for their readers).
+    """
+    cache_dir = Path(cache_dir)
+    target = artifact_dir(cache_dir, fingerprint)
+    built = False
+    if not (target / 'meta.json').exists():
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=".search-", dir=cache_dir))
+        save_index(staging, *build())
+        built = True
+        try:
+            os.rename(staging, target)
+        except OSError:
+            # Another worker finished the same artifact first
+            shutil.rmtree(staging, ignore_errors=True)
+        for stale in cache_dir.glob("search-v*"):
+            if stale != target:
+                shutil.rmtree(stale, ignore_errors=True)
+    arrays, meta = load_index(target)
+    return arrays, meta, built
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit(__doc__)
+    from .search_engine import ProductSearchEngine
+
+    engine = ProductSearchEngine(sys.argv[1], artifact_dir=sys.argv[2])
+    info = engine.info()
+    print(f"{info['items']} items, {info['terms']} terms -> {artifact_dir(sys.argv[2], info['version'])}")
@@ -1,68 +1,451 @@
+import copy
+
+import numpy as np
 import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from scipy import sparse
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.preprocessing import normalize
+from .retrieval import IVFIndex, create_index, top_k as select_top_k
+from .search_artifacts import catalogue_fingerprint, open_index
 import os
+import time
+
+# Queries scored per sparse product in search_batch (bounds the score matrix)
+BATCH_CHUNK_SIZE = 256
+
+SEARCH_MODES = ('lexical', 'dense', 'hybrid')
+
+# Dimensions of the LSA embedding (capped by the catalogue's size)
+DENSE_DIMENSIONS = 128
+
+# BM25 term-frequency saturation and length normalisation (hybrid mode)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Nearest dense neighbours added to the lexical matches in hybrid mode, per result
+HYBRID_CANDIDATES = 10
+
+
+def _resized(matrix, shape):
+    """The same CSR data with a larger shape (new rows and columns are empty); no copy."""
+    matrix = sparse.csr_matrix(matrix)
+    indptr = np.pad(matrix.indptr, (0, shape[0] - matrix.shape[0]), mode='edge')
+    return sparse.csr_matrix((matrix.data, matrix.indices, indptr), shape=shape, copy=False)
+
 
 class ProductSearchEngine:
-    def __init__(self, data_path: str):
-        self.data_path = data_path
-        self.df = None
+    """
+    Product search over the catalogue. An engine is not modified once
+    queries can reach it: `with_items` returns a new engine that also
+    covers newly ingested products, which the owner swaps in as one
+    reference, so a query always sees one consistent vocabulary, weight
+    matrix and index. The dense embedding is fitted with the index (and
+    persisted with its artifact); BM25 weights are filled in on first use,
+    published with a single assignment.
+    """
+
+    def __init__(self, data, index: str = "inverted", artifact_dir=None, mode: str = "lexical", hybrid_weight: float = 0.5):
+        """
+        Args:
+            data: Items DataFrame, or a path to items.csv.
+            index: Retrieval backend: 'inverted' (exact, default),
+                'brute' (exact, scores every product) or 'lsh' (approximate).
+            artifact_dir: If set, the fitted index is loaded from (or saved
+                to) a memory-mapped artifact for this catalogue there.
+            mode: Default scoring: 'lexical' (TF-IDF cosine), 'dense' (LSA
+                embedding, matches related terms) or 'hybrid' (BM25 + dense).
+            hybrid_weight: Share of the dense score in hybrid mode (0-1).
+        """
+        started = time.perf_counter()
+        self.mode = self._check_mode(mode)
+        if not 0 <= hybrid_weight <= 1:
+            raise ValueError("hybrid_weight must be between 0 and 1")
+        self.hybrid_weight = hybrid_weight
+        self.data_path = None if isinstance(data, pd.DataFrame) else data
+        self.df = self._prepare(data) if self.data_path is None else None
         self.vectorizer = None
+        self.vocabulary = {}
+        self.term_counts = None
+        self.idf = None
         self.tfidf_matrix = None
-        self._load_data()
-        self._train()
+        self._records = None
+        self.index = create_index(index)
+        self.version = None
+        self.source = 'built'
+        # Dense embedding, fitted with the index
+        self._term_vectors = None
+        self.item_vectors = None
+        self.dense_index = IVFIndex()
+        self._bm25_state = None  # (term -> products postings, mean length, idf), on first use
+        if self.df is None:
+            self._load_data()
+        if artifact_dir is None:
+            self._train()
+        else:
+            self._open_artifact(artifact_dir)
+        self.load_seconds = time.perf_counter() - started
 
     def _load_data(self):
         """Loads items data from CSV."""
         if not os.path.exists(self.data_path):
             raise FileNotFoundError(f"Data file not found at {self.data_path}")
         
-        self.df = pd.read_csv(self.data_path)
+        self.df = self._prepare(pd.read_csv(self.data_path))
+
+    @staticmethod
+    def _prepare(df):
+        # Plain strings: catalogue rows are returned as dicts
+        df = df.astype({c: object for c in df.select_dtypes('category').columns})
         # Fill NaN values to avoid errors during text processing
-        self.df = self.df.fillna("")
+        df = df.fillna("")
         
         # Create a combined text field for better search context
-        self.df['combined_text'] = (
-            self.df['name'] + " " + 
-            self.df['category'] + " " + 
-            self.df['description']
+        df['combined_text'] = (
+            df['name'].astype(str) + " " + 
+            df['category'].astype(str) + " " + 
+            df['description'].astype(str)
         )
+        return df
+
+    @staticmethod
+    def _materialize(df):
+        """Result dicts per product, built once instead of per hit."""
+        return df.drop(columns='combined_text').to_dict('records')
+
+    @property
+    def records(self):
+        records = self._records
+        if records is None:
+            records = self._records = self._materialize(self.df)
+        return records
 
     def _train(self):
-        """Trains the TF-IDF vectorizer on the product data."""
-        self.vectorizer = TfidfVectorizer(stop_words='english')
-        self.tfidf_matrix = self.vectorizer.fit_transform(self.df['combined_text'])
+        """
+        Fits the vocabulary and TF-IDF weights on the product data.
+
+        Raw term counts and document frequencies are kept (same smoothed idf
+        and L2 normalisation as sklearn's TfidfVectorizer) so new products
+        can be folded in by with_items without refitting from scratch. The
+        dense embedding is fitted here too, so no query pays for it.
+        """
+        self.vectorizer = CountVectorizer(stop_words='english')
+        self.term_counts = self.vectorizer.fit_transform(self.df['combined_text']).tocsr()
+        self.vocabulary = dict(self.vectorizer.vocabulary_)
+        self._analyzer = self.vectorizer.build_analyzer()
+        self._doc_freq = np.bincount(self.term_counts.indices, minlength=self.term_counts.shape[1])
+        self._reweight()
+        self._fit_dense()
+
+    def _open_artifact(self, artifact_dir):
+        """
+        Loads the catalogue's persisted index (fitting and saving it first
+        if there is none). Arrays stay memory-mapped; only the vocabulary
+        dict and the retrieval index are built in memory.
+        """
+        fingerprint = catalogue_fingerprint(self.df['item_id'], self.df['combined_text'])
+
+        def build():
+            self._train()
+            return self._artifact_arrays(), {'fingerprint': fingerprint}
+
+        arrays, meta, built = open_index(artifact_dir, fingerprint, build)
+        self.version = meta['fingerprint']
+        self.source = 'built' if built else 'artifact'
+        if built:
+            return
 
-    def search(self, query: str, top_k: int = 5):
+        self.vectorizer = CountVectorizer(stop_words='english')
+        self._analyzer = self.vectorizer.build_analyzer()
+        self.vocabulary = dict(zip(arrays['vocabulary'].tolist(), range(len(arrays['vocabulary']))))
+        shape = (len(self.df), len(self.vocabulary))
+        self.term_counts = sparse.csr_matrix(
+            (arrays['counts_data'], arrays['counts_indices'], arrays['counts_indptr']), shape=shape, copy=False
+        )
+        self.tfidf_matrix = sparse.csr_matrix(
+            (arrays['tfidf_data'], arrays['tfidf_indices'], arrays['tfidf_indptr']), shape=shape, copy=False
+        )
+        self._doc_freq = arrays['doc_freq']
+        self.idf = np.log((1 + shape[0]) / (1 + self._doc_freq)) + 1
+        self.index.build(self.tfidf_matrix)
+        self._term_vectors = arrays['term_vectors']
+        self.item_vectors = arrays['item_vectors']
+        self.dense_index = IVFIndex().restore(self.item_vectors, arrays['dense_centroids'], arrays['dense_assignment'])
+
+    def _artifact_arrays(self):
+        terms = np.empty(len(self.vocabulary), dtype=object)
+        for term, col in self.vocabulary.items():
+            terms[col] = term
+        trained = self.dense_index.centroids is not None
+        dimensions = self._term_vectors.shape[1]
+        return {
+            'vocabulary': terms.astype(str),
+            'doc_freq': self._doc_freq,
+            'counts_data': self.term_counts.data,
+            'counts_indices': self.term_counts.indices,
+            'counts_indptr': self.term_counts.indptr,
+            'tfidf_data': self.tfidf_matrix.data,
+            'tfidf_indices': self.tfidf_matrix.indices,
+            'tfidf_indptr': self.tfidf_matrix.indptr,
+            'term_vectors': self._term_vectors,
+            'item_vectors': self.item_vectors,
+            'dense_centroids': self.dense_index.centroids if trained else np.zeros((0, dimensions), dtype=np.float32),
+            'dense_assignment': self.dense_index.assignment if trained else np.zeros(0, dtype=np.int64),
+        }
+
+    def info(self):
+        """Size and provenance of the current index."""
+        return {
+            'version': self.version,
+            'source': self.source,
+            'items': len(self.df),
+            'terms': len(self.vocabulary),
+            'load_ms': round(self.load_seconds * 1000, 2),
+            'mode': self.mode,
+            'dense_dimensions': None if self._term_vectors is None else self._term_vectors.shape[1]
+        }
+
+    @staticmethod
+    def _check_mode(mode):
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}'. Choose from: {', '.join(SEARCH_MODES)}")
+        return mode
+
+    def _fit_dense(self):
+        """
+        LSA embedding: a truncated SVD of the TF-IDF matrix maps terms that
+        occur in similar products to nearby directions, so a query matches
+        products that share none of its words. Item vectors are kept as one
+        contiguous, L2-normalised float32 matrix behind an IVF index.
+        """
+        n_docs, n_terms = self.tfidf_matrix.shape
+        n_components = min(DENSE_DIMENSIONS, n_docs - 1, n_terms - 1)
+        if n_components < 1:
+            term_vectors = np.zeros((n_terms, 1), dtype=np.float32)
+        else:
+            svd = TruncatedSVD(n_components=n_components, random_state=42).fit(self.tfidf_matrix)
+            term_vectors = np.ascontiguousarray(svd.components_.T, dtype=np.float32)
+        self.item_vectors = self._embed(self.tfidf_matrix, term_vectors)
+        self.dense_index = IVFIndex().build(self.item_vectors)
+        self._term_vectors = term_vectors
+
+    @staticmethod
+    def _embed(tfidf, term_vectors):
+        vectors = np.asarray(sparse.csr_matrix(tfidf, dtype=np.float32) @ term_vectors)
+        return np.ascontiguousarray(normalize(vectors), dtype=np.float32)
+
+    def embed(self, texts):
+        """Unit-length dense vectors for `texts` (zero for texts without known terms)."""
+        return self._embed(self.transform(texts), self._term_vectors)
+
+    def _bm25(self):
+        """BM25 weight of each (term, product) pair, as term -> products postings."""
+        state = self._bm25_state
+        if state is None:
+            counts = self.term_counts
+            lengths = np.asarray(counts.sum(axis=1)).ravel()
+            mean_length = max(lengths.mean(), 1) if len(lengths) else 1
+            idf = self._bm25_idf(self._doc_freq, counts.shape[0])
+            state = self._bm25_state = (self._bm25_weights(counts, mean_length, idf).T.tocsr(), mean_length, idf)
+        return state[0]
+
+    @staticmethod
+    def _bm25_idf(doc_freq, n_docs):
+        doc_freq = np.asarray(doc_freq, dtype=np.float64)
+        return np.log(1 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    @staticmethod
+    def _bm25_weights(counts, mean_length, idf):
+        """Product x term BM25 weights of term-count rows."""
+        counts = sparse.csr_matrix(counts, dtype=np.float64)
+        lengths = np.asarray(counts.sum(axis=1)).ravel()
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / mean_length)
+        tf = counts.data
+        rows = np.repeat(np.arange(counts.shape[0]), np.diff(counts.indptr))
+        weights = tf * (BM25_K1 + 1) / (tf + norm[rows]) * idf[counts.indices]
+        return sparse.csr_matrix((weights, counts.indices, counts.indptr), shape=counts.shape)
+
+    def _reweight(self):
+        n_docs = self.term_counts.shape[0]
+        self.idf = np.log((1 + n_docs) / (1 + self._doc_freq)) + 1
+        self.tfidf_matrix = self._weigh(self.term_counts)
+        self.index.build(self.tfidf_matrix)
+
+    def _weigh(self, counts):
+        return normalize(sparse.csr_matrix(counts.multiply(self.idf[np.newaxis, :]), dtype=np.float64))
+
+    def _count(self, texts, vocabulary=None):
+        """
+        Term-count rows for `texts` in this engine's vocabulary; given a
+        (copied) `vocabulary`, unseen terms are added to that instead.
+        """
+        grow = vocabulary is not None
+        vocabulary = vocabulary if grow else self.vocabulary
+        rows, cols = [], []
+        for row, text in enumerate(texts):
+            for term in self._analyzer(text):
+                col = vocabulary.get(term)
+                if col is None:
+                    if not grow:
+                        continue
+                    col = vocabulary[term] = len(vocabulary)
+                rows.append(row)
+                cols.append(col)
+        counts = sparse.csr_matrix(
+            (np.ones(len(rows)), (rows, cols)),
+            shape=(len(texts), len(vocabulary))
+        )
+        counts.sum_duplicates()
+        return counts
+
+    def transform(self, texts):
+        """TF-IDF vectors for `texts` in the catalogue's vector space."""
+        return self._weigh(self._count(texts))
+
+    def with_items(self, items_df):
+        """
+        A new engine that also covers the products in `items_df`. This
+        engine is left as it is (queries running on it are unaffected);
+        the caller swaps the new one in. Existing products keep their
+        weights: a term's idf is fixed when it first appears, so only the
+        new rows are weighted, embedded and indexed. A full rebuild
+        recomputes every weight from the current document frequencies.
+        """
+        if items_df.empty:
+            return self
+        items_df = self._prepare(items_df.reindex(columns=[c for c in self.df.columns if c != 'combined_text']))
+        vocabulary = dict(self.vocabulary)
+        counts = self._count(items_df['combined_text'].tolist(), vocabulary)
+        n_old = self.term_counts.shape[0]
+        n_docs, n_terms = n_old + counts.shape[0], len(vocabulary)
+        new_doc_freq = np.bincount(counts.indices, minlength=n_terms)
+
+        engine = copy.copy(self)
+        engine.vocabulary = vocabulary
+        engine._doc_freq = new_doc_freq.astype(self._doc_freq.dtype)
+        engine._doc_freq[:len(self._doc_freq)] += self._doc_freq
+        new_terms = engine._doc_freq[len(self.idf):]
+        engine.idf = np.concatenate([self.idf, np.log((1 + n_docs) / (1 + new_terms)) + 1])
+        engine.term_counts = sparse.vstack([_resized(self.term_counts, (n_old, n_terms)), counts], format='csr')
+        weights = engine._weigh(counts)
+        engine.tfidf_matrix = sparse.vstack([_resized(self.tfidf_matrix, (n_old, n_terms)), weights], format='csr')
+        engine.index = self.index.extend(engine.tfidf_matrix, n_old)
+        engine.df = pd.concat([self.df, items_df], ignore_index=True)
+        if self._records is not None:
+            engine._records = self._records + self._materialize(items_df)
+
+        if self._bm25_state is not None:
+            postings, mean_length, idf = self._bm25_state
+            idf = np.concatenate([idf, self._bm25_idf(new_terms, n_docs)])
+            new_postings = self._bm25_weights(counts, mean_length, idf).T
+            engine._bm25_state = (
+                sparse.hstack([_resized(postings, (n_terms, n_old)), new_postings], format='csr'), mean_length, idf
+            )
+        # New terms get no embedding direction until the next full build
+        term_vectors = np.zeros((n_terms, self._term_vectors.shape[1]), dtype=np.float32)
+        term_vectors[:len(self._term_vectors)] = self._term_vectors
+        engine.item_vectors = np.vstack([self.item_vectors, self._embed(weights, term_vectors)])
+        engine.dense_index = self.dense_index.extend(engine.item_vectors)
+        engine._term_vectors = term_vectors
+        # Differs from the persisted artifact until the next rebuild
+        engine.source = 'ingested'
+        return engine
+
+    def search(self, query: str, top_k: int = 5, mode: str = None):
         """
         Searches for products matching the query.
         
         Args:
             query: The search query string.
             top_k: Number of top results to return.
+            mode: 'lexical', 'dense' or 'hybrid' (the engine's mode if None).
             
         Returns:
             List of dictionaries containing product details.
         """
         if not query:
             return []
+        mode = self._check_mode(mode or self.mode)
+        if mode != 'lexical':
+            return self._search_embedded([query], top_k, mode)[0]
 
         # Transform the query to the same vector space
-        query_vec = self.vectorizer.transform([query])
+        query_vec = self.transform([query])
         
-        # Calculate cosine similarity between query and all products
-        cosine_similarities = cosine_similarity(query_vec, self.tfidf_matrix).flatten()
-        
-        # Get indices of top_k most similar items
-        related_docs_indices = cosine_similarities.argsort()[:-top_k-1:-1]
+        # TF-IDF rows are L2-normalised, so the index's dot-product scores
+        # are cosine similarities
+        related_docs_indices, scores = self.index.search(query_vec, top_k)
         
+        # Filter out results with very low similarity if needed, but for now return top_k
+        return [dict(self.records[i]) for i, score in zip(related_docs_indices, scores) if score > 0]
+
+    def _search_embedded(self, queries, top_k, mode):
+        """Dense or hybrid results for `queries`; one embedding product for all of them."""
+        query_counts = self._count([q or "" for q in queries])
+        query_vectors = self._embed(self._weigh(query_counts), self._term_vectors)
+        bm25 = None
+        if mode == 'hybrid':
+            # Binary query terms: a product scores each distinct term once
+            query_counts.data[:] = 1
+            bm25 = (query_counts @ self._bm25()).tocsr()
+
+        records = self.records
+        results = []
+        for row, query_vector in enumerate(query_vectors):
+            if bm25 is None:
+                docs, scores = self.dense_index.search(query_vector, top_k)
+            else:
+                docs, scores = self._hybrid_scores(query_vector, bm25, row, top_k)
+            results.append([dict(records[i]) for i, score in zip(docs, scores) if score > 0])
+        return results
+
+    def _hybrid_scores(self, query_vector, bm25, row, top_k):
+        """
+        Lexical matches plus the nearest dense neighbours, re-ranked by
+        (1 - w) * BM25 (scaled to the best match) + w * cosine.
+        """
+        begin, end = bm25.indptr[row], bm25.indptr[row + 1]
+        lexical_docs, lexical_scores = bm25.indices[begin:end], bm25.data[begin:end]
+        dense_docs, _ = self.dense_index.search(query_vector, top_k * HYBRID_CANDIDATES)
+        docs = np.union1d(lexical_docs, dense_docs)
+        lexical = np.zeros(len(docs))
+        if len(lexical_scores):
+            lexical[np.searchsorted(docs, lexical_docs)] = lexical_scores / lexical_scores.max()
+        dense = np.maximum(self.item_vectors[docs] @ query_vector, 0)
+        scores = (1 - self.hybrid_weight) * lexical + self.hybrid_weight * dense
+        order = select_top_k(scores, top_k)
+        return docs[order], scores[order]
+
+    def search_batch(self, queries, top_k: int = 5, mode: str = None):
+        """
+        Searches for many queries at once: the queries are vectorized into
+        one sparse matrix and scored against the catalogue with one sparse
+        product per chunk of BATCH_CHUNK_SIZE queries. Lexical scoring is
+        exact whatever the index backend; dense and hybrid queries are
+        embedded together and looked up in the dense index.
+
+        Returns:
+            A list aligned with `queries`, each a list of product dicts
+            (empty for empty queries or queries without matches).
+        """
+        queries = list(queries)
+        mode = self._check_mode(mode or self.mode)
+        if mode != 'lexical':
+            return [
+                hits
+                for start in range(0, len(queries), BATCH_CHUNK_SIZE)
+                for hits in self._search_embedded(queries[start:start + BATCH_CHUNK_SIZE], top_k, mode)
+            ]
         results = []
-        for i in related_docs_indices:
-            # Filter out results with very low similarity if needed, but for now return top_k
-            if cosine_similarities[i] > 0:
-                item = self.df.iloc[i].to_dict()
-                # Remove the internal 'combined_text' field from the result
-                item.pop('combined_text', None)
-                results.append(item)
-                
+        catalogue_t = self.tfidf_matrix.T.tocsc()
+        records = self.records
+        for start in range(0, len(queries), BATCH_CHUNK_SIZE):
+            chunk = queries[start:start + BATCH_CHUNK_SIZE]
+            scores = (self.transform([q or "" for q in chunk]) @ catalogue_t).tocsr()
+            scores.sort_indices()
+            for row in range(len(chunk)):
+                begin, end = scores.indptr[row], scores.indptr[row + 1]
+                docs, row_scores = scores.indices[begin:end], scores.data[begin:end]
+                order = select_top_k(row_scores, top_k)
+                results.append([dict(records[docs[i]]) for i in order if row_scores[i] > 0])
         return results
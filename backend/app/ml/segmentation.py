@@ -0,0 +1,328 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+
+FEATURES = ['recency_days', 'frequency', 'monetary']
+
+# Full (warm-started) refit once the customer base grew by this fraction
+REFIT_GROWTH = 0.25
+
+_NS_PER_DAY = 86_400 * 10**9
+
+
+def name_segments(total_spend, frequency, spend_mean, frequency_mean, recency=None, recency_mean=None):
+    """
+    Segment name per cluster from its mean spend and frequency (and
+    recency, if given) against the overall means. Clusters that would
+    share a name are numbered, most recent first, so names are unique.
+    """
+    total_spend, frequency = np.asarray(total_spend), np.asarray(frequency)
+    names = np.select(
+        [
+            (total_spend > spend_mean) & (frequency > frequency_mean),
+            (total_spend < spend_mean) & (frequency > frequency_mean),
+            (total_spend > spend_mean) & (frequency < frequency_mean),
+        ],
+        ["High Value / Loyal", "Frequent / Low Spender", "Big Spender / Occasional"],
+        default="Low Value / Occasional"
+    )
+    order = np.argsort(total_spend, kind='stable')[::-1]
+    if recency is not None:
+        recency = np.asarray(recency)
+        # Clusters whose customers have not bought for longer than usual
+        names = np.where(
+            recency > recency_mean,
+            np.select(
+                [names == "High Value / Loyal", names == "Big Spender / Occasional", names == "Frequent / Low Spender"],
+                ["At Risk / High Value", "At Risk / Big Spender", "Lapsing / Frequent"],
+                default="Lapsed / Low Value"
+            ),
+            names
+        )
+        order = np.argsort(recency, kind='stable')
+    names = names.tolist()
+    seen = {}
+    for cluster in order:
+        name = names[cluster]
+        seen[name] = seen.get(name, 0) + 1
+        if seen[name] > 1:
+            names[cluster] = f"{name} {seen[name]}"
+    return names
+
+
+class SegmentationService:
+    """
+    Customer segments over RFM features (recency, frequency, monetary),
+    maintained incrementally.
+
+    Per-customer features live in NumPy arrays behind a customer_id -> row
+    index and are updated from each ingested batch. A full fit is a
+    mini-batch K-Means over every customer; afterwards each batch's
+    customers are folded in with one mini-batch step (each centroid moves
+    to the running mean of the points assigned to it), so centroids follow
+    new data without a refit. Features are standardized with the scaler of
+    the last full fit so centroids stay comparable across updates; a full
+    fit, warm-started from the current centroids, runs again once the
+    customer base grows by REFIT_GROWTH.
+
+    Centroids, their point counts and the scaler are persisted to
+    `cache_dir`, keyed by a fingerprint of the customer features they
+    were fitted on, and reused on a restart over the same data; other
+    data gets a fresh fit. Assignments and the segment summary
+    are recomputed lazily (one vectorized pass) after an update, so reads
+    are cached lookups.
+    """
+
+    def __init__(self, transactions_df, n_clusters=3, cache_dir=None, batch_size=1024, random_state=42):
+        self.n_clusters = n_clusters
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.batch_size = batch_size
+        self.random_state = random_state
+        self._rows = {}
+        self._customer_ids = []
+        self.last_seen = np.zeros(16, dtype=np.int64)
+        self.frequency = np.zeros(16, dtype=np.int64)
+        self.monetary = np.zeros(16, dtype=np.float64)
+        self.latest = None  # ns timestamp recency is measured from
+        self.scaler_mean = None
+        self.scaler_scale = None
+        self.centroids = None
+        self.center_counts = None
+        self._fitted_size = 0
+        self._assignments = None  # (labels, summary, names), rebuilt after updates
+        self._lock = threading.Lock()
+
+        if not transactions_df.empty:
+            # Persisted centroids are reused for the same features; otherwise fit once
+            self._accumulate(transactions_df)
+            if self.cache_dir:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                self._load()
+            if self.centroids is None or len(self.centroids) > len(self._rows):
+                self._fit()
+                self._save()
+            self._fitted_size = len(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _row(self, customer_id):
+        row = self._rows.get(customer_id)
+        if row is None:
+            row = self._rows[customer_id] = len(self._customer_ids)
+            self._customer_ids.append(customer_id)
+            if row >= len(self.frequency):
+                capacity = 2 * len(self.frequency)
+                self.last_seen = np.pad(self.last_seen, (0, capacity - len(self.last_seen)))
+                self.frequency = np.pad(self.frequency, (0, capacity - len(self.frequency)))
+                self.monetary = np.pad(self.monetary, (0, capacity - len(self.monetary)))
+        return row
+
+    def features(self, rows=None):
+        """Raw RFM matrix (recency in days) for `rows` (every customer if None)."""
+        if rows is None:
+            rows = slice(0, len(self._rows))
+        recency = (self.latest - self.last_seen[rows]) / _NS_PER_DAY
+        return np.column_stack([recency, self.frequency[rows], self.monetary[rows]]).astype(np.float64)
+
+    def _scale(self, features):
+        return (features - self.scaler_mean) / self.scaler_scale
+
+    def _accumulate(self, transactions_df):
+        """Adds a batch to the per-customer features; returns the touched rows."""
+        visits = transactions_df.groupby('customer_id', observed=True).agg(
+            last_seen=('timestamp', 'max'), frequency=('total_price', 'count'), monetary=('total_price', 'sum')
+        )
+        with self._lock:
+            rows = np.fromiter((self._row(c) for c in visits.index.astype(str)), dtype=np.int64, count=len(visits))
+            last_seen = visits['last_seen'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+            np.maximum.at(self.last_seen, rows, last_seen)
+            np.add.at(self.frequency, rows, visits['frequency'].to_numpy(dtype=np.int64))
+            np.add.at(self.monetary, rows, visits['monetary'].to_numpy(dtype=np.float64))
+            self.latest = last_seen.max() if self.latest is None else max(self.latest, last_seen.max())
+            self._assignments = None
+        return rows
+
+    def add_transactions(self, transactions_df):
+        """Folds a batch into the RFM features and the centroids."""
+        if transactions_df.empty:
+            return
+        rows = self._accumulate(transactions_df)
+        with self._lock:
+            grown = len(self._rows) > (1 + REFIT_GROWTH) * self._fitted_size
+            if self.centroids is None or len(self.centroids) > len(self._rows) or grown:
+                self._fit()
+                self._fitted_size = len(self._rows)
+            else:
+                self._update(rows)
+            self._assignments = None
+        self._save()
+
+    def on_ingest(self, table, batch):
+        """Data store listener."""
+        if table == 'transactions':
+            self.add_transactions(batch)
+
+    def _fit(self):
+        """Full mini-batch fit over every customer; refreshes the scaler."""
+        features = self.features()
+        n_clusters = min(self.n_clusters, len(features))
+        init, n_init = 'k-means++', 3
+        if self.centroids is not None and len(self.centroids) == n_clusters:
+            # Warm start: current centroids, carried over to the new scaling
+            init, n_init = self.centroids * self.scaler_scale + self.scaler_mean, 1
+
+        self.scaler_mean = features.mean(axis=0)
+        scale = features.std(axis=0)
+        self.scaler_scale = np.where(scale > 0, scale, 1.0)
+        if n_init == 1:
+            init = self._scale(init)
+        model = MiniBatchKMeans(
+            n_clusters=n_clusters, init=init, n_init=n_init,
+            batch_size=self.batch_size, random_state=self.random_state
+        )
+        labels = model.fit_predict(self._scale(features))
+        self.centroids = model.cluster_centers_.copy()
+        self.center_counts = np.bincount(labels, minlength=n_clusters).astype(np.float64)
+
+    def _nearest(self, scaled):
+        distances = ((scaled[:, np.newaxis, :] - self.centroids[np.newaxis, :, :]) ** 2).sum(axis=2)
+        return distances.argmin(axis=1)
+
+    def _update(self, rows):
+        """One mini-batch step with the changed customers' features."""
+        scaled = self._scale(self.features(rows))
+        labels = self._nearest(scaled)
+        n = len(self.centroids)
+        batch_counts = np.bincount(labels, minlength=n).astype(np.float64)
+        batch_sums = np.zeros_like(self.centroids)
+        np.add.at(batch_sums, labels, scaled)
+
+        counts = self.center_counts + batch_counts
+        moved = batch_counts > 0
+        self.centroids[moved] = (
+            self.centroids[moved] * self.center_counts[moved, np.newaxis] + batch_sums[moved]
+        ) / counts[moved, np.newaxis]
+        self.center_counts = counts
+
+    def _assign(self):
+        """(labels per customer, summary records, name per cluster), cached until the next update."""
+        assignments = self._assignments
+        if assignments is not None:
+            return assignments
+        with self._lock:
+            features = self.features()
+            if self.centroids is None or not len(features):
+                self._assignments = (np.array([], dtype=np.int64), [], [])
+                return self._assignments
+            labels = self._nearest(self._scale(features))
+
+            n = len(self.centroids)
+            counts = np.bincount(labels, minlength=n)
+            sums = lambda values: np.bincount(labels, weights=values, minlength=n)
+            frequency, monetary = features[:, 1], features[:, 2]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means = {
+                    'total_spend': sums(monetary) / counts,
+                    'avg_txn_value': sums(monetary / frequency) / counts,
+                    'frequency': sums(frequency) / counts,
+                    'recency_days': sums(features[:, 0]) / counts,
+                }
+            names = name_segments(
+                means['total_spend'], means['frequency'], monetary.mean(), frequency.mean(),
+                means['recency_days'], features[:, 0].mean()
+            )
+            summary = [
+                {
+                    'cluster': int(cluster),
+                    'segment_name': names[cluster],
+                    'total_spend': float(means['total_spend'][cluster]),
+                    'avg_txn_value': float(means['avg_txn_value'][cluster]),
+                    'frequency': float(means['frequency'][cluster]),
+                    'recency_days': float(means['recency_days'][cluster]),
+                    'customer_count': int(counts[cluster])
+                }
+                for cluster in np.flatnonzero(counts)
+            ]
+            self._assignments = (labels, summary, names)
+        return self._assignments
+
+    def summary(self):
+        """Per-segment means and customer counts."""
+        return self._assign()[1]
+
+    def segment(self, customer_id):
+        """The customer's segment and RFM features, or None if they have no transactions."""
+        row = self._rows.get(customer_id)
+        if row is None:
+            return None
+        labels, _, names = self._assign()
+        if row >= len(labels):
+            return None
+        cluster = int(labels[row])
+        recency, frequency, monetary = self.features([row])[0]
+        return {
+            'customer_id': customer_id,
+            'cluster': cluster,
+            'segment_name': names[cluster],
+            'recency_days': float(recency),
+            'frequency': int(frequency),
+            'monetary': float(monetary)
+        }
+
+    def _fingerprint(self):
+        """Content hash of the per-customer features (ids and raw RFM arrays, in row order)."""
+        n = len(self._rows)
+        digest = hashlib.sha1(json.dumps([FEATURES, self.n_clusters]).encode())
+        digest.update("\0".join(self._customer_ids).encode())
+        for values in (self.last_seen[:n], self.frequency[:n], self.monetary[:n]):
+            digest.update(np.ascontiguousarray(values).tobytes())
+        return digest.hexdigest()[:16]
+
+    def _path(self, fingerprint):
+        return self.cache_dir / f"segments-k{self.n_clusters}-{fingerprint}.json"
+
+    def _load(self):
+        path = self._path(self._fingerprint())
+        if not path.exists():
+            return
+        try:
+            with open(path) as f:
+                payload = json.load(f)
+            if payload['features'] != FEATURES or len(payload['scaler_mean']) != len(FEATURES):
+                return
+            self.scaler_mean = np.array(payload['scaler_mean'], dtype=np.float64)
+            self.scaler_scale = np.array(payload['scaler_scale'], dtype=np.float64)
+            self.centroids = np.array(payload['centroids'], dtype=np.float64)
+            self.center_counts = np.array(payload['center_counts'], dtype=np.float64)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"WARNING: Ignoring unreadable segment cache {path}: {e}")
+
+    def _save(self):
+        if not self.cache_dir or self.centroids is None:
+            return
+        payload = {
+            'features': FEATURES,
+            'scaler_mean': self.scaler_mean.tolist(),
+            'scaler_scale': self.scaler_scale.tolist(),
+            'centroids': self.centroids.tolist(),
+            'center_counts': self.center_counts.tolist()
+        }
+        path = self._path(self._fingerprint())
+        tmp_path = path.with_suffix('.tmp')
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(payload, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"WARNING: Could not persist segment centroids to {path}: {e}")
+            return
+        # Centroids of earlier data are not reused
+        for stale in self.cache_dir.glob(f"segments-k{self.n_clusters}*.json"):
+            if stale != path:
+                stale.unlink(missing_ok=True)
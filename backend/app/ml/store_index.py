@@ -0,0 +1,116 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Ingested rows are merged into the sorted index once the unsorted tail
+# exceeds this many rows (or this fraction of the table)
+MERGE_MIN_ROWS = 4096
+MERGE_FRACTION = 0.05
+
+
+def to_timestamp_ns(value):
+    """Query bound -> int64 ns, naive UTC like the stored timestamps (None stays None)."""
+    if value is None:
+        return None
+    value = pd.Timestamp(value)
+    if value.tzinfo is not None:
+        value = value.tz_convert('UTC').tz_localize(None)
+    return value.as_unit('ns').value
+
+
+class StoreIndex:
+    """
+    Store -> row-range index over a table with `store_id` and `timestamp`.
+
+    Row positions are kept sorted by (store, timestamp), with offsets giving
+    each store's contiguous range, so a store's rows in [start, end) are
+    two binary searches inside its range. Rows appended by ingests go to a
+    small unsorted tail that queries scan directly; the tail is merged into
+    the sorted index once it grows past MERGE_MIN_ROWS / MERGE_FRACTION.
+    """
+
+    def __init__(self, df):
+        self._lock = threading.Lock()
+        self._n_rows = 0
+        self._tail_stores = np.array([], dtype=object)
+        self._tail_times = np.array([], dtype=np.int64)
+        self._build(df)
+
+    def _build(self, df):
+        if df.empty:
+            store_codes, store_ids = np.array([], dtype=np.int64), []
+            times = np.array([], dtype=np.int64)
+        else:
+            store_codes, store_ids = pd.factorize(df['store_id'], sort=True)
+            times = df['timestamp'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+        store_ids = np.asarray(store_ids, dtype=str).astype(object)
+
+        order = np.lexsort((times, store_codes))
+        self.store_ids = store_ids
+        self._store_pos = {store_id: i for i, store_id in enumerate(store_ids)}
+        self.order = order
+        self.sorted_times = times[order]
+        self.offsets = np.searchsorted(store_codes[order], np.arange(len(store_ids) + 1))
+        self._n_rows = len(df)
+        self._sorted_rows = len(df)
+        self._tail_stores = np.array([], dtype=object)
+        self._tail_times = np.array([], dtype=np.int64)
+
+    def append(self, batch, full_df_fn):
+        """
+        Registers rows appended to the table (`batch`, in table order).
+        `full_df_fn()` returns the whole table for a merge.
+        """
+        with self._lock:
+            self._tail_stores = np.concatenate([self._tail_stores, batch['store_id'].astype(str).to_numpy(dtype=object)])
+            self._tail_times = np.concatenate([
+                self._tail_times, batch['timestamp'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+            ])
+            self._n_rows += len(batch)
+            if len(self._tail_times) > max(MERGE_MIN_ROWS, MERGE_FRACTION * self._sorted_rows):
+                self._build(full_df_fn())
+
+    def rows(self, store_id=None, start=None, end=None):
+        """
+        Row positions (ascending) for `store_id` with start <= timestamp < end.
+        Any bound may be None. Returns None when nothing is filtered, meaning
+        "every row".
+        """
+        if store_id is None and start is None and end is None:
+            return None
+        start_ns, end_ns = to_timestamp_ns(start), to_timestamp_ns(end)
+
+        with self._lock:
+            if store_id is None:
+                # Every store's range, each narrowed by binary search
+                ranges = [self._range(pos, start_ns, end_ns) for pos in range(len(self.store_ids))]
+            else:
+                pos = self._store_pos.get(store_id)
+                ranges = [] if pos is None else [self._range(pos, start_ns, end_ns)]
+            parts = [self.order[lo:hi] for lo, hi in ranges]
+
+            # Unsorted tail: scanned directly (it is kept small)
+            if len(self._tail_times):
+                mask = np.ones(len(self._tail_times), dtype=bool)
+                if store_id is not None:
+                    mask &= self._tail_stores == store_id
+                if start_ns is not None:
+                    mask &= self._tail_times >= start_ns
+                if end_ns is not None:
+                    mask &= self._tail_times < end_ns
+                parts.append(self._sorted_rows + np.flatnonzero(mask))
+
+        if not parts:
+            return np.array([], dtype=np.int64)
+        return np.sort(np.concatenate(parts))
+
+    def _range(self, pos, start_ns, end_ns):
+        lo, hi = self.offsets[pos], self.offsets[pos + 1]
+        times = self.sorted_times[lo:hi]
+        first, last = 0, len(times)
+        if start_ns is not None:
+            first = np.searchsorted(times, start_ns, side='left')
+        if end_ns is not None:
+            last = np.searchsorted(times, end_ns, side='left')
+        return lo + first, lo + max(first, last)
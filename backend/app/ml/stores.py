@@ -0,0 +1,112 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+FIELDS = ['name', 'category', 'zone', 'tier']
+
+# Fields with a value -> stores index
+INDEXED_FIELDS = ['zone', 'category', 'tier']
+
+
+class StoreDirectory:
+    """
+    The stores table as parallel arrays (one row per store) behind a
+    store_id -> row hash index, plus zone / category / tier -> rows
+    indexes (case-insensitive), so store lookups are O(1) dictionary hits.
+
+    Rows are integer store codes: `codes(store_ids)` maps a column of
+    store ids to codes in one vectorized pass, after which joins to store
+    attributes are array lookups (`zone_codes[codes]`, `np.bincount`)
+    rather than DataFrame merges. Stores ingested later are appended.
+    """
+
+    def __init__(self, stores_df):
+        self._lock = threading.Lock()
+        self._rows = {}
+        self.store_ids = np.array([], dtype=object)
+        self.columns = {field: np.array([], dtype=object) for field in FIELDS}
+        self._index = {field: {} for field in INDEXED_FIELDS}
+        self._ids = pd.Index([], dtype=object)
+        self.zones = []
+        self.zone_codes = np.array([], dtype=np.int64)
+        if stores_df is not None and not stores_df.empty:
+            self.add_stores(stores_df)
+
+    def __len__(self):
+        return len(self.store_ids)
+
+    def __contains__(self, store_id):
+        return store_id in self._rows
+
+    def add_stores(self, stores_df):
+        """Appends stores not listed yet; the indexes are rebuilt (the table is small)."""
+        stores_df = stores_df.assign(store_id=stores_df['store_id'].astype(str))
+        stores_df = stores_df[~stores_df['store_id'].isin(self._rows)].drop_duplicates('store_id')
+        if stores_df.empty:
+            return
+        store_ids = np.concatenate([self.store_ids, stores_df['store_id'].to_numpy(dtype=object)])
+        columns = {
+            field: np.concatenate([
+                self.columns[field],
+                stores_df[field].fillna("").astype(str).to_numpy(dtype=object) if field in stores_df.columns
+                else np.full(len(stores_df), "", dtype=object)
+            ])
+            for field in FIELDS
+        }
+        index = {}
+        for field in INDEXED_FIELDS:
+            codes, values = pd.factorize(pd.Series(columns[field]).str.lower())
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(values) + 1))
+            index[field] = {value: order[bounds[i]:bounds[i + 1]] for i, value in enumerate(values)}
+        zone_codes, zones = pd.factorize(columns['zone'])
+
+        with self._lock:
+            self.store_ids = store_ids
+            self.columns = columns
+            self._index = index
+            self._rows = dict(zip(store_ids.tolist(), range(len(store_ids))))
+            self._ids = pd.Index(store_ids)
+            self.zones = zones.tolist()
+            self.zone_codes = zone_codes.astype(np.int64)
+
+    def on_ingest(self, table, batch):
+        """Data store listener."""
+        if table == 'stores':
+            self.add_stores(batch)
+
+    def _record(self, row):
+        return {'store_id': self.store_ids[row], **{field: self.columns[field][row] for field in FIELDS}}
+
+    def get(self, store_id):
+        """The store's record, or None if it is not listed."""
+        row = self._rows.get(store_id)
+        return None if row is None else self._record(row)
+
+    def name(self, store_id):
+        """Display name of a store; unlisted stores show their id."""
+        row = self._rows.get(store_id)
+        return store_id if row is None else self.columns['name'][row]
+
+    def rows(self, zone=None, category=None, tier=None):
+        """Codes of the stores matching every given attribute (all stores if none), in table order."""
+        rows = None
+        for field, value in (('zone', zone), ('category', category), ('tier', tier)):
+            if value is None:
+                continue
+            matches = self._index[field].get(str(value).lower(), np.array([], dtype=np.int64))
+            rows = matches if rows is None else np.intersect1d(rows, matches)
+        return np.arange(len(self.store_ids)) if rows is None else np.sort(rows)
+
+    def find(self, zone=None, category=None, tier=None):
+        """Records of the stores matching every given attribute."""
+        return [self._record(row) for row in self.rows(zone, category, tier)]
+
+    def has_zone(self, zone):
+        """Whether any store is in `zone` (case-insensitive)."""
+        return str(zone).lower() in self._index['zone']
+
+    def codes(self, store_ids):
+        """Store codes for a sequence of store ids (-1 where not listed)."""
+        return self._ids.get_indexer(pd.Index(store_ids).astype(str))
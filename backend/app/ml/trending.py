@@ -0,0 +1,157 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from .basket import split_baskets
+
+# Sales lose half their weight after this many days
+DEFAULT_HALF_LIFE_DAYS = 7.0
+
+# Counters are rescaled before exp() weights get near float64 overflow
+_MAX_EXPONENT = 500.0
+
+_NS_PER_DAY = 86_400 * 10**9
+
+# Scoped rankings kept (LRU)
+RANKINGS_CACHE_SIZE = 64
+
+
+class TrendingEngine:
+    """
+    Time-decayed item sales counters.
+
+    Uses forward decay: a sale at time t adds exp(lambda * (t - landmark)),
+    so counters stay additive (batches can arrive in any order) and the
+    decayed count as of time T is counter * exp(-lambda * (T - landmark)).
+    The landmark moves forward when weights grow too large.
+
+    Each catalogue item belongs to one store and one category, so store and
+    category trends are the mall counters restricted to those items. The
+    ranking per scope is sorted once and reused until the next update, so
+    top-N queries are a slice; rankings are kept for the RANKINGS_CACHE_SIZE
+    most recent scopes, and only for stores and categories in the catalogue.
+    """
+
+    def __init__(self, transactions_df, items_df, half_life_days=DEFAULT_HALF_LIFE_DAYS):
+        self.half_life_days = half_life_days
+        self.decay = np.log(2) / half_life_days
+        self.item_ids = pd.Index([])
+        self.names = np.array([], dtype=object)
+        self.stores = np.array([], dtype=object)
+        self.categories = np.array([], dtype=object)
+        self.prices = np.array([], dtype=np.float64)
+        self.weights = np.array([], dtype=np.float64)
+        self.sales = np.array([], dtype=np.int64)
+        self.landmark = None  # days since epoch
+        self.latest = None
+        self._rankings = OrderedDict()
+        self._store_ids = set()
+        self._category_names = set()
+        self._lock = threading.Lock()
+
+        if not items_df.empty:
+            self.add_items(items_df)
+        if not transactions_df.empty:
+            self.add_transactions(transactions_df)
+
+    def add_items(self, items_df):
+        """Registers catalogue items (only catalogue items can trend)."""
+        items = items_df.drop_duplicates('item_id')
+        ids = items['item_id'].astype(str).to_numpy(dtype=object)
+        with self._lock:
+            new_ids = pd.Index(ids).difference(self.item_ids, sort=False)
+            if len(new_ids):
+                n_new = len(new_ids)
+                self.item_ids = self.item_ids.append(new_ids)
+                self.names = np.concatenate([self.names, np.empty(n_new, dtype=object)])
+                self.stores = np.concatenate([self.stores, np.empty(n_new, dtype=object)])
+                self.categories = np.concatenate([self.categories, np.empty(n_new, dtype=object)])
+                self.prices = np.concatenate([self.prices, np.zeros(n_new)])
+                self.weights = np.concatenate([self.weights, np.zeros(n_new)])
+                self.sales = np.concatenate([self.sales, np.zeros(n_new, dtype=np.int64)])
+            cols = self.item_ids.get_indexer(ids)
+            self.names[cols] = items['name'].astype(str).to_numpy(dtype=object)
+            self.stores[cols] = items['store_id'].astype(str).to_numpy(dtype=object)
+            self.categories[cols] = items['category'].astype(str).to_numpy(dtype=object)
+            self.prices[cols] = items['price'].to_numpy(dtype=np.float64)
+            self._store_ids = set(self.stores.tolist())
+            self._category_names = set(self.categories.tolist())
+            self._rankings = OrderedDict()
+
+    def add_transactions(self, transactions_df):
+        """Adds each sold item's decayed weight at its transaction time."""
+        rows, values = split_baskets(transactions_df['items'])
+        cols = self.item_ids.get_indexer(values.astype(str))
+        known = cols >= 0
+        if not known.any():
+            return
+        days = transactions_df['timestamp'].to_numpy(dtype='datetime64[ns]').view(np.int64) / _NS_PER_DAY
+        times = days[rows[known]]
+        cols = cols[known]
+
+        with self._lock:
+            if self.landmark is None:
+                self.landmark = times.min()
+            horizon = times.max()
+            if (horizon - self.landmark) * self.decay > _MAX_EXPONENT:
+                # Rebase: same decayed counts, smaller stored weights
+                self.weights *= np.exp(-self.decay * (horizon - self.landmark))
+                self.landmark = horizon
+            np.add.at(self.weights, cols, np.exp(self.decay * (times - self.landmark)))
+            np.add.at(self.sales, cols, 1)
+            self.latest = horizon if self.latest is None else max(self.latest, horizon)
+            self._rankings = OrderedDict()
+
+    def on_ingest(self, table, batch):
+        """Data store listener."""
+        if table == 'transactions':
+            self.add_transactions(batch)
+        elif table == 'items':
+            self.add_items(batch)
+
+    def _ranking(self, store_id, category):
+        key = (store_id, category)
+        with self._lock:
+            if (store_id is not None and store_id not in self._store_ids) or (
+                category is not None and category not in self._category_names
+            ):
+                # Unknown scopes are not cached
+                return np.array([], dtype=np.int64)
+            ranking = self._rankings.get(key)
+            if ranking is None:
+                scope = self.sales > 0
+                if store_id is not None:
+                    scope &= self.stores == store_id
+                if category is not None:
+                    scope &= self.categories == category
+                cols = np.flatnonzero(scope)
+                ranking = self._rankings[key] = cols[np.lexsort((cols, -self.weights[cols]))]
+                while len(self._rankings) > RANKINGS_CACHE_SIZE:
+                    self._rankings.popitem(last=False)
+            else:
+                self._rankings.move_to_end(key)
+        return ranking
+
+    def top(self, n=10, store_id=None, category=None):
+        """
+        Top-`n` items by decayed sales as of the latest transaction,
+        optionally within one store and/or category.
+        """
+        cols = self._ranking(store_id, category)[:n]
+        if len(cols) == 0:
+            return []
+        scale = np.exp(-self.decay * (self.latest - self.landmark))
+        return [
+            {
+                'item_id': self.item_ids[col],
+                'name': self.names[col],
+                'store_id': self.stores[col],
+                'category': self.categories[col],
+                'price': float(self.prices[col]),
+                'score': float(self.weights[col] * scale),
+                'sales_count': int(self.sales[col])
+            }
+            for col in cols
+        ]
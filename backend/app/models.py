@@ -1,5 +1,10 @@
-from pydantic import BaseModel
-from typing import List, Optional, Union
+from datetime import datetime, timedelta, timezone
+from pydantic import BaseModel, Field, field_validator
+from typing import Dict, List, Literal, Optional, Union
+
+# Accepted transaction timestamps: from this date to a day ahead of now
+TRANSACTION_EARLIEST = datetime(2000, 1, 1)
+TRANSACTION_MAX_AHEAD = timedelta(days=1)
 
 class ChatQuery(BaseModel):
     user_id: str
@@ -14,6 +19,31 @@ class Product(BaseModel):
     description: str
     category: str
 
+class Store(BaseModel):
+    store_id: str
+    name: str
+    category: str
+    zone: str
+    tier: str
+
+class SearchBatchRequest(BaseModel):
+    queries: List[str]
+    top_k: int = Field(5, ge=1, le=50)
+    mode: Optional[Literal['lexical', 'dense', 'hybrid']] = None # Server default if None
+
+class SearchBatchResult(BaseModel):
+    query: str
+    results: List[Product]
+
+class SearchIndexInfo(BaseModel):
+    version: Optional[str] # Catalogue fingerprint of the persisted artifact
+    source: str # 'artifact' (memory-mapped), 'built' or 'ingested'
+    items: int
+    terms: int
+    load_ms: float
+    mode: str # Default scoring: 'lexical', 'dense' or 'hybrid'
+    dense_dimensions: Optional[int] = None # Set once the dense embedding is fitted
+
 class ChatResponse(BaseModel):
     response_text: str
     action: str  # e.g., 'recommend', 'show-chart', 'navigate', 'clarify'
@@ -36,6 +66,22 @@ class MarketBasketRule(BaseModel):
     confidence: float
     lift: float
 
+class AssociationRule(BaseModel):
+    antecedent: List[str]
+    consequent: List[str]
+    antecedent_ids: List[str]
+    consequent_ids: List[str]
+    support: float
+    confidence: float
+    lift: float
+    conviction: Optional[float] = None  # None when confidence is 1 (infinite)
+
+class AssociationRulePage(BaseModel):
+    total: int
+    limit: int
+    offset: int
+    rules: List[AssociationRule]
+
 class CustomerSegment(BaseModel):
     cluster: int
     segment_name: str
@@ -43,6 +89,15 @@ class CustomerSegment(BaseModel):
     avg_txn_value: float
     frequency: float
     customer_count: int
+    recency_days: Optional[float] = None # Mean days since last purchase (RFM segments)
+
+class CustomerSegmentAssignment(BaseModel):
+    customer_id: str
+    cluster: int
+    segment_name: str
+    recency_days: float
+    frequency: int
+    monetary: float
 
 class CustomerInsight(BaseModel):
     total_spend: float
@@ -68,9 +123,130 @@ class PersonaAnalysis(BaseModel):
     avg_spend: float
     txn_count: int
 
+class OwnerDashboard(BaseModel):
+    forecast: Optional[Forecast] = None
+    insights: List[OwnerInsight] = []
+    market_basket: List[MarketBasketRule] = []
+    segments: List[CustomerSegment] = []
+    seasonal: List[SeasonalAnalysis] = []
+    time_habits: Optional[TimeHabits] = None
+    sentiment: List[SentimentAnalysis] = []
+    personas: List[PersonaAnalysis] = []
+    errors: dict = {}  # panel -> error message, for panels that failed
+
 class Recommendation(BaseModel):
     item_id: str
     name: str
     price: float
     sales_count: Optional[int] = None
-    reason: str
\ No newline at end of file
+    reason: str
+
+class TrendingItem(BaseModel):
+    item_id: str
+    name: str
+    store_id: str
+    category: str
+    price: float
+    score: float  # Sales decayed to the latest transaction time
+    sales_count: int
+
+class ExecutorLaneStats(BaseModel):
+    max_concurrency: int
+    max_queue: int
+    queued: int
+    running: int
+    completed: int
+    failed: int
+    rejected: int
+
+class ExecutorStats(BaseModel):
+    cpu_mode: str
+    cpu: ExecutorLaneStats
+    io: ExecutorLaneStats
+
+class RouterStats(BaseModel):
+    routed: int
+    by_intent: Dict[str, int] # Messages per intent: search, price, store, trending, llm
+    escalated: int # Direct routes that found nothing and went to the LLM
+    llm_share: Optional[float]
+    avg_route_us: Optional[float]
+
+class ChatCacheStats(BaseModel):
+    max_entries: int
+    max_bytes: int
+    ttl_seconds: float
+    similarity: Optional[float] # Cosine threshold for similar-query hits; None if exact only
+    entries: int
+    size_bytes: int
+    hits: int
+    similar_hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+
+class LLMStats(BaseModel):
+    client: str
+    max_concurrency: int
+    max_queue: int
+    timeout_seconds: float
+    queued: int
+    running: int
+    calls: int
+    succeeded: int
+    timeouts: int
+    failed: int
+    rejected: int
+    retries: int
+    avg_latency_ms: Optional[float]
+
+class CacheStats(BaseModel):
+    max_entries: int
+    ttl_seconds: float
+    entries: int
+    size_bytes: int
+    hits: int
+    misses: int
+    not_modified: int
+    evictions: int
+    invalidations: int
+
+class TransactionRecord(BaseModel):
+    txn_id: str
+    store_id: str
+    customer_id: str
+    items: List[str]  # item_ids
+    total_price: float
+    timestamp: datetime
+
+    @field_validator('timestamp')
+    @classmethod
+    def check_timestamp(cls, value):
+        # Engines bucket and index by time; an outlier date must not reach them
+        utc = value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+        latest = datetime.now(timezone.utc).replace(tzinfo=None) + TRANSACTION_MAX_AHEAD
+        if not TRANSACTION_EARLIEST <= utc <= latest:
+            raise ValueError(f"timestamp must be between {TRANSACTION_EARLIEST:%Y-%m-%d} and {latest:%Y-%m-%d %H:%M} UTC")
+        return value
+
+class ItemRecord(BaseModel):
+    item_id: str
+    store_id: str
+    name: str
+    category: str
+    price: float
+    description: str = ""
+
+class ReviewRecord(BaseModel):
+    review_id: str
+    store_id: str
+    customer_id: str
+    rating: int
+    text: str
+    timestamp: datetime
+
+class IngestResult(BaseModel):
+    table: str
+    received: int
+    accepted: int  # New rows; records with an already-known id are skipped
+    total_rows: int
+    data_version: int
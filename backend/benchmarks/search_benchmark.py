@@ -0,0 +1,147 @@
+"""
+Recall vs latency benchmark for the ProductSearchEngine retrieval backends
+and search modes.
+
+Builds a synthetic catalogue with a Zipfian vocabulary, fits the same
+TF-IDF vectorizer the engine uses, and compares every backend against the
+brute-force path (ground truth). Then compares the engine's dense and
+hybrid modes against its lexical (TF-IDF) results, and the IVF index
+against an exact scan of the same item embeddings. Synthetic terms
+co-occur at random, so dense recall against lexical results is a lower
+bound: on a real catalogue dense mode exists to find what lexical misses.
+
+Usage (from backend/):
+    python -m benchmarks.search_benchmark --items 1000000 --queries 500
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from app.ml.retrieval import BruteForceIndex, IVFIndex, InvertedIndex, LSHIndex
+from app.ml.search_engine import ProductSearchEngine
+
+
+def synthetic_catalogue(n_items, vocab_size, rng):
+    vocab = np.array([f"term{i}" for i in range(vocab_size)])
+    lengths = rng.integers(6, 16, n_items)
+    words = vocab[(rng.zipf(1.2, lengths.sum()) - 1) % vocab_size]
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    return [" ".join(words[offsets[i]:offsets[i + 1]]) for i in range(n_items)], vocab
+
+
+def synthetic_queries(n_queries, vocab, rng):
+    # Mid-frequency terms: skip the head so queries are not near stop words
+    pool = vocab[20:2000]
+    return [" ".join(rng.choice(pool, rng.integers(1, 4), replace=False)) for _ in range(n_queries)]
+
+
+def recall(results, truth):
+    hits = sum(len(r & t) for r, t in zip(results, truth))
+    return hits / (sum(len(t) for t in truth) or 1)
+
+
+def report(label, build_seconds, latencies, results, truth):
+    print(f"{label:<24}{build_seconds:>9.2f}{np.percentile(latencies, 50):>9.2f}"
+          f"{np.percentile(latencies, 99):>9.2f}{recall(results, truth):>12.3f}")
+
+
+def run_modes(args, texts, queries):
+    items = pd.DataFrame({
+        'item_id': [f"i{i}" for i in range(len(texts))], 'store_id': 's1', 'name': texts,
+        'category': "", 'description': "", 'price': 0
+    })
+    start = time.perf_counter()
+    engine = ProductSearchEngine(items)
+    lexical_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    engine.search("warmup", mode='dense')
+    dense_seconds = time.perf_counter() - start
+    print(f"\nDense embedding: {engine.item_vectors.shape[1]} dimensions")
+
+    print(f"\n{'mode (vs lexical)':<24}{'build s':>9}{'p50 ms':>9}{'p99 ms':>9}{f'recall@{args.top_k}':>12}")
+    truth = None
+    for mode in ('lexical', 'dense', 'hybrid'):
+        latencies, results = [], []
+        for query in queries:
+            start = time.perf_counter()
+            hits = engine.search(query, args.top_k, mode=mode)
+            latencies.append((time.perf_counter() - start) * 1000)
+            results.append({hit['item_id'] for hit in hits})
+        if truth is None:
+            truth = results
+        report(mode, lexical_seconds if mode == 'lexical' else dense_seconds, latencies, results, truth)
+
+    # Approximate vs exact nearest neighbours over the same embeddings
+    query_vectors = engine.embed(queries)
+    print(f"\n{'dense index (vs exact)':<24}{'build s':>9}{'p50 ms':>9}{'p99 ms':>9}{f'recall@{args.top_k}':>12}")
+    truth = None
+    for index in [IVFIndex(min_items=len(texts) + 1)] + [IVFIndex(n_probe=p, min_items=0) for p in (4, 16)]:
+        start = time.perf_counter()
+        index.build(engine.item_vectors)
+        build_seconds = time.perf_counter() - start
+        latencies, results = [], []
+        for query_vector in query_vectors:
+            start = time.perf_counter()
+            indices, scores = index.search(query_vector, args.top_k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            results.append(set(indices[scores > 0].tolist()))
+        if truth is None:
+            truth = results
+        label = "exact" if index.centroids is None else f"ivf(nprobe={index.n_probe})"
+        report(label, build_seconds, latencies, results, truth)
+
+
+def run(args):
+    rng = np.random.default_rng(args.seed)
+    print(f"Generating {args.items:,} items...")
+    texts, vocab = synthetic_catalogue(args.items, args.vocab, rng)
+    queries = synthetic_queries(args.queries, vocab, rng)
+
+    vectorizer = TfidfVectorizer(stop_words='english')
+    matrix = vectorizer.fit_transform(texts)
+    query_vecs = [vectorizer.transform([q]) for q in queries]
+    print(f"TF-IDF matrix: {matrix.shape[0]:,} x {matrix.shape[1]:,}, nnz={matrix.nnz:,}")
+
+    backends = [
+        BruteForceIndex(),
+        InvertedIndex(),
+        LSHIndex(n_tables=8, n_bits=10),
+        LSHIndex(n_tables=16, n_bits=8),
+    ]
+    truth = None
+    print(f"\n{'backend':<24}{'build s':>9}{'p50 ms':>9}{'p99 ms':>9}{f'recall@{args.top_k}':>12}")
+    for index in backends:
+        start = time.perf_counter()
+        index.build(matrix)
+        build_seconds = time.perf_counter() - start
+
+        latencies, results = [], []
+        for query_vec in query_vecs:
+            start = time.perf_counter()
+            indices, scores = index.search(query_vec, args.top_k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            results.append(set(indices[scores > 0].tolist()))
+
+        if truth is None:
+            truth = results
+
+        label = index.name if not isinstance(index, LSHIndex) else f"lsh({index.n_tables}x{index.n_bits})"
+        report(label, build_seconds, latencies, results, truth)
+
+    if args.modes:
+        run_modes(args, texts, queries)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--vocab", type=int, default=50_000)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--no-modes", dest="modes", action="store_false",
+                        help="Skip the dense / hybrid search mode comparison")
+    run(parser.parse_args())
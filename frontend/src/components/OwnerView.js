@@ -40,24 +40,19 @@ const OwnerView = ({ storeId }) => {
   useEffect(() => {
     const fetchData = async () => {
       try {
-        const [forecastRes, insightsRes, marketBasketRes, segmentsRes, seasonalRes, timeHabitsRes, sentimentRes, personasRes] = await Promise.all([
-          axios.get(`/api/stores/${storeId}/forecast`),
-          axios.get(`/api/owner/${storeId}/insights`),
-          axios.get('/api/analytics/market-basket'),
-          axios.get('/api/analytics/customer-segments'),
-          axios.get('/api/analytics/seasonal-analysis'),
-          axios.get('/api/analytics/time-habits'),
-          axios.get('/api/analytics/sentiment'),
-          axios.get('/api/analytics/persona-insights')
-        ]);
-        setForecast(forecastRes.data);
-        setInsights(insightsRes.data);
-        setMarketBasket(marketBasketRes.data);
-        setSegments(segmentsRes.data);
-        setSeasonal(seasonalRes.data);
-        setTimeHabits(timeHabitsRes.data);
-        setSentiment(sentimentRes.data);
-        setPersonas(personasRes.data);
+        // One request: the backend computes all panels in a shared pass
+        const { data } = await axios.get(`/api/owner/${storeId}/dashboard`);
+        if (Object.keys(data.errors || {}).length > 0) {
+          console.error("Dashboard panels failed:", data.errors);
+        }
+        setForecast(data.forecast);
+        setInsights(data.insights);
+        setMarketBasket(data.market_basket);
+        setSegments(data.segments);
+        setSeasonal(data.seasonal);
+        setTimeHabits(data.time_habits);
+        setSentiment(data.sentiment);
+        setPersonas(data.personas);
       } catch (error) {
         console.error("Error fetching owner data:", error);
       }
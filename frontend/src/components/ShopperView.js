@@ -1,5 +1,4 @@
 import React, { useState, useRef, useEffect } from 'react';
-import axios from 'axios';
 
 const ShopperView = () => {
   const [query, setQuery] = useState('');
@@ -25,19 +24,52 @@ const ShopperView = () => {
     setQuery('');
     setLoading(true);
 
+    // Bot message filled in as the stream arrives: products first, then the answer's tokens
+    const updateBotMsg = (update) => setChatHistory(prev => {
+      const next = [...prev];
+      next[next.length - 1] = { ...next[next.length - 1], ...update(next[next.length - 1]) };
+      return next;
+    });
+
     try {
-      const res = await axios.post('/api/chat/query', {
-        user_id: 'guest',
-        text: userMsg.text
+      const res = await fetch('/api/chat/stream', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ user_id: 'guest', text: userMsg.text })
       });
+      if (!res.ok || !res.body) throw new Error(`Chat stream failed: ${res.status}`);
+
+      setChatHistory(prev => [...prev, { sender: 'bot', text: '', data: [] }]);
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      for (;;) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Server-Sent Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+          const lines = buffer.slice(0, boundary).split('\n');
+          buffer = buffer.slice(boundary + 2);
+          const event = lines.find(line => line.startsWith('event: '))?.slice(7);
+          const data = JSON.parse(lines.find(line => line.startsWith('data: '))?.slice(6) ?? 'null');
 
-      const botMsg = {
-        sender: 'bot',
-        text: res.data.response_text,
-        data: res.data.data,
-        action: res.data.action
-      };
-      setChatHistory(prev => [...prev, botMsg]);
+          if (event === 'products') {
+            setLoading(false);
+            updateBotMsg(() => ({ data }));
+          } else if (event === 'token') {
+            updateBotMsg(msg => ({ text: msg.text + data.text }));
+          } else if (event === 'done') {
+            updateBotMsg(msg => ({
+              text: data.response_text,
+              action: data.action,
+              data: data.action === 'clarify' ? [] : msg.data
+            }));
+          }
+        }
+      }
     } catch (error) {
       console.error("Error sending message:", error);
       setChatHistory(prev => [...prev, { sender: 'bot', text: "Sorry, I'm having trouble connecting right now." }]);